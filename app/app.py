@@ -1,10 +1,9 @@
-import datetime
-
+import asyncio
 from fastapi import FastAPI
-from fastapi_utils.tasks import repeat_every
-from app.routes import drill_router, feedback_router, mail_router, ppm_router, user_router
-from app.services.tqm_service import TQMProcessorConfig, TQMProcessor
+from app.routes import drill_router, feedback_router, mail_router, ppm_router, user_router, backfill_router
+from app.worker import start_ingestion, stop_ingestion, create_poller
 from app.utils.logger import Logger
+from app.config import Config
 
 logger = Logger().get_logger()
 app = FastAPI()
@@ -15,24 +14,27 @@ app.include_router(feedback_router)
 app.include_router(user_router)
 app.include_router(mail_router)
 app.include_router(ppm_router)
+app.include_router(backfill_router)
 
-# 初始化 TQM 處理器
-tqm_processor = TQMProcessor(
-    config=TQMProcessorConfig(
-        max_db_workers=5,
-        batch_size=500,
-        enable_email=False,
-        enable_save=False
-    )
-)
+# TQM 匯入另外以 python -m app.worker 執行時, API 程序不啟動匯入排程
+INGESTION_IN_API = Config.RUN_INGESTION_IN_API.lower() in ("1", "true", "yes")
+# TQM 匯入輪詢排程
+ingestion_state = {"stop_event": None, "task": None}
 
 @app.get("/", summary="Root Endpoint", description="Welcome message for the AUTO PPM API")
 async def root():
     return {"message": "Welcome to the AUTO PPM API!"}
 
-# 設定定時任務
 @app.on_event("startup")
-@repeat_every(seconds=60*10, logger=logger, raise_exceptions=True)
-async def loop_task_run_tqm_process():
-    await tqm_processor.run_process()
-    print(f"-----------------Mission Completed for 'loop_task_run_tqm_process' at {datetime.datetime.now()}------------------")
+async def init_shared_resources():
+    if INGESTION_IN_API:
+        await start_ingestion()
+        ingestion_state["stop_event"] = asyncio.Event()
+        ingestion_state["task"] = asyncio.create_task(create_poller().run_forever(ingestion_state["stop_event"]))
+
+@app.on_event("shutdown")
+async def close_shared_resources():
+    if INGESTION_IN_API:
+        ingestion_state["stop_event"].set()
+        await ingestion_state["task"]
+        await stop_ingestion()
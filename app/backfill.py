@@ -0,0 +1,168 @@
+"""
+# app/backfill.py
+歷史資料 backfill: 將 [start, end) 的 AOITime 範圍切分為多個 shard, 以 process pool 平行匯入
+
+    python -m app.backfill --start "2024-01-01 00:00:00" --end "2024-02-01 00:00:00" --shards 8 --workers 4
+
+每個 shard 使用各自的 ingestion_checkpoint, 中斷後以相同參數重新執行即可由各 shard 的 checkpoint 接續;
+fetch_interval 與 workers 用來限制對 MSSQL TQM 主機的負載。
+"""
+import asyncio
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from app.database import mysql_session
+from app.crud import checkpoint as checkpoint_crud
+from app.services.tqm_service import TQMProcessorConfig, TQMProcessor
+from app.services.failrate_service import invalidate_failrate_cache
+from app.services.prediction_service import init_ai_client, close_ai_client
+from app.services.soap_service import init_soap_client, close_soap_client
+from app.utils.lock_helper import single_runner
+from app.utils.logger import Logger
+
+# API 輸入的時間格式與 tBoard.AOITime 的時間格式
+INPUT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+AOI_TIME_FORMAT = "%Y/%m/%d %H:%M:%S"
+# 完成的 shard 以此 board_id 記錄於 checkpoint
+SHARD_DONE_BOARD_ID = 0
+
+
+def parse_time(value: str) -> datetime.datetime:
+    for time_format in (INPUT_TIME_FORMAT, AOI_TIME_FORMAT):
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    raise ValueError(f"時間格式錯誤: {value}")
+
+
+def split_range(start_time: str, end_time: str, shards: int) -> List[Tuple[str, str]]:
+    """將 [start, end) 平均切分為 shards 段, 回傳 tBoard.AOITime 格式的時間範圍"""
+    start, end = parse_time(start_time), parse_time(end_time)
+    if start >= end:
+        raise ValueError("開始時間必須早於結束時間")
+    step = (end - start) / max(1, shards)
+    bounds = [start + step * i for i in range(max(1, shards))] + [end]
+    result = []
+    for shard_start, shard_end in zip(bounds, bounds[1:]):
+        # AOITime 只到秒, 去除小數避免 shard 之間出現缺口或重疊
+        shard_start, shard_end = shard_start.replace(microsecond=0), shard_end.replace(microsecond=0)
+        if shard_start < shard_end:
+            result.append((shard_start.strftime(AOI_TIME_FORMAT), shard_end.strftime(AOI_TIME_FORMAT)))
+    return result
+
+
+def get_shard_checkpoint_name(shard_start: str, shard_end: str) -> str:
+    start, end = parse_time(shard_start), parse_time(shard_end)
+    return f"backfill.{start:%Y%m%d%H%M%S}.{end:%Y%m%d%H%M%S}"
+
+
+async def run_shard(shard_start: str, shard_end: str, fetch_interval: float = 0, enable_save: bool = True) -> Dict:
+    """執行單一 shard 的匯入, 完成後將 checkpoint 記錄為 shard 結束時間"""
+    name = get_shard_checkpoint_name(shard_start, shard_end)
+    result = {"name": name, "start": shard_start, "end": shard_end, "status": "skipped"}
+    async with mysql_session() as mydb:
+        checkpoint = await checkpoint_crud.get_checkpoint(mydb, name)
+    if checkpoint and checkpoint.aoi_time >= shard_end:
+        result["status"] = "done"
+        return result
+
+    processor = TQMProcessor(
+        config=TQMProcessorConfig(
+            max_db_workers=5,
+            batch_size=500,
+            enable_email=False,
+            enable_save=enable_save,
+            checkpoint_name=name,
+            start_aoi_time=shard_start,
+            end_aoi_time=shard_end,
+            fetch_interval=fetch_interval
+        )
+    )
+    await init_ai_client()
+    await init_soap_client()
+    try:
+        # 同一個 shard 同時間只允許一個程序執行
+        async with single_runner(name) as acquired:
+            if not acquired:
+                return result
+            await processor.warm_up()
+            completed = await processor.run_process()
+            if completed and enable_save:
+                async with mysql_session() as mydb:
+                    await checkpoint_crud.save_checkpoint(mydb, name, shard_end, SHARD_DONE_BOARD_ID)
+                # 歷史區間的失效率已變動, 清除失效率區間快取
+                await invalidate_failrate_cache()
+            result["status"] = "done" if completed else "failed"
+    finally:
+        await close_ai_client()
+        await close_soap_client()
+    return result
+
+
+def _run_shard_process(shard_start: str, shard_end: str, fetch_interval: float, enable_save: bool) -> Dict:
+    """process pool 的進入點, 每個 shard 在子程序內使用自己的 event loop 與資料庫連線"""
+    try:
+        return asyncio.run(run_shard(shard_start, shard_end, fetch_interval, enable_save))
+    except Exception as err:
+        return {"name": get_shard_checkpoint_name(shard_start, shard_end), "start": shard_start,
+                "end": shard_end, "status": "failed", "error": str(err)}
+
+
+def run_backfill(start_time: str, end_time: str, shards: int = 4, workers: int = 2,
+                 fetch_interval: float = 0, enable_save: bool = True) -> List[Dict]:
+    """以 process pool 平行執行所有 shard, 回傳各 shard 的執行結果"""
+    logger = Logger().get_logger()
+    shard_ranges = split_range(start_time, end_time, shards)
+    logger.info(f"開始 backfill: {start_time} - {end_time}, {len(shard_ranges)} 個 shard, {workers} 個程序")
+
+    results = []
+    # spawn: 子程序不繼承父程序的 event loop 與資料庫連線
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(_run_shard_process, shard_start, shard_end, fetch_interval, enable_save)
+            for shard_start, shard_end in shard_ranges
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            logger.info(f"backfill shard 結束: {result}")
+            results.append(result)
+    return sorted(results, key=lambda result: result["start"])
+
+
+async def get_backfill_progress(start_time: str, end_time: str, shards: int = 4) -> List[Dict]:
+    """查詢各 shard 的 checkpoint 進度"""
+    progress = []
+    async with mysql_session() as mydb:
+        for shard_start, shard_end in split_range(start_time, end_time, shards):
+            name = get_shard_checkpoint_name(shard_start, shard_end)
+            checkpoint = await checkpoint_crud.get_checkpoint(mydb, name)
+            aoi_time: Optional[str] = checkpoint.aoi_time if checkpoint else None
+            progress.append({
+                "name": name,
+                "start": shard_start,
+                "end": shard_end,
+                "aoi_time": aoi_time,
+                "done": bool(aoi_time and aoi_time >= shard_end)
+            })
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TQM 歷史資料 backfill")
+    parser.add_argument("--start", required=True, help="開始時間 (含), 例如 '2024-01-01 00:00:00'")
+    parser.add_argument("--end", required=True, help="結束時間 (不含), 例如 '2024-02-01 00:00:00'")
+    parser.add_argument("--shards", type=int, default=4, help="切分的 shard 數量")
+    parser.add_argument("--workers", type=int, default=2, help="同時執行的程序數量")
+    parser.add_argument("--fetch-interval", type=float, default=0, help="每次擷取 Board 之間的間隔(秒)")
+    args = parser.parse_args()
+
+    results = run_backfill(args.start, args.end, args.shards, args.workers, args.fetch_interval)
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
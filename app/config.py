@@ -22,11 +22,28 @@ class Config:
     REDIS_HOST = os.getenv("REDIS_HOST", "192.168.0.107")
     REDIS_PORT = os.getenv("REDIS_PORT", "6379")
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "5940")
+    # 失效率區間快取(秒): 已結束(早於匯入 checkpoint)的區間長期保存, 進行中的區間短期保存
+    FAILRATE_CLOSED_BUCKET_CACHE_TTL = os.getenv("FAILRATE_CLOSED_BUCKET_CACHE_TTL", "604800")
+    FAILRATE_OPEN_BUCKET_CACHE_TTL = os.getenv("FAILRATE_OPEN_BUCKET_CACHE_TTL", "60")
+
+    # /api/drill/judge 分頁與串流設定: 指定 cursor 未指定 limit 時的每頁筆數、每頁上限、串流每批讀取筆數
+    JUDGE_PAGE_SIZE = os.getenv("JUDGE_PAGE_SIZE", "1000")
+    JUDGE_PAGE_MAX_SIZE = os.getenv("JUDGE_PAGE_MAX_SIZE", "10000")
+    JUDGE_STREAM_CHUNK_SIZE = os.getenv("JUDGE_STREAM_CHUNK_SIZE", "1000")
 
     # Email 設定
     EMAIL_HOST = os.getenv("EMAIL_HOST", "10.12.10.31")
     EMAIL_PORT = os.getenv("EMAIL_PORT", "")
 
+    # 警告郵件 outbox 寄送設定
+    ALERT_DIGEST = os.getenv("ALERT_DIGEST", "true")
+    ALERT_POLL_INTERVAL = os.getenv("ALERT_POLL_INTERVAL", "30")
+    ALERT_BATCH_SIZE = os.getenv("ALERT_BATCH_SIZE", "100")
+    ALERT_MAX_ATTEMPTS = os.getenv("ALERT_MAX_ATTEMPTS", "5")
+    ALERT_RETRY_BASE_SECONDS = os.getenv("ALERT_RETRY_BASE_SECONDS", "30")
+    # 同一機台/軸的警告節流時間窗(秒), 0 表示不節流
+    ALERT_THROTTLE_WINDOW = os.getenv("ALERT_THROTTLE_WINDOW", "1800")
+
     # Excel 設定
     PPM_FILE_NAME = os.getenv("PPM_FILE_NAME", "ppm_criteria_limit_20230213_(Security C).xlsx")
 
@@ -34,12 +51,45 @@ class Config:
     WEBSIDE_HOST = os.getenv("WEB_HOST", "10.16.92.65")
     WEBSIDE_PORT = os.getenv("WEB_PORT", "5940")
 
+    # 產品 PPM 管制界限快取設定(秒)
+    PRODUCT_CRITERIA_CACHE_TTL = os.getenv("PRODUCT_CRITERIA_CACHE_TTL", "600")
+    # 查無管制界限(SOAP 取不到 AR 值)時的快取時間, 避免暫時性錯誤長時間停用 PPM 判定
+    PRODUCT_CRITERIA_NEGATIVE_CACHE_TTL = os.getenv("PRODUCT_CRITERIA_NEGATIVE_CACHE_TTL", "30")
+
+    # 是否於 API 程序內執行 TQM 匯入與警告郵件寄送; 預設由 python -m app.worker 另外執行, API 程序不啟動
+    RUN_INGESTION_IN_API = os.getenv("RUN_INGESTION_IN_API", "false")
+    # TQM 匯入是否寫入 drill 結果/checkpoint, 與是否寫入並寄送警告郵件; 預設關閉, 由 worker 的部署環境變數開啟
+    TQM_ENABLE_SAVE = os.getenv("TQM_ENABLE_SAVE", "false")
+    TQM_ENABLE_EMAIL = os.getenv("TQM_ENABLE_EMAIL", "false")
+    # TQM 匯入輪詢間隔(秒): 有新資料時以最短間隔輪詢, 閒置時逐次加倍至最長間隔
+    POLL_MIN_INTERVAL = os.getenv("POLL_MIN_INTERVAL", "5")
+    POLL_MAX_INTERVAL = os.getenv("POLL_MAX_INTERVAL", "120")
+    # 超過此間隔(秒)未執行時, 不論是否有新資料都執行一次 TQM 匯入
+    TQM_INTERVAL = os.getenv("TQM_INTERVAL", "600")
+
+    # 定時任務單一執行者 lease 有效時間(秒), 執行期間每 1/3 有效時間延長一次
+    RUNNER_LOCK_TTL = os.getenv("RUNNER_LOCK_TTL", "60")
+
+    # tDrillMachine / tProduct 維度快取定期更新間隔(秒)
+    DIMENSION_CACHE_REFRESH_INTERVAL = os.getenv("DIMENSION_CACHE_REFRESH_INTERVAL", "3600")
+
     # Image 設定
     DRILL_IMG_FOLDER = os.getenv("DRILL_IMG_FOLDER", "D:\\drill_map_backup")
+    # 鑽孔圖檔名時間與 DrillTime 可容許的誤差(秒)
+    DRILL_IMG_TIME_TOLERANCE = os.getenv("DRILL_IMG_TIME_TOLERANCE", "2")
 
     # SOAP 設定
     SOAP_URL = os.getenv("SOAP_URL", "http://10.12.20.216/mtlserviceproxy/serviceproxy.asmx")
+    SOAP_TIMEOUT = os.getenv("SOAP_TIMEOUT", "10")
+    SOAP_MAX_CONCURRENCY = os.getenv("SOAP_MAX_CONCURRENCY", "4")
 
     # AI Prediction Service 設定
     AI_SERVICE_HOST = os.getenv("AI_SERVICE_HOST", "192.168.0.107")
-    AI_SERVICE_PORT = os.getenv("AI_SERVICE_PORT", "8009")
\ No newline at end of file
+    AI_SERVICE_PORT = os.getenv("AI_SERVICE_PORT", "8009")
+    AI_CLIENT_MAX_CONNECTIONS = os.getenv("AI_CLIENT_MAX_CONNECTIONS", "20")
+    AI_CLIENT_TIMEOUT = os.getenv("AI_CLIENT_TIMEOUT", "30")
+    # 連續失敗幾次後開路, 開路後經過幾秒半開探測
+    AI_BREAKER_FAILURE_THRESHOLD = os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5")
+    AI_BREAKER_RECOVERY_TIMEOUT = os.getenv("AI_BREAKER_RECOVERY_TIMEOUT", "30")
+    # 單張圖片分類的目標延遲(秒), 超過時降低並行數
+    AI_LATENCY_TARGET = os.getenv("AI_LATENCY_TARGET", "2")
@@ -9,4 +9,6 @@ from .user import *
 from .mail import *
 from .ppm import *
 from .tqm import *
-from .prediction import *
\ No newline at end of file
+from .prediction import *
+from .checkpoint import *
+from .alert import *
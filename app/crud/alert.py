@@ -0,0 +1,135 @@
+import json
+from app.models import mysql_models as models 
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy import select, update, bindparam, or_
+from typing import Dict, List, Optional
+
+ALERT_STATUS_PENDING = "pending"
+ALERT_STATUS_SENT = "sent"
+ALERT_STATUS_FAILED = "failed"
+ALERT_STATUS_SUPPRESSED = "suppressed"
+
+# CRUD 操作：AlertOutbox 相關資料表
+async def enqueue_alert_outbox_all(db: AsyncSession, highlight_list: List[Dict], commit: bool = True):
+    """寫入待寄送的警告, 同一筆 drill 結果(lot, spindle, aoi_time)重複寫入時忽略"""
+    if not highlight_list:
+        return True
+    now = datetime.now()
+    rows = [{
+        "machine_name": highlight_info["machine_name"],
+        "spindle_id": highlight_info["spindle_id"],
+        "lot_number": highlight_info["lot_number"],
+        "aoi_time": highlight_info.get("aoi_time"),
+        "payload": json.dumps(highlight_info, default=str),
+        "status": ALERT_STATUS_PENDING,
+        "attempts": 0,
+        "next_attempt_time": now,
+        "create_time": now
+    } for highlight_info in highlight_list]
+    stmt = insert(models.AlertOutbox)
+    stmt = stmt.on_duplicate_key_update(id=models.AlertOutbox.id)
+    await db.execute(stmt, rows)
+    if commit:
+        await db.commit()
+    return True
+
+async def attach_alert_outbox_classification(db: AsyncSession, drill_list: List[Dict], pending_result: str,
+                                             commit: bool = True):
+    """將 AI 分類結果補寫至警告
+
+    尚未寄出的警告直接補上分類結果; 已寄出且寄出時尚無分類結果的警告改為待寄送的更新通知(is_followup)。
+    """
+    rows = [{
+        "b_lot_number": drill_info["lot_number"],
+        "b_spindle_id": drill_info["drill_spindle_id"],
+        "b_aoi_time": drill_info["aoi_time"],
+        "b_classification_result": drill_info["classification_result"]
+    } for drill_info in drill_list if drill_info.get("classification_result")]
+    if not rows:
+        return True
+    stmt = update(models.AlertOutbox).where(
+        models.AlertOutbox.lot_number == bindparam("b_lot_number"),
+        models.AlertOutbox.spindle_id == bindparam("b_spindle_id"),
+        models.AlertOutbox.aoi_time == bindparam("b_aoi_time"),
+        models.AlertOutbox.status.in_([ALERT_STATUS_PENDING, ALERT_STATUS_SUPPRESSED])
+    ).values(classification_result=bindparam("b_classification_result"))
+    await db.execute(stmt, rows)
+
+    followup_rows = [row for row in rows if row["b_classification_result"] != pending_result]
+    if followup_rows:
+        stmt = update(models.AlertOutbox).where(
+            models.AlertOutbox.lot_number == bindparam("b_lot_number"),
+            models.AlertOutbox.spindle_id == bindparam("b_spindle_id"),
+            models.AlertOutbox.aoi_time == bindparam("b_aoi_time"),
+            models.AlertOutbox.status == ALERT_STATUS_SENT,
+            or_(models.AlertOutbox.classification_result.is_(None),
+                models.AlertOutbox.classification_result == pending_result)
+        ).values(
+            classification_result=bindparam("b_classification_result"),
+            is_followup=True,
+            status=ALERT_STATUS_PENDING,
+            attempts=0,
+            next_attempt_time=datetime.now(),
+            last_error=None
+        )
+        await db.execute(stmt, followup_rows)
+    if commit:
+        await db.commit()
+    return True
+
+async def get_due_alert_outbox(db: AsyncSession, limit: int = 100):
+    """取得已到寄送時間的待寄送警告"""
+    stmt = select(models.AlertOutbox).filter(
+        models.AlertOutbox.status == ALERT_STATUS_PENDING,
+        models.AlertOutbox.next_attempt_time <= datetime.now()
+    ).order_by(models.AlertOutbox.id).limit(limit)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_suppressed_alert_outbox(db: AsyncSession, limit: int = 1000):
+    """取得節流期間被抑制, 等待併入彙整郵件的警告"""
+    stmt = select(models.AlertOutbox).filter(
+        models.AlertOutbox.status == ALERT_STATUS_SUPPRESSED
+    ).order_by(models.AlertOutbox.id).limit(limit)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def mark_alert_outbox_suppressed(db: AsyncSession, alert_ids: List[int], commit: bool = True):
+    if not alert_ids:
+        return True
+    stmt = update(models.AlertOutbox).where(models.AlertOutbox.id.in_(alert_ids)).values(
+        status=ALERT_STATUS_SUPPRESSED
+    )
+    await db.execute(stmt)
+    if commit:
+        await db.commit()
+    return True
+
+async def mark_alert_outbox_sent(db: AsyncSession, alert_ids: List[int], commit: bool = True):
+    if not alert_ids:
+        return True
+    stmt = update(models.AlertOutbox).where(models.AlertOutbox.id.in_(alert_ids)).values(
+        status=ALERT_STATUS_SENT, sent_time=datetime.now(), last_error=None
+    )
+    await db.execute(stmt)
+    if commit:
+        await db.commit()
+    return True
+
+async def mark_alert_outbox_retry(db: AsyncSession, alert_ids: List[int], attempts: int,
+                                  next_attempt_time: Optional[datetime], error: str, commit: bool = True):
+    """記錄寄送失敗, next_attempt_time 為 None 時不再重試"""
+    if not alert_ids:
+        return True
+    stmt = update(models.AlertOutbox).where(models.AlertOutbox.id.in_(alert_ids)).values(
+        status=ALERT_STATUS_PENDING if next_attempt_time else ALERT_STATUS_FAILED,
+        attempts=attempts,
+        next_attempt_time=next_attempt_time,
+        last_error=error[:512]
+    )
+    await db.execute(stmt)
+    if commit:
+        await db.commit()
+    return True
@@ -0,0 +1,25 @@
+from app.models import mysql_models as models 
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy import select
+
+# CRUD 操作：IngestionCheckpoint 相關資料表
+async def get_checkpoint(db: AsyncSession, name: str):
+    stmt = select(models.IngestionCheckpoint).filter(models.IngestionCheckpoint.name == name)
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+async def save_checkpoint(db: AsyncSession, name: str, aoi_time: str, board_id: int, commit: bool = True):
+    stmt = insert(models.IngestionCheckpoint).values(
+        name=name, aoi_time=aoi_time, board_id=board_id, update_time=datetime.now()
+    )
+    stmt = stmt.on_duplicate_key_update(
+        aoi_time=stmt.inserted.aoi_time,
+        board_id=stmt.inserted.board_id,
+        update_time=stmt.inserted.update_time
+    )
+    await db.execute(stmt)
+    if commit:
+        await db.commit()
+    return True
@@ -1,9 +1,18 @@
 from app.models import mysql_models as models 
 from app.schemas import drill as schemas
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import defaultdict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func
-from typing import List, Dict, Any
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy import select, update, delete, desc, func, tuple_, case, literal_column, and_, or_, bindparam
+from typing import List, Dict, Any, Iterable, Set, Tuple, Optional, AsyncIterator
+
+# TQM 匯入流程寫入的欄位, 重複時只更新這些欄位(不覆蓋 OP/EE 回報資料)
+DRILL_INFO_UPSERT_COLUMNS = (
+    "product_name", "lot_number", "drill_machine_id", "drill_machine_name", "drill_spindle_id",
+    "ppm_control_limit", "ppm", "judge_ppm", "drill_time", "cpk", "cp", "ca", "aoi_time",
+    "ratio_target", "image_path", "classification_result", "classification_time"
+)
 
 # CRUD 操作：DrillInfo 相關資料表
 async def get_drill_info_count(db: AsyncSession):
@@ -13,7 +22,7 @@ async def get_drill_info_count(db: AsyncSession):
     return data
 
 async def get_drill_info_by_last_aoitime(db: AsyncSession):
-    stmt = select(models.DrillInfo).order_by(desc(models.DrillInfo.aoi_time))
+    stmt = select(models.DrillInfo).order_by(desc(models.DrillInfo.aoi_time)).limit(1)
     result = await db.execute(stmt)
     data = result.scalars().first()
     return data
@@ -93,6 +102,36 @@ async def get_judge_info(db: AsyncSession, start_time:datetime, end_time:datetim
     data = result.scalars().all()
     return data
 
+def _select_judge_info(start_time: datetime, end_time: datetime, after: Optional[Tuple[datetime, int]] = None):
+    """只查詢欄位(不建立 ORM 物件), 依 (aoi_time, id) 排序; after 為上一頁最後一筆的 (aoi_time, id)"""
+    stmt = select(*models.DrillInfo.__table__.columns).filter(models.DrillInfo.aoi_time.between(start_time, end_time))
+    if after:
+        last_aoi_time, last_id = after
+        stmt = stmt.filter(or_(
+            models.DrillInfo.aoi_time > last_aoi_time,
+            and_(models.DrillInfo.aoi_time == last_aoi_time, models.DrillInfo.id > last_id)
+        ))
+    return stmt.order_by(models.DrillInfo.aoi_time, models.DrillInfo.id)
+
+async def get_judge_info_page(db: AsyncSession, start_time: datetime, end_time: datetime, limit: int,
+                              after: Optional[Tuple[datetime, int]] = None):
+    """keyset 分頁: 回傳 (資料, 下一頁的 (aoi_time, id)), 最後一頁時後者為 None"""
+    result = await db.execute(_select_judge_info(start_time, end_time, after).limit(limit + 1))
+    data = [dict(row) for row in result.mappings()]
+    if len(data) <= limit:
+        return data, None
+    data = data[:limit]
+    return data, (data[-1]["aoi_time"], data[-1]["id"])
+
+async def stream_judge_info(db: AsyncSession, start_time: datetime, end_time: datetime,
+                            after: Optional[Tuple[datetime, int]] = None,
+                            chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+    """以 server-side cursor 分批讀取, 每次只保留 chunk_size 筆於記憶體"""
+    stmt = _select_judge_info(start_time, end_time, after).execution_options(yield_per=chunk_size)
+    result = await db.stream(stmt)
+    async for partition in result.mappings().partitions(chunk_size):
+        yield [dict(row) for row in partition]
+
 async def get_drill_info_check(db: AsyncSession, drill_info: schemas.DrillInfo):
     stmt = select(models.DrillInfo).filter(
         models.DrillInfo.lot_number == drill_info["lot_number"],
@@ -103,6 +142,26 @@ async def get_drill_info_check(db: AsyncSession, drill_info: schemas.DrillInfo):
     data = result.scalars().first()
     return data
 
+async def get_drill_info_existing_keys(db: AsyncSession, keys: Iterable[Tuple[str, int, datetime]], chunk_size: int = 500) -> Set[Tuple[str, int, datetime]]:
+    """以單一查詢批次檢查 (lot_number, drill_spindle_id, aoi_time) 是否已存在"""
+    keys = list(dict.fromkeys(keys))
+    data = set()
+    for i in range(0, len(keys), chunk_size):
+        stmt = select(
+            models.DrillInfo.lot_number,
+            models.DrillInfo.drill_spindle_id,
+            models.DrillInfo.aoi_time
+        ).filter(
+            tuple_(
+                models.DrillInfo.lot_number,
+                models.DrillInfo.drill_spindle_id,
+                models.DrillInfo.aoi_time
+            ).in_(keys[i:i + chunk_size])
+        )
+        result = await db.execute(stmt)
+        data.update(tuple(row) for row in result.all())
+    return data
+
 async def create_drill_info(db: AsyncSession, drill_info: schemas.DrillInfo):
     db_drill_info = models.DrillInfo(**drill_info)
     db.add(db_drill_info)
@@ -116,6 +175,52 @@ async def create_drill_info_all(db: AsyncSession, info_list: List[schemas.DrillI
     await db.commit()
     return True
 
+async def upsert_drill_info_all(db: AsyncSession, info_list: List[schemas.DrillInfo], chunk_size: int = 500, commit: bool = True):
+    """以 executemany INSERT ... ON DUPLICATE KEY UPDATE 批次寫入"""
+    stmt = insert(models.DrillInfo)
+    stmt = stmt.on_duplicate_key_update({
+        column: stmt.inserted[column]
+        for column in DRILL_INFO_UPSERT_COLUMNS
+        if column not in ("lot_number", "drill_spindle_id", "aoi_time")
+    })
+    rows = [{column: data.get(column) for column in DRILL_INFO_UPSERT_COLUMNS} for data in info_list]
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+    if commit:
+        await db.commit()
+    return True
+
+async def get_pending_drill_info(db: AsyncSession, pending_result: str, since: datetime, max_attempts: int, limit: int = 500):
+    """取得 aoi_time 不早於 since 且重試次數未達上限的待分類資料"""
+    stmt = select(models.DrillInfo).filter(
+        models.DrillInfo.classification_result == pending_result,
+        models.DrillInfo.aoi_time >= since,
+        models.DrillInfo.classification_attempts < max_attempts
+    ).order_by(models.DrillInfo.aoi_time).limit(limit)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def update_drill_classification_all(db: AsyncSession, info_list: List[Dict[str, Any]], chunk_size: int = 500, commit: bool = True):
+    """依 id 批次更新 AI 分類結果, 並累計分類重試次數"""
+    table = models.DrillInfo.__table__
+    stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+        classification_result=bindparam("b_classification_result"),
+        classification_time=bindparam("b_classification_time"),
+        image_path=bindparam("b_image_path"),
+        classification_attempts=table.c.classification_attempts + 1
+    )
+    rows = [{
+        "b_id": data["id"],
+        "b_classification_result": data.get("classification_result"),
+        "b_classification_time": data.get("classification_time"),
+        "b_image_path": data.get("image_path")
+    } for data in info_list]
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+    if commit:
+        await db.commit()
+    return True
+
 async def update_drill_report_info(db: AsyncSession, search_items: schemas.SearchDrill, update_items: schemas.ReportUpdate):
     stmt = select(models.DrillInfo).filter(
         models.DrillInfo.lot_number == search_items["lot_number"],
@@ -165,6 +270,188 @@ async def get_drill_failrate_info_by_datetimelimit_and_machine_name(db: AsyncSes
         data["posalux"] = await get_counts_and_fail_rate(posalux_filter)
     return data
 
+def _get_failrate_bucket_label(freq_type: str, offset_seconds: int):
+    """失效率統計區間的 SQL 標籤: 區間以開始時間的時分秒為起點, 先將 aoi_time 平移後再取日/週/月"""
+    shifted = func.timestampadd(literal_column("SECOND"), -offset_seconds, models.DrillInfo.aoi_time)
+    if freq_type == "day":
+        return func.date_format(shifted, "%Y-%m-%d")
+    if freq_type == "month":
+        return func.date_format(shifted, "%Y-%m")
+    if freq_type == "week":
+        # 產線週: 週日為一週開始, 年份取週日所在年份, 週數取週一的 ISO 週數
+        week_start = func.timestampadd(
+            literal_column("DAY"), -func.mod(func.weekday(shifted) + 1, 7), func.date(shifted)
+        )
+        return func.concat(
+            func.year(week_start), "-", func.week(func.timestampadd(literal_column("DAY"), 1, week_start), 3)
+        )
+    raise ValueError(f"freq_type 錯誤: {freq_type}")
+
+async def get_drill_failrate_count_by_freq(db: AsyncSession, search_items: schemas.SearchFailrate, freq_type: str, offset_seconds: int = 0):
+    """依日/週/月在 MySQL 內彙總總數與失敗數; 未指定機台時分別彙總 Hitachi(< ND41) 與 Posalux(> ND40)"""
+    label = _get_failrate_bucket_label(freq_type, offset_seconds).label("label")
+    is_fail = models.DrillInfo.judge_ppm == 0
+    if search_items.get("drill_machine_name"):
+        columns = [
+            func.count(models.DrillInfo.id).label("total_count"),
+            func.sum(case((is_fail, 1), else_=0)).label("fail_count"),
+        ]
+    else:
+        hitachi = models.DrillInfo.drill_machine_name < "ND41"
+        posalux = models.DrillInfo.drill_machine_name > "ND40"
+        columns = [
+            func.sum(case((hitachi, 1), else_=0)).label("hitachi_total_count"),
+            func.sum(case((hitachi & is_fail, 1), else_=0)).label("hitachi_fail_count"),
+            func.sum(case((posalux, 1), else_=0)).label("posalux_total_count"),
+            func.sum(case((posalux & is_fail, 1), else_=0)).label("posalux_fail_count"),
+        ]
+    query = select(label, *columns).filter(
+        models.DrillInfo.aoi_time.between(search_items["start_time"], search_items["end_time"])
+    )
+    if search_items.get("drill_machine_name"):
+        query = query.filter(models.DrillInfo.drill_machine_name == search_items["drill_machine_name"])
+    query = query.group_by(label)
+    result = await db.execute(query)
+    return result.all()
+
+def _select_drill_failrate_daily(*filters):
+    """由 lot_drill_result 彙總 (日, 機台, 主軸) 的總數與失敗數"""
+    day = func.date(models.DrillInfo.aoi_time)
+    return select(
+        day,
+        models.DrillInfo.drill_machine_name,
+        models.DrillInfo.drill_spindle_id,
+        func.count(models.DrillInfo.id),
+        func.coalesce(func.sum(case((models.DrillInfo.judge_ppm == 0, 1), else_=0)), 0),
+        func.now()
+    ).filter(
+        models.DrillInfo.aoi_time.isnot(None),
+        models.DrillInfo.drill_machine_name.isnot(None),
+        models.DrillInfo.drill_spindle_id.isnot(None),
+        *filters
+    ).group_by(day, models.DrillInfo.drill_machine_name, models.DrillInfo.drill_spindle_id)
+
+async def _upsert_drill_failrate_daily(db: AsyncSession, query):
+    stmt = insert(models.DrillFailrateDaily).from_select(
+        ["day", "drill_machine_name", "drill_spindle_id", "total_count", "fail_count", "update_time"], query
+    )
+    stmt = stmt.on_duplicate_key_update(
+        total_count=stmt.inserted.total_count,
+        fail_count=stmt.inserted.fail_count,
+        update_time=stmt.inserted.update_time
+    )
+    await db.execute(stmt)
+
+def _get_failrate_keys(info_list: List[schemas.DrillInfo]) -> Dict[Any, Set[Tuple[str, int]]]:
+    """本次寫入資料所影響的 日 -> {(機台, 主軸)}"""
+    groups = defaultdict(set)
+    for data in info_list:
+        aoi_time = data.get("aoi_time")
+        if aoi_time is None or data.get("drill_machine_name") is None or data.get("drill_spindle_id") is None:
+            continue
+        groups[aoi_time.date()].add((data["drill_machine_name"], data["drill_spindle_id"]))
+    return groups
+
+async def _refresh_drill_failrate_days(db: AsyncSession, groups: Dict[Any, Set[Tuple[str, int]]]):
+    for day, keys in sorted(groups.items()):
+        day_start = datetime.combine(day, datetime.min.time())
+        await _upsert_drill_failrate_daily(db, _select_drill_failrate_daily(
+            models.DrillInfo.aoi_time >= day_start,
+            models.DrillInfo.aoi_time < day_start + timedelta(days=1),
+            tuple_(models.DrillInfo.drill_machine_name, models.DrillInfo.drill_spindle_id).in_(sorted(keys))
+        ))
+
+async def refresh_drill_failrate_daily(db: AsyncSession, info_list: List[schemas.DrillInfo], commit: bool = True):
+    """重算本次寫入資料所影響的 (日, 機台, 主軸) 彙總; 以重算取代累加, 重複匯入同一筆資料不會重複計數"""
+    await _refresh_drill_failrate_days(db, _get_failrate_keys(info_list))
+    if commit:
+        await db.commit()
+    return True
+
+async def mark_drill_failrate_dirty(db: AsyncSession, info_list: List[schemas.DrillInfo], commit: bool = True):
+    """記錄待重算日彙總的 (日, 機台, 主軸), 與 drill 結果同一交易寫入; 已存在的鍵值遞增版本號"""
+    now = datetime.now()
+    rows = [{
+        "day": day,
+        "drill_machine_name": drill_machine_name,
+        "drill_spindle_id": drill_spindle_id,
+        "version": 1,
+        "create_time": now
+    } for day, keys in sorted(_get_failrate_keys(info_list).items()) for drill_machine_name, drill_spindle_id in sorted(keys)]
+    if not rows:
+        return True
+    stmt = insert(models.DrillFailrateDirty)
+    stmt = stmt.on_duplicate_key_update(version=models.DrillFailrateDirty.version + 1)
+    await db.execute(stmt, rows)
+    if commit:
+        await db.commit()
+    return True
+
+async def drain_drill_failrate_dirty(db: AsyncSession, limit: int = 500) -> int:
+    """重算最多 limit 個待更新的日彙總並移除已處理的鍵值(單一短交易), 回傳處理的鍵值數
+
+    只移除版本號未變的鍵值: 重算期間被其他交易再次標記的鍵值保留, 於下次處理時重算。
+    """
+    result = await db.execute(
+        select(models.DrillFailrateDirty).order_by(models.DrillFailrateDirty.day).limit(limit)
+    )
+    rows = result.scalars().all()
+    if not rows:
+        await db.commit()
+        return 0
+    groups = defaultdict(set)
+    for row in rows:
+        groups[row.day].add((row.drill_machine_name, row.drill_spindle_id))
+    keys = [{
+        "b_day": row.day,
+        "b_drill_machine_name": row.drill_machine_name,
+        "b_drill_spindle_id": row.drill_spindle_id,
+        "b_version": row.version
+    } for row in rows]
+
+    await _refresh_drill_failrate_days(db, groups)
+    table = models.DrillFailrateDirty.__table__
+    await db.execute(delete(table).where(
+        table.c.day == bindparam("b_day"),
+        table.c.drill_machine_name == bindparam("b_drill_machine_name"),
+        table.c.drill_spindle_id == bindparam("b_drill_spindle_id"),
+        table.c.version == bindparam("b_version")
+    ), keys)
+    await db.commit()
+    return len(keys)
+
+async def get_drill_failrate_dirty_min_day(db: AsyncSession):
+    """尚待重算的最早日期, 沒有待重算的鍵值時回傳 None"""
+    result = await db.execute(select(func.min(models.DrillFailrateDirty.day)))
+    return result.scalar()
+
+async def rebuild_drill_failrate_daily(db: AsyncSession, start_day, end_day, commit: bool = True):
+    """由原始資料重建 [start_day, end_day] 的日彙總"""
+    await db.execute(delete(models.DrillFailrateDaily).filter(
+        models.DrillFailrateDaily.day.between(start_day, end_day)
+    ))
+    await _upsert_drill_failrate_daily(db, _select_drill_failrate_daily(
+        models.DrillInfo.aoi_time >= datetime.combine(start_day, datetime.min.time()),
+        models.DrillInfo.aoi_time < datetime.combine(end_day, datetime.min.time()) + timedelta(days=1)
+    ))
+    if commit:
+        await db.commit()
+    return True
+
+async def get_drill_failrate_daily(db: AsyncSession, start_day, end_day, drill_machine_name: str = None):
+    """讀取 [start_day, end_day] 各日、各機台的總數與失敗數(主軸加總)"""
+    query = select(
+        models.DrillFailrateDaily.day,
+        models.DrillFailrateDaily.drill_machine_name,
+        func.sum(models.DrillFailrateDaily.total_count).label("total_count"),
+        func.sum(models.DrillFailrateDaily.fail_count).label("fail_count")
+    ).filter(models.DrillFailrateDaily.day.between(start_day, end_day))
+    if drill_machine_name:
+        query = query.filter(models.DrillFailrateDaily.drill_machine_name == drill_machine_name)
+    query = query.group_by(models.DrillFailrateDaily.day, models.DrillFailrateDaily.drill_machine_name)
+    result = await db.execute(query)
+    return result.all()
+
 async def get_drill_failrate_info_by_datetimelimit_and_machine_name2(db: AsyncSession, search_items: schemas.SearchFailrate)->Dict[str, Any]:
     query = select(
         models.DrillInfo.drill_machine_name,
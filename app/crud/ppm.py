@@ -3,7 +3,7 @@ from app.schemas import ppm as schemas
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
-from typing import List
+from typing import Iterable, List
 
 
 # CRUD 操作：PPMArLimitInfo 和 PPMCriteriaLimitInfo 相關資料表
@@ -66,6 +66,14 @@ async def get_ppm_criteria_limit_info(db: AsyncSession, product_name: str):
     result = await db.execute(stmt)
     return result.scalars().first()
 
+async def get_ppm_criteria_limit_info_by_names(db: AsyncSession, product_names: Iterable[str]):
+    product_names = list(dict.fromkeys(name for name in product_names if name))
+    if not product_names:
+        return []
+    stmt = select(models.PPMCriteriaLimitInfo).filter(models.PPMCriteriaLimitInfo.product_name.in_(product_names))
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
 async def get_ppm_criteria_limit_info_all(db: AsyncSession):
     stmt = select(models.PPMCriteriaLimitInfo).order_by(models.PPMCriteriaLimitInfo.id)
     result = await db.execute(stmt)
@@ -1,8 +1,14 @@
 from app.models import mysql_models as models 
 from app.schemas import predcition as schemas
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy import select
-from typing import List
+from typing import Iterable, List
+
+PREDICTION_RECORD_UPSERT_COLUMNS = (
+    "image_path", "product_name", "image_mtime", "image_size", "classification_code",
+    "classification_model", "mahalanobis_distance", "classification_time"
+)
 
 async def create_prediction_record_all(db: AsyncSession, info_list: List[schemas.PredictionRecord]):
     db_prediction_info = [models.AIPredictionRecord(**data) for data in info_list]
@@ -10,8 +16,35 @@ async def create_prediction_record_all(db: AsyncSession, info_list: List[schemas
     await db.commit()
     return True
 
+async def upsert_prediction_record_all(db: AsyncSession, info_list: List[schemas.PredictionRecord], chunk_size: int = 500, commit: bool = True):
+    """以 executemany INSERT ... ON DUPLICATE KEY UPDATE 批次寫入"""
+    stmt = insert(models.AIPredictionRecord)
+    stmt = stmt.on_duplicate_key_update({
+        column: stmt.inserted[column]
+        for column in PREDICTION_RECORD_UPSERT_COLUMNS
+        if column not in ("image_path", "product_name")
+    })
+    rows = [{column: data.get(column) for column in PREDICTION_RECORD_UPSERT_COLUMNS} for data in info_list]
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+    if commit:
+        await db.commit()
+    return True
+
 async def get_prediction_record_check(db: AsyncSession, image_path: str):
     stmt = select(models.AIPredictionRecord).filter(models.AIPredictionRecord.image_path == image_path)
     result = await db.execute(stmt)
     exists = result.scalars().first() is not None
-    return exists
\ No newline at end of file
+    return exists
+
+async def get_prediction_record_by_image_paths(db: AsyncSession, image_paths: Iterable[str], chunk_size: int = 500):
+    image_paths = list(dict.fromkeys(path for path in image_paths if path))
+    data = []
+    for i in range(0, len(image_paths), chunk_size):
+        stmt = select(models.AIPredictionRecord).filter(
+            models.AIPredictionRecord.image_path.in_(image_paths[i:i + chunk_size]),
+            models.AIPredictionRecord.classification_code.isnot(None)
+        )
+        result = await db.execute(stmt)
+        data.extend(result.scalars().all())
+    return data
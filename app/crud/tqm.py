@@ -1,7 +1,14 @@
 from app.models import mssql_models as models 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc
-from typing import List, Optional
+from sqlalchemy import select, desc, and_, or_, func
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# MSSQL 單一語句最多 2100 個參數, IN (...) 查詢需分段
+IN_CLAUSE_CHUNK_SIZE = 1000
+
+def _chunked(values: Iterable[int], size: int = IN_CLAUSE_CHUNK_SIZE) -> List[List[int]]:
+    items = list(dict.fromkeys(v for v in values if v is not None))
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 def get_board_info_count(db: Session) -> int:
     stmt = select(models.BoardInfo).filter(models.BoardInfo.AOITime !="")
@@ -29,27 +36,54 @@ def get_board_info_by_first_aoitime(db: Session) -> Optional[models.BoardInfo]:
     stmt = select(models.BoardInfo).filter(
         models.BoardInfo.Lot != "",
         models.BoardInfo.AOITime != ""
-    ).order_by(models.BoardInfo.AOITime)
+    ).order_by(models.BoardInfo.AOITime).limit(1)
     result = db.execute(stmt)
     data = result.scalars().first()
     return data
 
+def get_board_watermark(db: Session) -> Tuple[Optional[int], Optional[str]]:
+    """取得 tBoard 最大 ID_B 與 AOITime, 用來低成本判斷是否有新資料"""
+    stmt = select(func.max(models.BoardInfo.ID_B), func.max(models.BoardInfo.AOITime))
+    result = db.execute(stmt).first()
+    return (result[0], result[1]) if result else (None, None)
+
 def get_board_info_by_last_aoitime(db: Session) -> Optional[models.BoardInfo]:
     stmt = select(models.BoardInfo).filter(
         models.BoardInfo.Lot != "",
         models.BoardInfo.AOITime != "",
         # models.BoardInfo.DrillMachineID.not_in([0, 2, 8, 14])
-    ).order_by(desc(models.BoardInfo.AOITime))
+    ).order_by(desc(models.BoardInfo.AOITime)).limit(1)
     result = db.execute(stmt)
     data = result.scalars().first()
     return data
 
-def get_boards_info_by_datetime(db: Session, start_time:str) -> List[models.BoardInfo]:
+def get_boards_info_by_datetime(db: Session, start_time:str, limit: int = 500) -> List[models.BoardInfo]:
     stmt = select(models.BoardInfo).filter(
         models.BoardInfo.Lot != "",
         models.BoardInfo.AOITime > start_time,
         # models.BoardInfo.DrillMachineID.not_in([0, 2, 8, 14])
-    ).order_by(models.BoardInfo.AOITime).limit(500)
+    ).order_by(models.BoardInfo.AOITime).limit(limit)
+    result = db.execute(stmt)
+    data = result.scalars().all()
+    return data
+
+def get_boards_info_by_cursor(db: Session, last_aoi_time: str, last_board_id: int, limit: int = 500,
+                              end_aoi_time: Optional[str] = None) -> List[models.BoardInfo]:
+    """以 (AOITime, ID_B) keyset cursor 取得下一頁 Board, 相同 AOITime 的 Board 不會被略過; end_aoi_time 為上限(不含)
+
+    尚無 checkpoint 時 cursor 為 ("", 0), AOITime 為空白的 Board 不匯入(與原本的 get_board_info_by_first_aoitime 相同)。
+    """
+    stmt = select(models.BoardInfo).filter(
+        models.BoardInfo.Lot != "",
+        models.BoardInfo.AOITime != "",
+        or_(
+            models.BoardInfo.AOITime > last_aoi_time,
+            and_(models.BoardInfo.AOITime == last_aoi_time, models.BoardInfo.ID_B > last_board_id)
+        )
+    )
+    if end_aoi_time:
+        stmt = stmt.filter(models.BoardInfo.AOITime < end_aoi_time)
+    stmt = stmt.order_by(models.BoardInfo.AOITime, models.BoardInfo.ID_B).limit(limit)
     result = db.execute(stmt)
     data = result.scalars().all()
     return data
@@ -82,4 +116,44 @@ def get_machine_name(db: Session, machine_id: int):
     stmt = select(models.MachineInfo).filter(models.MachineInfo.ID_DM == machine_id)
     result = db.execute(stmt)
     data = result.scalars().first()
-    return data
\ No newline at end of file
+    return data
+
+def get_measure_info_by_board_ids(db: Session, board_ids: Iterable[int]) -> Dict[int, models.MeasureInfo]:
+    data = {}
+    for chunk in _chunked(board_ids):
+        stmt = select(models.MeasureInfo).filter(
+            models.MeasureInfo.BoardID.in_(chunk),
+            models.MeasureInfo.ToolID == -1,
+        ).order_by(models.MeasureInfo.ID_M)
+        for measure in db.execute(stmt).scalars():
+            data.setdefault(measure.BoardID, measure)
+    return data
+
+def get_product_name_by_ids(db: Session, product_ids: Iterable[int]) -> Dict[int, str]:
+    data = {}
+    for chunk in _chunked(product_ids):
+        stmt = select(models.ProductInfo.ID_PD, models.ProductInfo.Name_PD).filter(models.ProductInfo.ID_PD.in_(chunk))
+        for product_id, product_name in db.execute(stmt):
+            data[product_id] = product_name
+    return data
+
+def get_machine_info_by_ids(db: Session, machine_ids: Iterable[int]) -> Dict[int, models.MachineInfo]:
+    data = {}
+    for chunk in _chunked(machine_ids):
+        stmt = select(models.MachineInfo).filter(models.MachineInfo.ID_DM.in_(chunk))
+        for machine in db.execute(stmt).scalars():
+            data[machine.ID_DM] = machine
+    return data
+
+def get_machine_info_all(db: Session) -> List[models.MachineInfo]:
+    stmt = select(models.MachineInfo).order_by(models.MachineInfo.ID_DM)
+    result = db.execute(stmt)
+    return result.scalars().all()
+
+def get_product_name_after_id(db: Session, last_product_id: int = 0) -> Dict[int, str]:
+    """取得 ID_PD 大於 last_product_id 的產品名稱(0 為全部), 供增量更新使用"""
+    stmt = select(models.ProductInfo.ID_PD, models.ProductInfo.Name_PD).filter(
+        models.ProductInfo.ID_PD > last_product_id
+    ).order_by(models.ProductInfo.ID_PD)
+    result = db.execute(stmt)
+    return {product_id: product_name for product_id, product_name in result}
@@ -0,0 +1,8 @@
+-- 001: TQM 匯入進度 checkpoint (keyset cursor: tBoard.AOITime, tBoard.ID_B)
+CREATE TABLE IF NOT EXISTS `ingestion_checkpoint` (
+    `name` VARCHAR(64) NOT NULL,
+    `aoi_time` VARCHAR(32) NOT NULL DEFAULT '',
+    `board_id` INT NOT NULL DEFAULT 0,
+    `update_time` DATETIME NULL,
+    PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci ROW_FORMAT=DYNAMIC;
@@ -0,0 +1,3 @@
+-- 002: lot_drill_result 重複檢查使用的複合索引 (lot_number, drill_spindle_id, aoi_time)
+CREATE INDEX `ix_lot_drill_result_lot_spindle_aoi`
+    ON `lot_drill_result` (`lot_number`, `drill_spindle_id`, `aoi_time`);
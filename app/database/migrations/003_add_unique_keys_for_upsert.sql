@@ -0,0 +1,22 @@
+-- 003: 批次 upsert 使用的唯一鍵
+-- 先移除既有重複資料(保留 lot_drill_result 最早的一筆、prediction_record 最新的一筆)
+DELETE t1 FROM `lot_drill_result` t1
+    JOIN `lot_drill_result` t2
+        ON t1.`lot_number` = t2.`lot_number`
+        AND t1.`drill_spindle_id` = t2.`drill_spindle_id`
+        AND t1.`aoi_time` = t2.`aoi_time`
+        AND t1.`id` > t2.`id`;
+
+DELETE t1 FROM `prediction_record` t1
+    JOIN `prediction_record` t2
+        ON t1.`image_path` = t2.`image_path`
+        AND t1.`product_name` = t2.`product_name`
+        AND t1.`id` < t2.`id`;
+
+-- 唯一鍵取代 002 建立的重複檢查索引
+ALTER TABLE `lot_drill_result`
+    ADD UNIQUE KEY `uq_lot_drill_result_lot_spindle_aoi` (`lot_number`, `drill_spindle_id`, `aoi_time`),
+    DROP INDEX `ix_lot_drill_result_lot_spindle_aoi`;
+
+ALTER TABLE `prediction_record`
+    ADD UNIQUE KEY `uq_prediction_record_image_product` (`image_path`, `product_name`);
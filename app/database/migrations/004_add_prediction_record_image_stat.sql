@@ -0,0 +1,4 @@
+-- 004: prediction_record 記錄分類當下的圖片修改時間與大小, 作為分類結果快取的驗證條件
+ALTER TABLE `prediction_record`
+    ADD COLUMN `image_mtime` DATETIME NULL AFTER `product_name`,
+    ADD COLUMN `image_size` BIGINT NULL AFTER `image_mtime`;
@@ -0,0 +1,18 @@
+-- 005: PPM 警告郵件 outbox (與 drill 結果同一交易寫入, 由 AlertSender 非同步寄送)
+CREATE TABLE IF NOT EXISTS `alert_outbox` (
+    `id` INT NOT NULL AUTO_INCREMENT,
+    `machine_name` VARCHAR(32) NULL,
+    `spindle_id` INT NULL,
+    `lot_number` VARCHAR(32) NULL,
+    `aoi_time` VARCHAR(32) NULL,
+    `payload` TEXT NULL,
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending',
+    `attempts` INT NOT NULL DEFAULT 0,
+    `next_attempt_time` DATETIME NULL,
+    `last_error` VARCHAR(512) NULL,
+    `create_time` DATETIME NULL,
+    `sent_time` DATETIME NULL,
+    PRIMARY KEY (`id`),
+    UNIQUE KEY `uq_alert_outbox_lot_spindle_aoi` (`lot_number`, `spindle_id`, `aoi_time`),
+    KEY `ix_alert_outbox_status_next_attempt` (`status`, `next_attempt_time`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci ROW_FORMAT=DYNAMIC;
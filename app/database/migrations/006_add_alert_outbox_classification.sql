@@ -0,0 +1,3 @@
+-- 006: 警告先於 AI 分類寄出, AI 分類結果於 drill 結果儲存時補寫至尚未寄出的警告
+ALTER TABLE `alert_outbox`
+    ADD COLUMN `classification_result` VARCHAR(8) NULL AFTER `payload`;
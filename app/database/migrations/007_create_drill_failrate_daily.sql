@@ -0,0 +1,25 @@
+-- 007: 失效率日彙總表 (day, 機台, 主軸), TQM 匯入於批次交易提交後重算受影響的日彙總 (待重算鍵值見 010)
+CREATE TABLE IF NOT EXISTS `drill_failrate_daily` (
+    `day` DATE NOT NULL,
+    `drill_machine_name` VARCHAR(8) NOT NULL,
+    `drill_spindle_id` INT NOT NULL,
+    `total_count` INT NOT NULL DEFAULT 0,
+    `fail_count` INT NOT NULL DEFAULT 0,
+    `update_time` DATETIME NULL,
+    PRIMARY KEY (`day`, `drill_machine_name`, `drill_spindle_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci ROW_FORMAT=DYNAMIC;
+
+-- 重算日彙總時依 aoi_time 範圍查詢原始資料
+CREATE INDEX `ix_lot_drill_result_aoi_time`
+    ON `lot_drill_result` (`aoi_time`);
+
+-- 既有資料的初始彙總 (之後可用 python -m app.rollup 重建)
+INSERT INTO `drill_failrate_daily` (`day`, `drill_machine_name`, `drill_spindle_id`, `total_count`, `fail_count`, `update_time`)
+SELECT DATE(`aoi_time`), `drill_machine_name`, `drill_spindle_id`, COUNT(*), SUM(`judge_ppm` = 0), NOW()
+FROM `lot_drill_result`
+WHERE `aoi_time` IS NOT NULL AND `drill_machine_name` IS NOT NULL AND `drill_spindle_id` IS NOT NULL
+GROUP BY DATE(`aoi_time`), `drill_machine_name`, `drill_spindle_id`
+ON DUPLICATE KEY UPDATE
+    `total_count` = VALUES(`total_count`),
+    `fail_count` = VALUES(`fail_count`),
+    `update_time` = VALUES(`update_time`);
@@ -0,0 +1,6 @@
+-- 008: 待分類(找不到圖片或 AI 分類失敗)資料的重試次數, 與重新分類使用的索引
+ALTER TABLE `lot_drill_result`
+    ADD COLUMN `classification_attempts` INT NOT NULL DEFAULT 0 AFTER `classification_time`;
+
+CREATE INDEX `ix_lot_drill_result_classification_aoi_time`
+    ON `lot_drill_result` (`classification_result`, `aoi_time`);
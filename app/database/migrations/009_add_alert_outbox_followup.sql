@@ -0,0 +1,3 @@
+-- 009: AI 分類結果晚於警告寄出時, 將已寄出的警告改為待寄送的更新通知
+ALTER TABLE `alert_outbox`
+    ADD COLUMN `is_followup` TINYINT(1) NOT NULL DEFAULT 0 AFTER `classification_result`;
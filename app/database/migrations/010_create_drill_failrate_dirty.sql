@@ -0,0 +1,11 @@
+-- 010: 待重算的失效率日彙總鍵值 (day, 機台, 主軸)
+-- TQM 匯入於寫入 drill 結果的同一交易內標記, 交易提交後以短交易重算日彙總並移除;
+-- 程序於兩者之間中止時, 下次匯入開始時繼續重算, 日彙總不會永久停留在舊值
+CREATE TABLE IF NOT EXISTS `drill_failrate_dirty` (
+    `day` DATE NOT NULL,
+    `drill_machine_name` VARCHAR(8) NOT NULL,
+    `drill_spindle_id` INT NOT NULL,
+    `version` INT NOT NULL DEFAULT 1,
+    `create_time` DATETIME NULL,
+    PRIMARY KEY (`day`, `drill_machine_name`, `drill_spindle_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci ROW_FORMAT=DYNAMIC;
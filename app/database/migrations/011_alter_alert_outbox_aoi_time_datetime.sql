@@ -0,0 +1,4 @@
+-- 011: alert_outbox.aoi_time 改為 DATETIME, 與 lot_drill_result.aoi_time 相同型別
+-- 補寫分類結果時以 lot_drill_result 的 aoi_time (datetime) 比對, 字串欄位會逐列轉型且無法使用唯一索引
+ALTER TABLE `alert_outbox`
+    MODIFY COLUMN `aoi_time` DATETIME NULL;
@@ -1,17 +1,21 @@
 # 只放 MySQL models
-from sqlalchemy.schema import Column
-from sqlalchemy.types import Boolean, DateTime, Float, Integer, String
+from sqlalchemy.schema import Column, Index, UniqueConstraint
+from sqlalchemy.types import BigInteger, Boolean, Date, DateTime, Float, Integer, String, Text
 from app.database.mysql import mysql_base
 
 
 class DrillInfo(mysql_base):
     __tablename__ = "lot_drill_result"
-    __table_args__ = {
-        'mysql_engine': 'InnoDB', 
-        'mysql_charset': 'utf8mb4', 
-        'mysql_collate': 'utf8mb4_unicode_ci', 
-        'mysql_row_format': 'DYNAMIC'
-    }
+    __table_args__ = (
+        UniqueConstraint("lot_number", "drill_spindle_id", "aoi_time", name="uq_lot_drill_result_lot_spindle_aoi"),
+        Index("ix_lot_drill_result_classification_aoi_time", "classification_result", "aoi_time"),
+        {
+            'mysql_engine': 'InnoDB', 
+            'mysql_charset': 'utf8mb4', 
+            'mysql_collate': 'utf8mb4_unicode_ci', 
+            'mysql_row_format': 'DYNAMIC'
+        }
+    )
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     product_name = Column(String(64))
     lot_number = Column(String(32))
@@ -25,12 +29,13 @@ class DrillInfo(mysql_base):
     cpk = Column(Float)
     cp = Column(Float)
     ca = Column(Float)
-    aoi_time = Column(DateTime)
+    aoi_time = Column(DateTime, index=True)
     ratio_target = Column(Float)
     image_path = Column(String(128), index=True)
     image_update_time = Column(DateTime)
     classification_result = Column(String(8))
     classification_time = Column(DateTime)
+    classification_attempts = Column(Integer, default=0)
     feedback_result = Column(String(8))
     report_ee = Column(String(16))
     report_time = Column(DateTime)
@@ -124,15 +129,20 @@ class UserModificationRecord(mysql_base):
 
 class AIPredictionRecord(mysql_base):
     __tablename__ = "prediction_record"
-    __table_args__ = {
-        'mysql_engine': 'InnoDB', 
-        'mysql_charset': 'utf8mb4', 
-        'mysql_collate': 'utf8mb4_unicode_ci', 
-        'mysql_row_format': 'DYNAMIC'
-    }
+    __table_args__ = (
+        UniqueConstraint("image_path", "product_name", name="uq_prediction_record_image_product"),
+        {
+            'mysql_engine': 'InnoDB', 
+            'mysql_charset': 'utf8mb4', 
+            'mysql_collate': 'utf8mb4_unicode_ci', 
+            'mysql_row_format': 'DYNAMIC'
+        }
+    )
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     image_path = Column(String(128), index=True)
     product_name = Column(String(64))
+    image_mtime = Column(DateTime)
+    image_size = Column(BigInteger)
     classification_code = Column(String(8))
     classification_model = Column(String(32))
     mahalanobis_distance = Column(Float)
@@ -149,5 +159,73 @@ class AIClassificationCode(mysql_base):
     code = Column(String(8), primary_key=True, index=True)
     directions = Column(String(64))
 
+class IngestionCheckpoint(mysql_base):
+    __tablename__ = "ingestion_checkpoint"
+    __table_args__ = {
+        'mysql_engine': 'InnoDB', 
+        'mysql_charset': 'utf8mb4', 
+        'mysql_collate': 'utf8mb4_unicode_ci', 
+        'mysql_row_format': 'DYNAMIC'
+    }
+    name = Column(String(64), primary_key=True, index=True)
+    aoi_time = Column(String(32), default="")
+    board_id = Column(Integer, default=0)
+    update_time = Column(DateTime)
+
+class AlertOutbox(mysql_base):
+    __tablename__ = "alert_outbox"
+    __table_args__ = (
+        UniqueConstraint("lot_number", "spindle_id", "aoi_time", name="uq_alert_outbox_lot_spindle_aoi"),
+        {
+            'mysql_engine': 'InnoDB', 
+            'mysql_charset': 'utf8mb4', 
+            'mysql_collate': 'utf8mb4_unicode_ci', 
+            'mysql_row_format': 'DYNAMIC'
+        }
+    )
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    machine_name = Column(String(32))
+    spindle_id = Column(Integer)
+    lot_number = Column(String(32))
+    aoi_time = Column(DateTime)
+    payload = Column(Text)
+    classification_result = Column(String(8))
+    is_followup = Column(Boolean, default=False)
+    status = Column(String(16), default="pending")
+    attempts = Column(Integer, default=0)
+    next_attempt_time = Column(DateTime)
+    last_error = Column(String(512))
+    create_time = Column(DateTime)
+    sent_time = Column(DateTime)
+
+class DrillFailrateDaily(mysql_base):
+    __tablename__ = "drill_failrate_daily"
+    __table_args__ = {
+        'mysql_engine': 'InnoDB', 
+        'mysql_charset': 'utf8mb4', 
+        'mysql_collate': 'utf8mb4_unicode_ci', 
+        'mysql_row_format': 'DYNAMIC'
+    }
+    day = Column(Date, primary_key=True)
+    drill_machine_name = Column(String(8), primary_key=True)
+    drill_spindle_id = Column(Integer, primary_key=True)
+    total_count = Column(Integer, default=0)
+    fail_count = Column(Integer, default=0)
+    update_time = Column(DateTime)
+
+class DrillFailrateDirty(mysql_base):
+    __tablename__ = "drill_failrate_dirty"
+    __table_args__ = {
+        'mysql_engine': 'InnoDB', 
+        'mysql_charset': 'utf8mb4', 
+        'mysql_collate': 'utf8mb4_unicode_ci', 
+        'mysql_row_format': 'DYNAMIC'
+    }
+    day = Column(Date, primary_key=True)
+    drill_machine_name = Column(String(8), primary_key=True)
+    drill_spindle_id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=1)
+    create_time = Column(DateTime)
+
 # 若要自動建立資料表，請取消下列註解
 # MYSQLBase.metadata.create_all(bind=mysql_engine)
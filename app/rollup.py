@@ -0,0 +1,58 @@
+"""
+# app/rollup.py
+失效率日彙總表 (drill_failrate_daily) 重建: 由 lot_drill_result 原始資料重新計算 [start, end] 的日彙總
+
+    python -m app.rollup --start 2024-01-01 --end 2024-12-31 --chunk-days 7
+
+TQM 匯入時會在寫入 drill 結果的同一交易內記錄受影響的鍵值(drill_failrate_dirty), 提交後重算日彙總;
+此指令用於手動修改原始資料或修復彙總之後。
+"""
+import asyncio
+import argparse
+import datetime
+from app.database import mysql_session
+from app.crud import drill as drill_crud
+from app.services.failrate_service import invalidate_failrate_cache
+from app.utils.logger import Logger
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+async def rebuild_rollup(start_day: datetime.date, end_day: datetime.date, chunk_days: int = 7) -> int:
+    """依 chunk_days 分段重建, 每段一個交易, 回傳重建的段數"""
+    logger = Logger().get_logger()
+    chunk_days = max(1, chunk_days)
+    chunks = 0
+    chunk_start = start_day
+    async with mysql_session() as mydb:
+        while chunk_start <= end_day:
+            chunk_end = min(end_day, chunk_start + datetime.timedelta(days=chunk_days - 1))
+            try:
+                await drill_crud.rebuild_drill_failrate_daily(mydb, chunk_start, chunk_end)
+            except Exception as err:
+                logger.error(f"重建失效率日彙總錯誤 ({chunk_start} ~ {chunk_end}): {err}")
+                await mydb.rollback()
+                raise
+            logger.info(f"已重建失效率日彙總: {chunk_start} ~ {chunk_end}")
+            chunks += 1
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+    await invalidate_failrate_cache()
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建失效率日彙總表")
+    parser.add_argument("--start", required=True, help="開始日期 (含), 例如 '2024-01-01'")
+    parser.add_argument("--end", required=True, help="結束日期 (含), 例如 '2024-12-31'")
+    parser.add_argument("--chunk-days", type=int, default=7, help="每個交易重建的天數")
+    args = parser.parse_args()
+
+    start_day = datetime.datetime.strptime(args.start, DAY_FORMAT).date()
+    end_day = datetime.datetime.strptime(args.end, DAY_FORMAT).date()
+    if start_day > end_day:
+        parser.error("開始日期不可晚於結束日期")
+    print(asyncio.run(rebuild_rollup(start_day, end_day, args.chunk_days)))
+
+
+if __name__ == "__main__":
+    main()
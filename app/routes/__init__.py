@@ -8,5 +8,6 @@ from .feedback import router as feedback_router
 from .mail import router as mail_router
 from .ppm import router as ppm_router
 from .user import router as user_router
+from .backfill import router as backfill_router
 
-__all__ = ["drill_router", "feedback_router", "mail_router", "ppm_router", "user_router"]
\ No newline at end of file
+__all__ = ["drill_router", "feedback_router", "mail_router", "ppm_router", "user_router", "backfill_router"]
\ No newline at end of file
@@ -0,0 +1,78 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from app.backfill import run_backfill, get_backfill_progress, split_range
+from app.utils.response_helper import resp
+from app.utils.data_transfer import DataTransfer
+from app.utils.logger import Logger
+from app.schemas.api import Resp as Response
+from app.schemas import backfill as schemas
+
+router = APIRouter()
+transfer = DataTransfer()
+logger = Logger().get_logger()
+
+# 執行中的 backfill (同一個 API 程序同時間只執行一個)
+backfill_state = {"task": None, "request": None}
+
+
+def _validate_range(start_time: str, end_time: str):
+    if not start_time or not transfer.validate_datetime_format(start_time):
+        raise HTTPException(status_code=422, detail="Start time format error!")
+    if not end_time or not transfer.validate_datetime_format(end_time):
+        raise HTTPException(status_code=422, detail="End time format error!")
+    if start_time >= end_time:
+        raise HTTPException(status_code=422, detail="Start time must be earlier than end time!")
+
+
+@router.post("/api/drill/backfill", response_model=Response)
+async def start_backfill(body: schemas.BackfillRequest):
+    """啟動歷史資料 backfill, 於背景以 process pool 平行匯入\n
+    Args: \n
+        start_time: 開始時間(含), 格式為YYYY-MM-DD HH:MM:SS
+        end_time: 結束時間(不含), 格式為YYYY-MM-DD HH:MM:SS
+        shards: 切分的 shard 數量
+        workers: 同時執行的程序數量
+        fetch_interval: 每次擷取 Board 之間的間隔(秒)
+    Response: \n
+        Object:{code: 執行結果(0是success, 1是fail), error: 錯誤訊息, data: [{shard 時間範圍}]}
+    """
+    _validate_range(body.start_time, body.end_time)
+    if body.shards < 1 or body.workers < 1:
+        raise HTTPException(status_code=422, detail="Shards and workers must be positive!")
+    task = backfill_state["task"]
+    if task is not None and not task.done():
+        return resp(f"Backfill is running: {backfill_state['request']}")
+    try:
+        shard_ranges = split_range(body.start_time, body.end_time, body.shards)
+
+        async def run():
+            try:
+                await asyncio.to_thread(
+                    run_backfill, body.start_time, body.end_time, body.shards, body.workers, body.fetch_interval
+                )
+            except Exception as err:
+                logger.error(f"backfill 執行錯誤: {err}")
+
+        backfill_state["request"] = body.dict()
+        backfill_state["task"] = asyncio.create_task(run())
+        return resp(None, [{"start": start, "end": end} for start, end in shard_ranges])
+    except Exception as err:
+        return resp(str(err))
+
+
+@router.get("/api/drill/backfill", response_model=Response)
+async def get_backfill_status(start_time: str, end_time: str, shards: int = 4):
+    """取得歷史資料 backfill 各 shard 的 checkpoint 進度\n
+    Args: \n
+        start_time: 開始時間(含), 格式為YYYY-MM-DD HH:MM:SS
+        end_time: 結束時間(不含), 格式為YYYY-MM-DD HH:MM:SS
+        shards: 切分的 shard 數量, 需與啟動時相同
+    Response: \n
+        Object:{code: 執行結果(0是success, 1是fail), error: 錯誤訊息, data: [{shard 進度}]}
+    """
+    _validate_range(start_time, end_time)
+    try:
+        data = await get_backfill_progress(start_time, end_time, shards)
+        return resp(None, data)
+    except Exception as err:
+        return resp(str(err))
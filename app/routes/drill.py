@@ -1,14 +1,17 @@
 import json
 import datetime
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from app.utils.response_helper import resp
-from app.utils.redis_helper import get_cache, set_cache, exists_cache
 from app.utils.data_transfer import DataTransfer
+from app.utils.cursor_helper import encode_cursor, decode_cursor
 from app.database.mysql import get_mysql_db
+from app.config import Config
 from app.crud import drill as crud
+from app.services.failrate_service import get_failrate_data
 from app.schemas.api import Resp as Response
 from app.schemas import drill as schemas
 
@@ -17,22 +20,49 @@ router = APIRouter()
 
 @router.get("/api/drill/judge", response_model=Response)
 async def get_drill_judge_result(
-    start_time: datetime.datetime, end_time: datetime.datetime, db: AsyncSession = Depends(get_mysql_db)
+    start_time: datetime.datetime, end_time: datetime.datetime,
+    limit: Optional[int] = None, cursor: Optional[str] = None, stream: bool = False,
+    db: AsyncSession = Depends(get_mysql_db)
 ):
     """取得鑽孔機鑽孔結果\n
     Args: \n
         start_time: 開始時間, 格式為YYYY-MM-DD HH:MM:SS
         end_time: 結束時間, 格式為YYYY-MM-DD HH:MM:SS
+        limit: 每頁筆數, 可選; 指定 limit 或 cursor 時以 (aoi_time, id) 分頁
+        cursor: 上一頁回傳的 next_cursor, 可選
+        stream: 是否以 NDJSON 串流回傳全部資料(每行一筆), 可搭配 cursor 由中斷處接續
     Response: \n
         Object:{code: 執行結果(0是success, 1是fail), error: 錯誤訊息, data: [內容]}
+        分頁時 data 為 {items: [內容], next_cursor: 下一頁 token(最後一頁為 null)}
     """
     if start_time and not end_time:
         raise HTTPException(status_code=422, detail="end_time could not be empty")
     if end_time and not start_time:
         raise HTTPException(status_code=422, detail="start_time could not be empty")
+    if limit is not None and not 0 < limit <= int(Config.JUDGE_PAGE_MAX_SIZE):
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {Config.JUDGE_PAGE_MAX_SIZE}")
     try:
-        data = await crud.get_judge_info(db, start_time, end_time)
-        return resp(None, data)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="cursor format error!")
+
+    if stream:
+        async def ndjson_lines():
+            async for chunk in crud.stream_judge_info(
+                db, start_time, end_time, after, chunk_size=int(Config.JUDGE_STREAM_CHUNK_SIZE)
+            ):
+                # 與非串流回應相同的編碼方式(datetime 為 ISO 格式)
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in jsonable_encoder(chunk)).encode("utf-8")
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    try:
+        if limit is None and after is None:
+            data = await crud.get_judge_info(db, start_time, end_time)
+            return resp(None, data)
+        items, next_after = await crud.get_judge_info_page(
+            db, start_time, end_time, limit or int(Config.JUDGE_PAGE_SIZE), after
+        )
+        return resp(None, {"items": items, "next_cursor": encode_cursor(*next_after) if next_after else None})
     except Exception as err:
         return resp(str(err))
 
@@ -108,19 +138,8 @@ async def get_drill_failrate_info(
     if not freq_type or freq_type not in ["day", "week", "month"]:
         raise HTTPException(status_code=422, detail="Freq type could not be empty!")
     try:
-        key = f"mysql.k9.drill.failrate.{start_time}.{end_time}.{freq_type}.{drill_machine_name}"
-        if await exists_cache(key):
-            data = await get_cache(key)
-        else:
-            search_items = {
-                "start_time": start_time,
-                "end_time": end_time,
-                "drill_machine_name": drill_machine_name
-            }
-            search_data = await crud.get_drill_failrate_info_by_datetimelimit_and_machine_name2(db, search_items)
-            datetime_limit = transfer.get_datetime_transfer(start_time, end_time, freq_type)
-            data = transfer.get_failrate_filter_data(search_data, datetime_limit, drill_machine_name)
-            await set_cache(key, jsonable_encoder(data), ex=60*10)
+        # 以區間為單位快取(見 failrate_service), 滑動查詢範圍時已結束的區間不需重新計算
+        data = await get_failrate_data(db, start_time, end_time, freq_type, drill_machine_name)
         return resp(None, data)
     except Exception as err:
         return resp(str(err))
\ No newline at end of file
@@ -7,6 +7,7 @@ from typing import Optional
 from app.utils.response_helper import resp
 from app.utils.redis_helper import get_cache, set_cache, exists_cache
 from app.utils.data_transfer import DataTransfer
+from app.services.criteria_service import invalidate_product_criteria
 from app.database.mysql import get_mysql_db
 from app.crud import ppm as crud
 from app.schemas.api import Resp as Response
@@ -62,6 +63,7 @@ async def add_ppm_criteria_limit_info(body: schemas.PPMCriteriaLimitInfo, db: As
             "update_time": body.update_time if body.update_time else None
         }
         data = await crud.create_ppm_criteria_limit_info(db, ppm_criteria_limit_info)
+        await invalidate_product_criteria(body.product_name)
         key = "mysql.k9.drill.criteria"
         criteria_limit_list = await crud.get_ppm_criteria_limit_info_all(db)
         await set_cache(key, jsonable_encoder(criteria_limit_list))
@@ -85,6 +87,7 @@ async def update_ppm_criteria_limit_info(body: schemas.PPMCriteriaLimitInfo, db:
     }
     try:
         data = await crud.update_ppm_criteria_limit_info(db, update_items)
+        await invalidate_product_criteria(body.product_name)
         key = "mysql.k9.drill.criteria"
         criteria_limit_list = await crud.get_ppm_criteria_limit_info_all(db)
         await set_cache(key, jsonable_encoder(criteria_limit_list))
@@ -97,6 +100,7 @@ async def del_ppm_criteria_limit_info(product_name: str, db: AsyncSession = Depe
     if not product_name:
         raise HTTPException(status_code=422, detail="Product Name could not be empty")
     result = await crud.del_ppm_criteria_limit_info(db, product_name)
+    await invalidate_product_criteria(product_name)
     data = "Delete Success" if result == 1 else "Delete Fail"
     key = "mysql.k9.drill.arlimit"
     criteria_limit_list = await crud.get_ppm_criteria_limit_info_all(db)
@@ -142,6 +146,7 @@ async def update_ppm_ar_limit_info(body: dict, db: AsyncSession = Depends(get_my
                     ar_info=ar_limit_list
                 )
                 await crud.update_ppm_criteria_limit_info(db, update_items)
+        await invalidate_product_criteria()
         criteria_key = "mysql.k9.drill.criteria"
         criteria_limit_list = await crud.get_ppm_criteria_limit_info_all(db)
         await set_cache(criteria_key, jsonable_encoder(criteria_limit_list))
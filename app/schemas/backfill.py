@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+class BackfillRequest(BaseModel):
+    start_time: str
+    end_time: str
+    shards: int = 4
+    workers: int = 2
+    fetch_interval: float = 0
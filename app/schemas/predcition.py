@@ -1,9 +1,12 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 class PredictionRecord(BaseModel):
     image_path: str
     product_name: str
+    image_mtime: Optional[datetime] = None
+    image_size: Optional[int] = None
     classification_code: str
     classification_model: str
     mahalanobis_distance: float
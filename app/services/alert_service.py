@@ -0,0 +1,230 @@
+import json
+import time
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.database import mysql_session, redis_client
+from app.crud import alert as alert_crud, mail as mail_crud
+from app.services.email_service import EmailClient
+from app.utils.data_transfer import DataTransfer
+from app.utils.lock_helper import single_runner
+from app.utils.logger import Logger
+from app.config import Config
+
+# 重試間隔上限(秒)
+MAX_RETRY_DELAY = 3600
+
+# 節流 key: (機台名稱, 軸號)
+ThrottleKey = Tuple[str, int]
+
+
+class AlertThrottle:
+    """警告節流: 同一機台/軸在時間窗內只寄出一次, 其餘警告暫存為 suppressed, 時間窗結束後併入彙整郵件
+
+    時間窗狀態存放於 Redis (SET NX PX, 多個程序共用), Redis 無法連線時改用程序內記憶體。
+    """
+
+    def __init__(self, window: Optional[float] = None):
+        self.__window = float(Config.ALERT_THROTTLE_WINDOW) if window is None else window
+        self.__local: Dict[ThrottleKey, float] = {}
+        self.__logger = Logger().get_logger()
+
+    @property
+    def enabled(self) -> bool:
+        return self.__window > 0
+
+    @staticmethod
+    def __get_redis_key(key: ThrottleKey) -> str:
+        return f"alert.k9.drill.throttle.{key[0]}.{key[1]}"
+
+    async def admit(self, key: ThrottleKey) -> bool:
+        """時間窗未開啟時開啟新的時間窗並回傳 True, 時間窗內回傳 False"""
+        if not self.enabled:
+            return True
+        try:
+            return bool(await redis_client.set(
+                self.__get_redis_key(key), int(time.time()), nx=True, px=int(self.__window * 1000)
+            ))
+        except Exception as err:
+            self.__logger.warning(f"警告節流改用記憶體狀態: {err}")
+
+        now = time.monotonic()
+        if self.__local.get(key, 0) > now:
+            return False
+        self.__local[key] = now + self.__window
+        return True
+
+    async def release(self, key: ThrottleKey):
+        """寄送失敗時釋放時間窗, 重試時可再次寄出"""
+        self.__local.pop(key, None)
+        if not self.enabled:
+            return
+        try:
+            await redis_client.delete(self.__get_redis_key(key))
+        except Exception as err:
+            self.__logger.warning(f"警告節流狀態釋放失敗: {err}")
+
+
+class AlertSender:
+    """警告郵件寄送器: 讀取 alert_outbox 待寄送的警告, 於背景寄出
+
+    SMTP 連線只在單一執行緒中使用, 同一輪寄送共用一個 session, 寄完後關閉;
+    同一機台/軸在節流時間窗內只寄出一次, 時間窗結束後將期間累積的警告彙整寄出;
+    digest 模式下同一機台的多筆警告彙整為一封郵件; 寄送失敗以指數退避重試。
+    AI 分類結果晚於警告寄出時, 以更新通知(is_followup)另行寄出, 不受節流限制。
+    """
+
+    def __init__(self, host: str = Config.EMAIL_HOST, port: str = Config.EMAIL_PORT, digest: Optional[bool] = None,
+                 throttle: Optional[AlertThrottle] = None):
+        self.__host = host
+        self.__port = port
+        self.__digest = Config.ALERT_DIGEST.lower() in ("1", "true", "yes") if digest is None else digest
+        self.__poll_interval = float(Config.ALERT_POLL_INTERVAL)
+        self.__batch_size = max(1, int(Config.ALERT_BATCH_SIZE))
+        self.__max_attempts = max(1, int(Config.ALERT_MAX_ATTEMPTS))
+        self.__retry_base = float(Config.ALERT_RETRY_BASE_SECONDS)
+        self.__throttle = throttle or AlertThrottle()
+        self.__email_client = EmailClient()
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alert-smtp")
+        self.__transfer = DataTransfer()
+        self.__logger = Logger().get_logger()
+        self.__wake: Optional[asyncio.Event] = None
+        self.__task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        """通知背景工作有新的警告待寄送"""
+        if self.__wake is not None:
+            self.__wake.set()
+
+    async def start(self):
+        """啟動背景寄送工作"""
+        if self.__task is None or self.__task.done():
+            self.__wake = asyncio.Event()
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self):
+        """停止背景寄送工作並關閉 SMTP 連線"""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        await self.__in_executor(self.__email_client.delete_client, host=self.__host)
+
+    async def __run(self):
+        while True:
+            try:
+                # 多個程序同時啟動寄送器時, 同一時間只有一個程序寄送
+                async with single_runner("alert") as acquired:
+                    if acquired:
+                        await self.send_pending()
+            except Exception as err:
+                self.__logger.error(f"警告郵件寄送錯誤: {err}")
+            try:
+                await asyncio.wait_for(self.__wake.wait(), timeout=self.__poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__wake.clear()
+
+    async def __in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, lambda: func(*args, **kwargs))
+
+    def __send(self, data: Dict) -> bool:
+        """於 SMTP 執行緒中寄送, 連線中斷時重新連線一次"""
+        for _ in range(2):
+            if not self.__email_client.has_client(self.__host) and not self.__email_client.add_client(host=self.__host, port=self.__port):
+                return False
+            if self.__email_client.send_email(host=self.__host, data=data):
+                return True
+            self.__email_client.delete_client(host=self.__host)
+        return False
+
+    def __group(self, alerts: List) -> List[Tuple[str, List]]:
+        """digest 模式依機台分組, 否則依機台/軸分組; 更新通知與新警告分開寄送"""
+        groups: Dict[Tuple, List] = {}
+        for alert in alerts:
+            key = (alert.machine_name,) if self.__digest else (alert.machine_name, alert.spindle_id)
+            groups.setdefault((bool(alert.is_followup),) + key, []).append(alert)
+        return [(alerts[0].machine_name, alerts) for alerts in groups.values()]
+
+    async def __apply_throttle(self, mydb, alerts: List, suppressed_alerts: List) -> List:
+        """依機台/軸節流, 回傳本輪要寄出的警告(含時間窗結束後併入的 suppressed 警告)"""
+        if not self.__throttle.enabled:
+            return alerts
+        # 更新通知針對已寄出的警告, 不佔用也不受限於節流時間窗
+        admitted = [alert for alert in alerts if alert.is_followup]
+        groups: Dict[ThrottleKey, List] = {}
+        for alert in list(suppressed_alerts) + [alert for alert in alerts if not alert.is_followup]:
+            groups.setdefault((alert.machine_name, alert.spindle_id), []).append(alert)
+
+        suppressed_ids = []
+        for key, group in groups.items():
+            if await self.__throttle.admit(key):
+                admitted.extend(group)
+            else:
+                suppressed_ids.extend(alert.id for alert in group if alert.status != alert_crud.ALERT_STATUS_SUPPRESSED)
+        if suppressed_ids:
+            await alert_crud.mark_alert_outbox_suppressed(mydb, suppressed_ids)
+            self.__logger.info(f"警告節流, 暫不寄送 {len(suppressed_ids)} 筆")
+        return admitted
+
+    def __get_send_data(self, machine_name: str, group: List, mail_list: List) -> Dict:
+        # AI 分類結果可能在警告寫入後才補上
+        highlight_list = [
+            {**json.loads(alert.payload), "classification_result": alert.classification_result} for alert in group
+        ]
+        if len(highlight_list) == 1:
+            send_data = self.__transfer.get_mail_data(highlight_list[0], mail_list)
+        else:
+            suppressed_count = sum(alert.status == alert_crud.ALERT_STATUS_SUPPRESSED for alert in group)
+            send_data = self.__transfer.get_mail_digest_data(machine_name, highlight_list, mail_list, suppressed_count)
+        if group[0].is_followup and send_data["subject"]:
+            send_data["subject"] = f"[AI 判定更新]{send_data['subject']}"
+        return send_data
+
+    def __get_retry_time(self, attempts: int) -> Optional[datetime.datetime]:
+        if attempts >= self.__max_attempts:
+            return None
+        delay = min(self.__retry_base * (2 ** (attempts - 1)), MAX_RETRY_DELAY)
+        return datetime.datetime.now() + datetime.timedelta(seconds=delay)
+
+    async def send_pending(self) -> int:
+        """寄出所有已到寄送時間的警告, 回傳成功寄出的警告筆數"""
+        sent_count = 0
+        try:
+            async with mysql_session() as mydb:
+                suppressed_alerts = await alert_crud.get_suppressed_alert_outbox(mydb) if self.__throttle.enabled else []
+                while True:
+                    alerts = await alert_crud.get_due_alert_outbox(mydb, limit=self.__batch_size)
+                    if not alerts and not suppressed_alerts:
+                        break
+                    admitted = await self.__apply_throttle(mydb, alerts, suppressed_alerts)
+                    suppressed_alerts = []
+                    mail_list = await mail_crud.get_mail_info(mydb) if admitted else []
+                    for machine_name, group in self.__group(admitted):
+                        send_data = self.__get_send_data(machine_name, group, mail_list)
+                        alert_ids = [alert.id for alert in group]
+                        if await self.__in_executor(self.__send, send_data):
+                            await alert_crud.mark_alert_outbox_sent(mydb, alert_ids)
+                            sent_count += len(alert_ids)
+                        else:
+                            attempts = max(alert.attempts or 0 for alert in group) + 1
+                            await alert_crud.mark_alert_outbox_retry(
+                                mydb, alert_ids, attempts, self.__get_retry_time(attempts), "SMTP 寄送失敗"
+                            )
+                            for key in {(alert.machine_name, alert.spindle_id) for alert in group}:
+                                await self.__throttle.release(key)
+                            self.__logger.warning(f"警告郵件寄送失敗 ({machine_name}, {len(alert_ids)} 筆, 第 {attempts} 次)")
+                    if len(alerts) < self.__batch_size:
+                        break
+        finally:
+            await self.__in_executor(self.__email_client.delete_client, host=self.__host)
+
+        if sent_count:
+            self.__logger.info(f"PPM 警告資訊已寄出 ({sent_count} 筆)")
+        return sent_count
+
+
+# 全程序共用的警告郵件寄送器
+alert_sender = AlertSender()
@@ -0,0 +1,75 @@
+import os
+import datetime
+from typing import Dict, List, Optional, Tuple
+from app.crud import prediction as prediction_crud
+from app.utils.cache_helper import LRUCache
+
+# 圖片檔案狀態 (修改時間, 檔案大小)
+ImageStat = Tuple[datetime.datetime, int]
+
+
+def get_image_stat(image_path: Optional[str]) -> Optional[ImageStat]:
+    """取得圖片修改時間(精確到秒, 與 DATETIME 欄位一致)與大小, 檔案不存在時回傳 None"""
+    if not image_path:
+        return None
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    return datetime.datetime.fromtimestamp(int(stat.st_mtime)), stat.st_size
+
+
+class ClassificationCache:
+    """AI 分類結果快取: 記憶體 LRU 為前端, prediction_record 為後端儲存
+
+    key 為 (圖片路徑, 產品名稱, 圖片修改時間, 圖片大小), 圖片被覆寫後不會命中舊的分類結果。
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.__lru = LRUCache(capacity)
+
+    @staticmethod
+    def __get_key(image_path: str, product_name: str, image_stat: ImageStat) -> Tuple:
+        return image_path, product_name, image_stat[0], image_stat[1]
+
+    def put(self, image_path: str, product_name: str, image_stat: Optional[ImageStat], result: Dict):
+        """寫入成功的分類結果"""
+        if image_stat is None or not result or result.get("classification_code") is None:
+            return
+        self.__lru.set(self.__get_key(image_path, product_name, image_stat), result)
+
+    async def get_many(self, mydb, items: List[Tuple[str, str, Optional[ImageStat]]]) -> List[Optional[Dict]]:
+        """依 items 順序取得分類結果, 記憶體未命中的項目以一次查詢 prediction_record 補齊"""
+        results: List[Optional[Dict]] = [None] * len(items)
+        missing = []
+        for index, (image_path, product_name, image_stat) in enumerate(items):
+            if image_stat is None:
+                continue
+            result = self.__lru.get(self.__get_key(image_path, product_name, image_stat))
+            if result is not None:
+                results[index] = result
+            else:
+                missing.append(index)
+
+        if not missing:
+            return results
+
+        records = await prediction_crud.get_prediction_record_by_image_paths(mydb, [items[index][0] for index in missing])
+        record_map = {(record.image_path, record.product_name): record for record in records}
+        for index in missing:
+            image_path, product_name, image_stat = items[index]
+            record = record_map.get((image_path, product_name))
+            if record is None:
+                continue
+            # 舊資料沒有圖片狀態時視為相同(圖片檔名含鑽孔時間, 不會被覆寫)
+            if record.image_mtime is not None and (record.image_mtime, record.image_size) != image_stat:
+                continue
+            result = {
+                "classification_code": record.classification_code,
+                "classification_model": record.classification_model,
+                "distance": record.mahalanobis_distance,
+                "classification_time": record.classification_time,
+            }
+            self.put(image_path, product_name, image_stat, result)
+            results[index] = result
+        return results
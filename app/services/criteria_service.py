@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from typing import Optional
+from app.config import Config
+from app.database import redis_client
+from app.utils.cache_helper import AsyncTTLCache
+from app.utils.logger import Logger
+
+
+@dataclass
+class ProductCriteria:
+    """產品 PPM 管制界限(快取用)"""
+    product_name: Optional[str]
+    ppm_limit: Optional[int] = None
+
+
+# 全程序共用的產品 PPM 管制界限快取, key 為 product_name
+product_criteria_cache = AsyncTTLCache(ttl=float(Config.PRODUCT_CRITERIA_CACHE_TTL))
+
+# 跨程序的快取版本號: API 修改管制界限時遞增, 其他程序(ingestion worker)發現版本變動時清除本地快取
+CRITERIA_VERSION_KEY = "cache.k9.drill.criteria.version"
+# initialized 與 value 分開記錄: Redis 尚無版本號(None)時, 之後第一次遞增仍需清除快取
+_criteria_version = {"initialized": False, "value": None}
+
+
+async def invalidate_product_criteria(product_name: Optional[str] = None):
+    """清除產品 PPM 管制界限快取, 未指定產品時清除全部, 並通知其他程序"""
+    product_criteria_cache.invalidate(product_name)
+    try:
+        await redis_client.incr(CRITERIA_VERSION_KEY)
+    except Exception as err:
+        # Redis 無法連線時其他程序的快取於 TTL 到期後更新
+        Logger().get_logger().warning(f"無法通知其他程序清除產品快取: {err}")
+
+
+async def sync_product_criteria_cache():
+    """比對跨程序的快取版本號, 版本變動時清除本地快取"""
+    try:
+        version = await redis_client.get(CRITERIA_VERSION_KEY)
+    except Exception as err:
+        Logger().get_logger().warning(f"無法取得產品快取版本: {err}")
+        return
+    if not _criteria_version["initialized"]:
+        _criteria_version.update(initialized=True, value=version)
+    elif version != _criteria_version["value"]:
+        product_criteria_cache.invalidate()
+        _criteria_version["value"] = version
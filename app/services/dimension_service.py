@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from app.config import Config
+from app.crud import tqm as tqm_crud
+from app.utils.logger import Logger
+
+
+class DimensionCache:
+    """tDrillMachine 與 tProduct 的程序內維度快取
+
+    啟動時整批載入兩張表, 之後依更新間隔或查無資料時增量更新(tProduct 只讀取新的 ID_PD),
+    穩定運作時查詢機台與產品名稱不需存取 MSSQL。MSSQL 也查無的 ID 記錄為不存在, 直到下次定期更新才重新查詢。
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self.__refresh_interval = float(
+            Config.DIMENSION_CACHE_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        )
+        self.__logger = Logger().get_logger()
+        self.__machines: Dict[int, Any] = {}
+        self.__products: Dict[int, str] = {}
+        self.__absent_machines: Set[int] = set()
+        self.__absent_products: Set[int] = set()
+        self.__last_product_id = 0
+        self.__refreshed_at: Optional[float] = None
+        self.__lock = asyncio.Lock()
+        self.__stats = {"machine_hits": 0, "machine_misses": 0, "product_hits": 0, "product_misses": 0, "absent_hits": 0, "refreshes": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self.__refreshed_at is not None
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得命中/未命中次數與快取筆數"""
+        return dict(
+            self.__stats, machines=len(self.__machines), products=len(self.__products),
+            absent=len(self.__absent_machines) + len(self.__absent_products)
+        )
+
+    def __is_due(self) -> bool:
+        return not self.loaded or time.monotonic() - self.__refreshed_at > self.__refresh_interval
+
+    async def load(self, ms_exec):
+        """整批載入 tDrillMachine 與 tProduct"""
+        async with self.__lock:
+            await self.__load(ms_exec)
+
+    async def __load(self, ms_exec):
+        machines, products = await asyncio.gather(
+            ms_exec(tqm_crud.get_machine_info_all),
+            ms_exec(tqm_crud.get_product_name_after_id, 0)
+        )
+        self.__machines = {machine.ID_DM: machine for machine in machines}
+        self.__products = dict(products)
+        self.__last_product_id = max(self.__products, default=0)
+        self.__absent_machines.clear()
+        self.__absent_products.clear()
+        self.__refreshed_at = time.monotonic()
+        self.__stats["refreshes"] += 1
+        self.__logger.info(f"維度快取載入完成: {len(self.__machines)} 台機台, {len(self.__products)} 筆產品")
+
+    async def refresh(self, ms_exec, force: bool = False):
+        """增量更新: 機台表重新整批載入, 產品表只讀取新增的 ID_PD; 未到更新時間且非強制時略過"""
+        async with self.__lock:
+            if not self.loaded:
+                return await self.__load(ms_exec)
+            if not force and not self.__is_due():
+                return
+            machines, products = await asyncio.gather(
+                ms_exec(tqm_crud.get_machine_info_all),
+                ms_exec(tqm_crud.get_product_name_after_id, self.__last_product_id)
+            )
+            self.__machines = {machine.ID_DM: machine for machine in machines}
+            self.__products.update(products)
+            self.__last_product_id = max(self.__products, default=0)
+            if not force:
+                # 定期更新時重新查詢先前不存在的 ID
+                self.__absent_machines.clear()
+                self.__absent_products.clear()
+            self.__refreshed_at = time.monotonic()
+            self.__stats["refreshes"] += 1
+
+    async def resolve(self, ms_exec, machine_ids: Iterable[int], product_ids: Iterable[int]) -> Tuple[Dict[int, Any], Dict[int, str]]:
+        """取得整批機台與產品名稱對照表, 查無資料時才存取 MSSQL"""
+        if self.__is_due():
+            await self.refresh(ms_exec)
+
+        machine_ids = set(machine_id for machine_id in machine_ids if machine_id is not None)
+        product_ids = set(product_id for product_id in product_ids if product_id is not None)
+        absent_count = len(machine_ids & self.__absent_machines) + len(product_ids & self.__absent_products)
+        missing_machines = machine_ids - self.__machines.keys() - self.__absent_machines
+        missing_products = product_ids - self.__products.keys() - self.__absent_products
+        self.__stats["absent_hits"] += absent_count
+        self.__stats["machine_hits"] += len(machine_ids) - len(missing_machines)
+        self.__stats["machine_misses"] += len(missing_machines)
+        self.__stats["product_hits"] += len(product_ids) - len(missing_products)
+        self.__stats["product_misses"] += len(missing_products)
+
+        if missing_machines or missing_products:
+            await self.refresh(ms_exec, force=True)
+            # 增量更新後仍找不到的資料(例如 ID 較小的補登資料)改以 IN (...) 查詢
+            missing_machines -= self.__machines.keys()
+            missing_products -= self.__products.keys()
+            if missing_machines:
+                self.__machines.update(await ms_exec(tqm_crud.get_machine_info_by_ids, missing_machines))
+                self.__absent_machines.update(missing_machines - self.__machines.keys())
+            if missing_products:
+                self.__products.update(await ms_exec(tqm_crud.get_product_name_by_ids, missing_products))
+                self.__absent_products.update(missing_products - self.__products.keys())
+
+        machine_map = {machine_id: self.__machines[machine_id] for machine_id in machine_ids if machine_id in self.__machines}
+        product_map = {product_id: self.__products[product_id] for product_id in product_ids if product_id in self.__products}
+        return machine_map, product_map
@@ -58,7 +58,11 @@ class EmailClient:
 
         return message
 
-    def add_client(self, host: str, port: str = '', user: str = '', pwd: str = ''):
+    def has_client(self, host: str) -> bool:
+        """是否已建立 SMTP 客戶端"""
+        return host in self.__email_clients
+
+    def add_client(self, host: str, port: str = '', user: str = '', pwd: str = '') -> bool:
         """新增 SMTP 客戶端"""
         try:
             client = smtplib.SMTP(f"{host}:{port}") if port else smtplib.SMTP(host)
@@ -66,10 +70,12 @@ class EmailClient:
                 client.login(user, pwd)
             self.__email_clients[host] = client
             self.__logger.info(f"成功新增 SMTP 客戶端: {host}")
-        except smtplib.SMTPException as error:
+            return True
+        except (smtplib.SMTPException, OSError) as error:
             self.__logger.error(f"無法新增 SMTP 客戶端: {error}")
+            return False
 
-    def send_email(self, host: str, data: Dict):
+    def send_email(self, host: str, data: Dict) -> bool:
         """發送電子郵件"""
         try:
             email_client = self.__get_client(host)
@@ -78,14 +84,18 @@ class EmailClient:
             message = self.__get_message(data)
             email_client.sendmail(sender, receiver, message.as_string())
             self.__logger.info("郵件已成功發送")
-        except smtplib.SMTPException as error:
+            return True
+        except (smtplib.SMTPException, OSError, KeyError) as error:
             self.__logger.error(f"無法發送郵件: {error}")
+            return False
 
     def delete_client(self, host: str):
         """刪除 SMTP 客戶端"""
         try:
-            email_client = self.__email_clients.pop(host)
+            email_client = self.__email_clients.pop(host, None)
+            if email_client is None:
+                return
             email_client.quit()
             self.__logger.info(f"成功刪除 SMTP 客戶端: {host}")
-        except smtplib.SMTPException as error:
+        except (smtplib.SMTPException, OSError) as error:
             self.__logger.error(f"無法刪除 SMTP 客戶端: {error}")
\ No newline at end of file
@@ -0,0 +1,218 @@
+import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from app.database import redis_client
+from app.crud import drill as drill_crud, checkpoint as checkpoint_crud
+from app.services.tqm_service import TQMProcessorConfig
+from app.utils.data_transfer import DataTransfer
+from app.utils.redis_helper import get_cache_many, set_cache_many
+from app.config import Config
+from app.utils.logger import Logger
+
+# Hitachi / Posalux 機台分組, 指定機台時只有單一分組
+MACHINE_GROUPS = ("hitachi", "posalux")
+MACHINE_TOTAL_GROUP = "total"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+AOI_TIME_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+# 區間快取 key: 以區間實際的起訖時間識別, 與查詢範圍無關, 滑動查詢範圍時已結束的區間仍可命中
+BUCKET_CACHE_KEY = "mysql.k9.drill.failrate.bucket"
+BUCKET_KEY_TIME_FORMAT = "%Y%m%d%H%M%S"
+# 歷史資料變動(backfill、日彙總重建)時遞增, 使所有區間快取失效
+FAILRATE_VERSION_KEY = "cache.k9.drill.failrate.version"
+
+
+def _get_failrate_count(total_count: int, fail_count: int) -> Dict:
+    return {
+        "total_count": total_count,
+        "fail_count": fail_count,
+        "fail_rate": round(fail_count / total_count, 4) if total_count > 0 else 0
+    }
+
+
+def _get_machine_groups(drill_machine_name: str) -> List[str]:
+    """機台所屬分組: 兩個條件各自判斷(與原本的 list 篩選及 SQL 彙總相同), 名稱可同時屬於兩個分組"""
+    groups = []
+    if drill_machine_name < "ND41":
+        groups.append("hitachi")
+    if drill_machine_name > "ND40":
+        groups.append("posalux")
+    return groups
+
+
+def _get_day_label(day: datetime.date, freq_type: str) -> str:
+    """日期所屬的統計區間標籤, 與 DataTransfer.get_datetime_transfer 的鍵相同"""
+    if freq_type == "day":
+        return day.strftime("%Y-%m-%d")
+    if freq_type == "month":
+        return day.strftime("%Y-%m")
+    # 產線週: 週日為一週開始, 年份取週日所在年份, 週數取週一的 ISO 週數
+    week_start = day - datetime.timedelta(days=(day.weekday() + 1) % 7)
+    return f"{week_start.year}-{(week_start + datetime.timedelta(days=1)).isocalendar()[1]}"
+
+
+def _use_daily_rollup(start: datetime.datetime, end: datetime.datetime) -> bool:
+    """查詢範圍為整日(00:00:00 ~ 23:59:59)時區間與日彙總對齊, 可改讀日彙總表"""
+    return start.time() == datetime.time.min and end.time() == datetime.time(23, 59, 59)
+
+
+def _get_buckets(datetime_limit: Dict, start: datetime.datetime,
+                 end: datetime.datetime) -> List[Tuple[str, datetime.datetime, datetime.datetime]]:
+    """各區間實際涵蓋的 [開始, 結束), 頭尾區間以查詢範圍截斷(查詢範圍包含 end 當秒)"""
+    end_limit = end + datetime.timedelta(seconds=1)
+    buckets = []
+    for key, value in datetime_limit.items():
+        bucket_start = max(datetime.datetime.strptime(value[0], TIME_FORMAT), start)
+        bucket_end = min(datetime.datetime.strptime(value[1], TIME_FORMAT), end_limit)
+        if bucket_start < bucket_end:
+            buckets.append((key, bucket_start, bucket_end))
+    return buckets
+
+
+async def _get_counts_by_rollup(db, start: datetime.datetime, end: datetime.datetime, freq_type: str,
+                                drill_machine_name: Optional[str]) -> Dict:
+    """讀取日彙總並合併為週/月區間, 查詢成本取決於天數而非資料筆數"""
+    counts = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    rows = await drill_crud.get_drill_failrate_daily(db, start.date(), end.date(), drill_machine_name)
+    for row in rows:
+        groups = [MACHINE_TOTAL_GROUP] if drill_machine_name else _get_machine_groups(row.drill_machine_name)
+        label = _get_day_label(row.day, freq_type)
+        for group in groups:
+            count = counts[label][group]
+            count[0] += int(row.total_count or 0)
+            count[1] += int(row.fail_count or 0)
+    return counts
+
+
+async def _get_counts_by_query(db, start: datetime.datetime, end: datetime.datetime, freq_type: str,
+                               drill_machine_name: Optional[str]) -> Dict:
+    """由 MySQL GROUP BY 彙總原始資料"""
+    counts = defaultdict(dict)
+    search_items = {
+        "start_time": start.strftime(TIME_FORMAT),
+        "end_time": end.strftime(TIME_FORMAT),
+        "drill_machine_name": drill_machine_name
+    }
+    offset_seconds = start.hour * 3600 + start.minute * 60 + start.second
+    rows = await drill_crud.get_drill_failrate_count_by_freq(db, search_items, freq_type, offset_seconds)
+    for row in rows:
+        if drill_machine_name:
+            counts[row.label][MACHINE_TOTAL_GROUP] = [int(row.total_count or 0), int(row.fail_count or 0)]
+            continue
+        for group in MACHINE_GROUPS:
+            counts[row.label][group] = [
+                int(getattr(row, f"{group}_total_count") or 0), int(getattr(row, f"{group}_fail_count") or 0)
+            ]
+    return counts
+
+
+async def _get_counts(db, start: datetime.datetime, end: datetime.datetime, freq_type: str,
+                      drill_machine_name: Optional[str]) -> Dict:
+    """彙總 [start, end] 各區間的總數與失敗數: 整日範圍讀取日彙總表, 其他範圍由 MySQL GROUP BY 彙總"""
+    if _use_daily_rollup(start, end):
+        return await _get_counts_by_rollup(db, start, end, freq_type, drill_machine_name)
+    return await _get_counts_by_query(db, start, end, freq_type, drill_machine_name)
+
+
+async def _get_closed_watermark(db) -> Optional[datetime.datetime]:
+    """結束時間不晚於此時間的區間不會再變動, 可長期快取
+
+    取 TQM 匯入 checkpoint 的 AOITime; 仍有待重算的日彙總時, 不晚於最早待重算日的開始時間。
+    """
+    checkpoint = await checkpoint_crud.get_checkpoint(db, TQMProcessorConfig.checkpoint_name)
+    if not checkpoint or not checkpoint.aoi_time:
+        return None
+    watermark = None
+    for time_format in (AOI_TIME_FORMAT, TIME_FORMAT):
+        try:
+            watermark = datetime.datetime.strptime(checkpoint.aoi_time, time_format)
+            break
+        except ValueError:
+            continue
+    if watermark is None:
+        return None
+    dirty_day = await drill_crud.get_drill_failrate_dirty_min_day(db)
+    if dirty_day is not None:
+        watermark = min(watermark, datetime.datetime.combine(dirty_day, datetime.time.min))
+    return watermark
+
+
+async def _get_failrate_version() -> Optional[int]:
+    try:
+        return int(await redis_client.get(FAILRATE_VERSION_KEY) or 0)
+    except Exception as err:
+        # Redis 無法連線時不使用快取, 直接由資料庫計算
+        Logger().get_logger().warning(f"無法讀取失效率快取版本: {err}")
+        return None
+
+
+async def invalidate_failrate_cache():
+    """歷史資料變動後遞增快取版本號, 使所有失效率區間快取失效"""
+    try:
+        await redis_client.incr(FAILRATE_VERSION_KEY)
+    except Exception as err:
+        Logger().get_logger().warning(f"無法清除失效率區間快取: {err}")
+
+
+async def get_failrate_data(db, start_time: str, end_time: str, freq_type: str,
+                            drill_machine_name: Optional[str] = None) -> Dict:
+    """取得失效率統計, 以區間為單位快取
+
+    區間定義與 DataTransfer.get_datetime_transfer 相同(以開始時間的時分秒為區間起點, 週以週日開始),
+    只回傳 get_datetime_transfer 範圍內且有資料的區間。各區間先以 MGET 讀取快取,
+    只重新計算未命中的區間; 已結束的區間長期快取, 仍在匯入中的區間短期快取。
+    """
+    groups = (MACHINE_TOTAL_GROUP,) if drill_machine_name else MACHINE_GROUPS
+    datetime_limit = DataTransfer().get_datetime_transfer(start_time, end_time, freq_type)
+    start = datetime.datetime.strptime(start_time, TIME_FORMAT)
+    end = datetime.datetime.strptime(end_time, TIME_FORMAT)
+    buckets = _get_buckets(datetime_limit, start, end)
+
+    version = await _get_failrate_version() if buckets else None
+    machine_key = drill_machine_name or "all"
+    cache_keys = [
+        f"{BUCKET_CACHE_KEY}.{version}.{machine_key}."
+        f"{bucket_start.strftime(BUCKET_KEY_TIME_FORMAT)}.{bucket_end.strftime(BUCKET_KEY_TIME_FORMAT)}"
+        for _, bucket_start, bucket_end in buckets
+    ]
+    cached = [None] * len(buckets)
+    if version is not None:
+        try:
+            cached = await get_cache_many(cache_keys)
+        except Exception as err:
+            Logger().get_logger().warning(f"無法讀取失效率區間快取: {err}")
+
+    missing = [index for index, value in enumerate(cached) if value is None]
+    if missing:
+        # 以單一查詢計算第一個到最後一個未命中區間的範圍
+        span_start = buckets[missing[0]][1]
+        span_end = buckets[missing[-1]][2] - datetime.timedelta(seconds=1)
+        counts = await _get_counts(db, span_start, span_end, freq_type, drill_machine_name)
+        watermark = await _get_closed_watermark(db)
+        closed_items, open_items = {}, {}
+        for index in missing:
+            label, _, bucket_end = buckets[index]
+            label_counts = counts.get(label, {})
+            cached[index] = {group: list(label_counts.get(group, (0, 0))) for group in groups}
+            if watermark and bucket_end <= watermark:
+                closed_items[cache_keys[index]] = cached[index]
+            else:
+                open_items[cache_keys[index]] = cached[index]
+        if version is not None:
+            try:
+                await set_cache_many(closed_items, ex=int(Config.FAILRATE_CLOSED_BUCKET_CACHE_TTL))
+                await set_cache_many(open_items, ex=int(Config.FAILRATE_OPEN_BUCKET_CACHE_TTL))
+            except Exception as err:
+                Logger().get_logger().warning(f"無法寫入失效率區間快取: {err}")
+
+    def get_group_data(group: str) -> Dict:
+        data = {}
+        for (label, _, _), value in zip(buckets, cached):
+            total_count, fail_count = value.get(group, (0, 0))
+            if total_count:
+                data[label] = _get_failrate_count(total_count, fail_count)
+        return data
+
+    if drill_machine_name:
+        return get_group_data(MACHINE_TOTAL_GROUP)
+    return {group: get_group_data(group) for group in MACHINE_GROUPS}
@@ -0,0 +1,53 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+from app.utils.logger import Logger
+
+
+class AdaptivePoller:
+    """自適應輪詢排程: 以低成本的水位查詢判斷是否有新資料, 有新資料時才執行匯入
+
+    有新資料時以最短間隔輪詢; 閒置或執行失敗時間隔逐次加倍直到上限;
+    超過 max_run_interval 沒有執行時, 不論水位是否變動都執行一次(補齊水位無法察覺的異動)。
+    run 回傳 False 表示未完成(例如儲存失敗), 此時不記錄水位, 退避後重試。
+    """
+
+    def __init__(self, probe: Callable[[], Awaitable[Any]], run: Callable[[], Awaitable[Any]],
+                 min_interval: float = 5, max_interval: float = 120, max_run_interval: float = 600,
+                 backoff: float = 2.0):
+        self.__probe = probe
+        self.__run = run
+        self.__min_interval = max(0.1, min_interval)
+        self.__max_interval = max(self.__min_interval, max_interval)
+        self.__max_run_interval = max_run_interval
+        self.__backoff = max(1.0, backoff)
+        self.__logger = Logger().get_logger()
+
+    async def run_forever(self, stop_event: Optional[asyncio.Event] = None):
+        stop_event = stop_event or asyncio.Event()
+        interval = self.__min_interval
+        last_watermark = None
+        last_run_time = None
+
+        while not stop_event.is_set():
+            try:
+                watermark = await self.__probe()
+                due = last_run_time is None or time.monotonic() - last_run_time >= self.__max_run_interval
+                if watermark != last_watermark or due:
+                    if await self.__run() is False:
+                        self.__logger.warning("匯入未完成, 稍後重試")
+                        interval = min(interval * self.__backoff, self.__max_interval)
+                    else:
+                        last_watermark = watermark
+                        last_run_time = time.monotonic()
+                        interval = self.__min_interval
+                else:
+                    interval = min(interval * self.__backoff, self.__max_interval)
+            except Exception as err:
+                self.__logger.error(f"輪詢排程執行錯誤: {err}")
+                interval = min(interval * self.__backoff, self.__max_interval)
+
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
@@ -1,5 +1,86 @@
+import time
+import asyncio
 import httpx
+from typing import Dict, List, Optional
 from app.config import Config
+from app.utils.circuit_helper import AdaptiveLimiter, CircuitBreaker
+
+# 全程序共用的 AI Service Center 連線(由 app 啟動/關閉事件管理)
+_ai_client: Optional[httpx.AsyncClient] = None
+# AI Service Center 是否支援批次分類 API, None 表示尚未確認
+_batch_supported: Optional[bool] = None
+# AI Service Center 斷路器與自適應並行上限: 服務異常時快速失敗, 正常時依延遲調整並行數
+ai_breaker = CircuitBreaker(
+    failure_threshold=int(Config.AI_BREAKER_FAILURE_THRESHOLD),
+    recovery_timeout=float(Config.AI_BREAKER_RECOVERY_TIMEOUT)
+)
+ai_limiter = AdaptiveLimiter(
+    max_limit=int(Config.AI_CLIENT_MAX_CONNECTIONS),
+    latency_target=float(Config.AI_LATENCY_TARGET)
+)
+# 斷路器開路時回傳的錯誤訊息
+CIRCUIT_OPEN_ERROR = "AI Service Center 暫時無法使用"
+
+
+def _get_ai_service_url(path: str) -> str:
+    return f"http://{Config.AI_SERVICE_HOST}:{Config.AI_SERVICE_PORT}/drill_map/{path}"
+
+def _get_error_result(error: str) -> dict:
+    return {
+        "classification_code": None,
+        "classification_model": None,
+        "distance": None,
+        "error": error
+    }
+
+async def init_ai_client() -> httpx.AsyncClient:
+    """建立共用的 AI Service Center 連線池"""
+    global _ai_client
+    if _ai_client is None or _ai_client.is_closed:
+        max_connections = int(Config.AI_CLIENT_MAX_CONNECTIONS)
+        _ai_client = httpx.AsyncClient(
+            proxies={'http://': None, 'https://': None},
+            verify=False,
+            trust_env=False,
+            timeout=httpx.Timeout(float(Config.AI_CLIENT_TIMEOUT), connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+    return _ai_client
+
+async def close_ai_client():
+    """關閉共用的 AI Service Center 連線池"""
+    global _ai_client
+    if _ai_client is not None:
+        await _ai_client.aclose()
+        _ai_client = None
+
+async def _post(path: str, payload: dict, auth=None, item_count: int = 1) -> httpx.Response:
+    """經由斷路器與自適應並行上限送出請求, 連線錯誤或 5xx 視為服務異常"""
+    if not ai_breaker.allow():
+        raise ConnectionError(CIRCUIT_OPEN_ERROR)
+    try:
+        client = await init_ai_client()
+        async with ai_limiter:
+            start_time = time.monotonic()
+            try:
+                response = await client.post(_get_ai_service_url(path), json=payload, auth=auth)
+            except Exception:
+                ai_breaker.record_failure()
+                ai_limiter.record(False, time.monotonic() - start_time)
+                raise
+            # 批次請求以單張平均延遲計算
+            latency = (time.monotonic() - start_time) / max(1, item_count)
+            if response.status_code >= 500:
+                ai_breaker.record_failure()
+                ai_limiter.record(False, latency)
+            else:
+                ai_breaker.record_success()
+                ai_limiter.record(True, latency)
+    except BaseException:
+        # 請求被取消時沒有結果可記錄, 釋放半開探測避免斷路器停留在半開狀態
+        ai_breaker.release()
+        raise
+    return response
 
 async def get_ai_classification(img_src: str, product_name: str, auth=None) -> dict:
     """
@@ -9,39 +90,65 @@ async def get_ai_classification(img_src: str, product_name: str, auth=None) -> d
     :param auth: 認證資訊，預設為 None
     :return: dict，包含分類結果或錯誤資訊
     """
-    url = f"http://{Config.AI_SERVICE_HOST}:{Config.AI_SERVICE_PORT}/drill_map/classify"
     payload = {
         "img_src": img_src,
         "product_name": product_name
     }
-    async with httpx.AsyncClient(
-        proxies={'http://': None, 'https://': None},
-        verify=False,
-        trust_env=False,
-        auth=auth,
-        timeout=30
-    ) as client:
+    try:
+        response = await _post("classify", payload, auth=auth)
+        response.raise_for_status()
+        resp_json = response.json()
+        if resp_json.get("code") == "0":
+            return resp_json["data"]
+        else:
+            # 回傳錯誤資訊
+            return _get_error_result(resp_json.get("error", "未知錯誤"))
+    except Exception as e:
+        return _get_error_result(str(e))
+
+async def get_ai_classification_batch(items: List[Dict[str, str]], auth=None) -> List[dict]:
+    """
+    呼叫 AI Service Center 批次分類 API, 一次送出多筆機鑽圖
+    不支援批次 API 或批次回應格式不符時, 改用單張分類 API;
+    逾時、連線錯誤、5xx 或斷路器開路時直接回傳錯誤資訊, 不再逐張重送
+    :param items: [{"img_src": 圖片路徑, "product_name": 產品名稱}, ...]
+    :param auth: 認證資訊，預設為 None
+    :return: list，依 items 順序回傳分類結果或錯誤資訊
+    """
+    global _batch_supported
+    if not items:
+        return []
+
+    if _batch_supported is not False:
         try:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            resp_json = response.json()
-            if resp_json.get("code") == "0":
-                return resp_json["data"]
-            else:
-                # 回傳錯誤資訊
-                return {
-                    "classification_code": None,
-                    "classification_model": None,
-                    "distance": None,
-                    "error": resp_json.get("error", "未知錯誤")
-                }
-        except Exception as e:
-            return {
-                "classification_code": None,
-                "classification_model": None,
-                "distance": None,
-                "error": str(e)
-            }
+            response = await _post("classify_batch", {"items": items}, auth=auth, item_count=len(items))
+        except Exception as err:
+            # 服務異常時逐張重送只會以相同逾時再失敗一次
+            return [_get_error_result(str(err) or type(err).__name__) for _ in items]
+        if response.status_code in (404, 405, 501):
+            _batch_supported = False
+        elif response.status_code >= 500:
+            return [_get_error_result(f"AI Service Center HTTP {response.status_code}") for _ in items]
+        elif response.status_code < 400:
+            try:
+                resp_json = response.json()
+            except ValueError:
+                resp_json = {}
+            data = resp_json.get("data")
+            if resp_json.get("code") == "0" and isinstance(data, list) and len(data) == len(items):
+                _batch_supported = True
+                return [
+                    result if result and "classification_code" in result
+                    else _get_error_result((result or {}).get("error", "未知錯誤"))
+                    for result in data
+                ]
+
+    if ai_breaker.state == CircuitBreaker.OPEN:
+        return [_get_error_result(CIRCUIT_OPEN_ERROR) for _ in items]
+    return list(await asyncio.gather(*(
+        get_ai_classification(img_src=item["img_src"], product_name=item["product_name"], auth=auth)
+        for item in items
+    )))
 # import datetime
 # import asyncio    
 # start_time = datetime.datetime.now()
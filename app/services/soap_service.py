@@ -1,9 +1,37 @@
-import requests
 import json
+import asyncio
+import httpx
 import xml.etree.ElementTree as ET
 from typing import Dict, Any, Optional
 from app.config import Config
 
+# 全程序共用的 SOAP 連線池與並行上限(由 app 啟動/關閉事件管理)
+_soap_client: Optional[httpx.AsyncClient] = None
+_soap_limit: Optional[asyncio.Semaphore] = None
+
+
+async def init_soap_client() -> httpx.AsyncClient:
+    """建立共用的 SOAP 連線池"""
+    global _soap_client, _soap_limit
+    if _soap_client is None or _soap_client.is_closed:
+        max_concurrency = max(1, int(Config.SOAP_MAX_CONCURRENCY))
+        _soap_client = httpx.AsyncClient(
+            proxies={'http://': None, 'https://': None},
+            trust_env=False,
+            timeout=httpx.Timeout(float(Config.SOAP_TIMEOUT), connect=5.0),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        _soap_limit = asyncio.Semaphore(max_concurrency)
+    return _soap_client
+
+async def close_soap_client():
+    """關閉共用的 SOAP 連線池"""
+    global _soap_client
+    if _soap_client is not None:
+        await _soap_client.aclose()
+        _soap_client = None
+
+
 class SOAPService:
     def __init__(self, soap_url: str = Config.SOAP_URL, headers: Optional[Dict[str, str]] = None):
         self.__soap_url = soap_url
@@ -22,7 +50,7 @@ class SOAPService:
             </soap:Envelope>
         '''
 
-    def _parse_soap_response(self, response: requests.Response, result_tag: str) -> Dict[str, Any]:
+    def _parse_soap_response(self, response: httpx.Response, result_tag: str) -> Dict[str, Any]:
         """解析 SOAP 響應"""
         try:
             root = ET.fromstring(response.content)
@@ -31,14 +59,16 @@ class SOAPService:
         except Exception as err:
             raise ValueError(f"SOAP 響應解析失敗: {err}")
 
-    def call_soap_method(self, payload: Dict[str, Any], method: str = "GetSpecValue", result_tag: str="GetSpecValueResult") -> Dict[str, Any]:
-        """呼叫 SOAP 方法並回傳結果"""
+    async def call_soap_method(self, payload: Dict[str, Any], method: str = "GetSpecValue", result_tag: str="GetSpecValueResult") -> Dict[str, Any]:
+        """呼叫 SOAP 方法並回傳結果(非同步, 共用連線池並限制同時呼叫數量)"""
         try:
             body = self._build_soap_body(method, payload)
-            response = requests.post(self.__soap_url, data=body.encode('utf-8'), headers=self.__headers)
+            client = await init_soap_client()
+            async with _soap_limit:
+                response = await client.post(self.__soap_url, content=body.encode('utf-8'), headers=self.__headers)
             response.raise_for_status()  # 檢查 HTTP 狀態碼
             return self._parse_soap_response(response, result_tag)
-        except requests.RequestException as req_err:
+        except httpx.HTTPError as req_err:
             raise ConnectionError(f"SOAP API 呼叫失敗: {req_err}")
         except ValueError as parse_err:
-            raise ValueError(f"SOAP 響應解析失敗: {parse_err}")
\ No newline at end of file
+            raise ValueError(f"SOAP 響應解析失敗: {parse_err}")
@@ -1,15 +1,23 @@
+import time
 import asyncio
 import datetime
 import orjson
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import partial
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 from typing import Optional, List, Dict, Tuple, Any
 from app.database import mssql_session, mysql_session
-from app.crud import tqm as tqm_crud, drill as drill_crud, prediction as prediction_crud, ppm as ppm_crud, mail as mail_crud
+from app.crud import tqm as tqm_crud, drill as drill_crud, prediction as prediction_crud, ppm as ppm_crud
+from app.crud import checkpoint as checkpoint_crud, alert as alert_crud
 from app.utils.data_transfer import DataTransfer
-from app.services.email_service import EmailClient
-from app.services.prediction_service import get_ai_classification
+from app.utils.cache_helper import RecentKeySet
+from app.utils.image_index import DrillImageIndex
+from app.services.alert_service import alert_sender
+from app.services.prediction_service import get_ai_classification_batch, ai_breaker, ai_limiter
+from app.services.criteria_service import ProductCriteria, product_criteria_cache, sync_product_criteria_cache
+from app.services.dimension_service import DimensionCache
+from app.services.classification_service import ClassificationCache, get_image_stat
 from app.config import Config
 from app.utils.logger import Logger
 
@@ -20,6 +28,64 @@ class TQMProcessorConfig:
     batch_size: int = 500
     enable_email: bool = True
     enable_save: bool = True
+    # 並行處理設定: 同時處理中的 Board 數量(1 為依序處理)
+    max_concurrent_boards: int = 1
+    # AsyncSession 不可並行使用, 轉換階段以此數量的 MySQL session 組成 session pool
+    max_mysql_concurrency: int = 1
+    max_mssql_concurrency: int = 5
+    max_ai_concurrency: int = 4
+    # 每次批次分類送出的圖片數量
+    ai_batch_size: int = 16
+    # 記憶體中保留的 AI 分類結果數量
+    classification_cache_capacity: int = 10000
+    # Pipeline 設定: 各階段之間佇列可暫存的批次數(backpressure), 與各階段的 worker 數量
+    pipeline_queue_size: int = 2
+    enrich_workers: int = 1
+    classify_workers: int = 1
+    # ingestion_checkpoint 名稱, 不同的匯入工作使用各自的 checkpoint
+    checkpoint_name: str = "tqm"
+    # 記憶體中保留最近已存在/已儲存的 drill 鍵值數量
+    recent_key_capacity: int = 5000
+    # 批次 upsert 每次 executemany 的筆數
+    write_chunk_size: int = 500
+    # 匯入範圍 [start_aoi_time, end_aoi_time) (tBoard.AOITime 格式), 用於 backfill; None 表示不限制
+    start_aoi_time: Optional[str] = None
+    end_aoi_time: Optional[str] = None
+    # 每次擷取 Board 之間的間隔(秒), 用於限制 backfill 對 MSSQL 的負載
+    fetch_interval: float = 0
+    # 待分類(找不到圖片或 AI 分類失敗)資料的重新分類: 執行間隔(秒)、只處理多久以內(秒)的資料、每筆最多重試次數、每次筆數
+    pending_retry_interval: float = 300
+    pending_retry_max_age: float = 86400
+    pending_retry_max_attempts: int = 24
+    pending_retry_batch_size: int = 500
+
+
+@dataclass
+class BoardLookup:
+    """整批 Board 的 MSSQL 對照資料"""
+    machine_map: Dict[int, Any] = field(default_factory=dict)
+    measure_map: Dict[int, Any] = field(default_factory=dict)
+    product_map: Dict[int, str] = field(default_factory=dict)
+
+
+@dataclass
+class BoardBatch:
+    """Pipeline 中流動的一頁 Board 資料"""
+    seq: int
+    boards_info: List
+    checkpoint: Tuple[str, int]
+    lookup: Optional[BoardLookup] = None
+    drill_list: List[Dict] = field(default_factory=list)
+    prediction_list: List[Dict] = field(default_factory=list)
+    insert_list: List[Dict] = field(default_factory=list)
+    highlight_list: List[Dict] = field(default_factory=list)
+
+
+# Pipeline 結束標記
+_PIPELINE_END = object()
+
+# 找不到鑽孔圖片時的分類結果
+AI_PENDING_RESULT = "PENDING"
 
 
 class TQMProcessor:
@@ -31,8 +97,17 @@ class TQMProcessor:
         # 初始化服務
         self.logger = Logger().get_logger()
         self.transfer = DataTransfer()
-        self.email_client = EmailClient()
-        self.email_host = Config.EMAIL_HOST
+        self._recent_keys = RecentKeySet(self.config.recent_key_capacity)
+        self.dimension_cache = DimensionCache()
+        self.classification_cache = ClassificationCache(self.config.classification_cache_capacity)
+        self.image_index = DrillImageIndex(Config.DRILL_IMG_FOLDER, int(Config.DRILL_IMG_TIME_TOLERANCE))
+        self._last_pending_retry: Optional[float] = None
+        self._init_limits()
+
+    def _init_limits(self):
+        """建立 MSSQL、AI 各自的並行上限"""
+        self._mssql_limit = asyncio.Semaphore(max(1, self.config.max_mssql_concurrency))
+        self._ai_limit = asyncio.Semaphore(max(1, self.config.max_ai_concurrency))
     
     @asynccontextmanager
     async def _mssql_executor_context(self):
@@ -45,58 +120,80 @@ class TQMProcessor:
         
         async def async_operation(operation_func, *args, **kwargs):
             loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(executor, sync_operation, operation_func, *args, **kwargs)
+            async with self._mssql_limit:
+                return await loop.run_in_executor(executor, partial(sync_operation, operation_func, *args, **kwargs))
         
         try:
             yield async_operation
         finally:
             executor.shutdown(wait=True)
             # self.logger.debug("MSSQL 執行緒池已關閉")
+
+    @asynccontextmanager
+    async def _mysql_pool_context(self):
+        """MySQL session pool 上下文管理器, 每個 session 同一時間只給一個工作使用"""
+        async with AsyncExitStack() as stack:
+            pool = asyncio.Queue()
+            for _ in range(max(1, self.config.max_mysql_concurrency)):
+                pool.put_nowait(await stack.enter_async_context(mysql_session()))
+
+            @asynccontextmanager
+            async def acquire():
+                mydb = await pool.get()
+                try:
+                    yield mydb
+                finally:
+                    pool.put_nowait(mydb)
+
+            yield acquire
     
-    async def _send_alert_emails(self, mydb, highlight_list: List[Dict]) -> bool:
-        """發送警告郵件"""
-        if not highlight_list:
-            return True
-            
+    async def _save_batch_data(self, mydb, prediction_list: List[Dict], insert_list: List[Dict],
+                               checkpoint: Optional[Tuple[str, int]] = None,
+                               highlight_list: Optional[List[Dict]] = None) -> bool:
+        """批次儲存資料: drill_info、prediction_record、警告 outbox 與 checkpoint 在同一個交易內寫入
+
+        受影響的失效率日彙總鍵值於同一交易內寫入 drill_failrate_dirty, 交易提交後再以短交易重算,
+        INSERT ... SELECT 對 drill_info 的共享鎖不會延長匯入交易; 重算失敗或程序中止時鍵值仍保留, 之後繼續重算。
+        """
+        chunk_size = self.config.write_chunk_size
         try:
-            mail_list = await mail_crud.get_mail_info(mydb)
-            self.email_client.add_client(host=self.email_host)
-            
-            for highlight_info in highlight_list:
-                send_data = self.transfer.get_mail_data(highlight_info, mail_list)
-                self.logger.info(f"準備發送郵件: {send_data}")
-                # self.email_client.send_email(host=self.email_host, data=send_data)
-                
-            self.logger.info(f"PPM 警告資訊已寄出 ({len(highlight_list)} 封)")
-            return True
-        except Exception as mail_err:
-            self.logger.error(f"郵件發送錯誤: {mail_err}")
+            if insert_list:
+                await drill_crud.upsert_drill_info_all(mydb, insert_list, chunk_size=chunk_size, commit=False)
+                await drill_crud.mark_drill_failrate_dirty(mydb, insert_list, commit=False)
+            if prediction_list:
+                await prediction_crud.upsert_prediction_record_all(mydb, prediction_list, chunk_size=chunk_size, commit=False)
+            if highlight_list and self.config.enable_email:
+                # 快速警告路徑寫入失敗時由此補寫(重複寫入會被忽略), 並補上 AI 分類結果
+                await alert_crud.enqueue_alert_outbox_all(mydb, highlight_list, commit=False)
+                await alert_crud.attach_alert_outbox_classification(
+                    mydb, [drill_info for drill_info in insert_list if self._check_highlight_condition(drill_info)],
+                    AI_PENDING_RESULT, commit=False
+                )
+            if checkpoint:
+                await checkpoint_crud.save_checkpoint(mydb, self.config.checkpoint_name, *checkpoint, commit=False)
+            await mydb.commit()
+        except Exception as sql_err:
+            self.logger.error(f"批次儲存資料錯誤: {sql_err}")
+            await mydb.rollback()
             return False
-        finally:
-            self.email_client.delete_client(host=self.email_host)
-    
-    async def _save_batch_data(self, mydb, prediction_list: List[Dict], insert_list: List[Dict]) -> bool:
-        """批次儲存資料"""
-        save = True
-        if insert_list:
-            try:
-                await drill_crud.create_drill_info_all(mydb, insert_list)
-                self.logger.info(f"成功儲存 {len(insert_list)} 筆 drill_info")
-            except Exception as sql_err:
-                self.logger.error(f"儲存 drill_info 錯誤: {sql_err}")
-                save = False
-
-        if prediction_list:
-            try:
-                await prediction_crud.create_prediction_record_all(mydb, prediction_list)
-                self.logger.info(f"成功儲存 {len(prediction_list)} 筆 prediction_record")
-            except Exception as sql_err:
-                self.logger.error(f"儲存 prediction_record 錯誤: {sql_err}")
-                save = False
 
-        return save
+        if insert_list:
+            await self._drain_failrate_dirty(mydb)
+        self._recent_keys.add_many(self._get_drill_key(drill_info) for drill_info in insert_list)
+        self.logger.info(f"成功儲存 {len(insert_list)} 筆 drill_info, {len(prediction_list)} 筆 prediction_record")
+        return True
+
+    async def _drain_failrate_dirty(self, mydb):
+        """重算所有待更新的失效率日彙總, 每 write_chunk_size 個鍵值一個短交易; 失敗時鍵值保留, 下次再重算"""
+        limit = max(1, self.config.write_chunk_size)
+        try:
+            while await drill_crud.drain_drill_failrate_dirty(mydb, limit) >= limit:
+                pass
+        except Exception as sql_err:
+            self.logger.error(f"失效率日彙總重算錯誤, 於之後重試: {sql_err}")
+            await mydb.rollback()
     
-    async def _get_or_create_product_info(self, product_name: str, lot_number: str, mydb) -> Any:
+    async def _get_or_create_product_info(self, product_name: str, lot_number: str, mydb) -> ProductCriteria:
         """取得或建立產品資訊"""
         try:
             product_info = await ppm_crud.get_ppm_criteria_limit_info(mydb, product_name)
@@ -111,17 +208,35 @@ class TQMProcessor:
                     )
                     product_info = await ppm_crud.create_ppm_criteria_limit_info(mydb, ppm_criteria_limit_info)
                 else:
-                    class ProductInfo:
-                        def __init__(self, product_name):
-                            self.product_name = product_name
-                            self.ppm_limit = None
-                    product_info = ProductInfo(product_name)
+                    product_info = ProductCriteria(product_name)
             
-            return product_info
+            return ProductCriteria(product_info.product_name, product_info.ppm_limit)
         except Exception as e:
             self.logger.error(f"取得或建立產品資訊錯誤: {e}")
             raise
     
+    async def _prefetch_product_info(self, product_names: List[str], acquire_mydb):
+        """整批預先載入快取中沒有的產品資訊, 只需一次 IN (...) 查詢"""
+        missing = [name for name in dict.fromkeys(product_names) if name and name not in product_criteria_cache]
+        if not missing:
+            return
+        async with acquire_mydb() as mydb:
+            criteria_list = await ppm_crud.get_ppm_criteria_limit_info_by_names(mydb, missing)
+        for criteria in sorted(criteria_list, key=lambda criteria: criteria.id, reverse=True):
+            product_criteria_cache.set(criteria.product_name, ProductCriteria(criteria.product_name, criteria.ppm_limit))
+
+    async def _load_product_info(self, product_name: str, lot_number: str, acquire_mydb) -> ProductCriteria:
+        """由快取取得產品資訊, 同一個新產品的並行未命中只會呼叫一次 SOAP 並建立一筆資料"""
+        async def loader():
+            async with acquire_mydb() as mydb:
+                return await self._get_or_create_product_info(product_name, lot_number, mydb)
+
+        # 查無管制界限的預設值可能來自暫時性的 SOAP 錯誤, 只短暫快取
+        return await product_criteria_cache.get_or_load(
+            product_name, loader,
+            ttl_for=lambda criteria: float(Config.PRODUCT_CRITERIA_NEGATIVE_CACHE_TTL) if criteria.ppm_limit is None else None
+        )
+
     def _check_highlight_condition(self, drill_info: dict) -> dict:
         """檢查是否需要發送警告"""
         if (not drill_info.get("judge_ppm") and 
@@ -132,168 +247,494 @@ class TQMProcessor:
                 "machine_name": drill_info["drill_machine_name"],
                 "spindle_id": drill_info["drill_spindle_id"],
                 "lot_number": drill_info["lot_number"],
+                "aoi_time": drill_info["aoi_time"],
                 "ppm": drill_info["ppm"],
                 "ppm_control_limit": drill_info["ppm_control_limit"]
             }
         return {}
     
-    async def _perform_ai_prediction(self, drill_info: dict) -> Tuple[Dict, Dict]:
-        """執行 AI 預測"""
-        ai_start_time = datetime.datetime.now()
+    async def _get_ai_image_path(self, drill_info: dict) -> Optional[str]:
+        """取得 AI 圖片路徑"""
+        return await self.transfer.get_ai_drill_img_path(
+            drill_info["lot_number"], drill_info["drill_machine_name"],
+            drill_info["drill_spindle_id"], drill_info["drill_time"].strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+    def _apply_ai_classification(self, drill_info: dict, ai_image_path: str, ai_classification_result: dict,
+                                 classification_time: str, image_stat: Optional[Tuple] = None) -> Tuple[Dict, Dict]:
+        """建立預測資訊並更新 drill 資訊"""
+        # 建立預測資訊
+        prediction_info = {
+            "image_path": ai_image_path,
+            "product_name": drill_info["product_name"],
+            "image_mtime": image_stat[0] if image_stat else None,
+            "image_size": image_stat[1] if image_stat else None,
+            "classification_code": ai_classification_result["classification_code"],
+            "classification_model": ai_classification_result["classification_model"],
+            "mahalanobis_distance": ai_classification_result["distance"],
+            "classification_time": classification_time
+        }
         
-        try:
-            # 取得 AI 圖片路徑
-            ai_image_path = await self.transfer.get_ai_drill_img_path(
-                drill_info["lot_number"], drill_info["drill_machine_name"],
-                drill_info["drill_spindle_id"], drill_info["drill_time"].strftime("%Y-%m-%d %H:%M:%S")
-            )
-            
-            # 呼叫 AI 預測服務
-            ai_classification_result = await get_ai_classification(
-                img_src=ai_image_path, 
-                product_name=drill_info["product_name"]
+        # 更新 drill 資訊
+        drill_info.update({
+            "classification_result": ai_classification_result["classification_code"],
+            "classification_time": classification_time,
+            "image_path": ai_image_path
+        })
+        
+        return prediction_info, drill_info
+
+    @staticmethod
+    def _mark_pending(drill_info: Dict, image_path: Optional[str]) -> Tuple[Dict, Dict]:
+        """標記為待處理: 仍會寫入 drill_info, 由 retry_pending_classification 重新分類"""
+        drill_info.update({
+            "classification_result": AI_PENDING_RESULT,
+            "classification_time": None,
+            "image_path": image_path
+        })
+        return {}, drill_info
+
+    async def _perform_ai_prediction(self, drill_list: List[Dict], acquire_mydb) -> List[Tuple[Dict, Dict]]:
+        """執行 AI 預測: 先查分類結果快取, 未命中的每 ai_batch_size 筆送出一次批次分類, 結果依 drill_list 順序回傳
+
+        找不到圖片或 AI 分類失敗的項目標記為待處理, 不會因分類失敗而漏存 drill_info。
+        """
+        results: List[Tuple[Dict, Dict]] = [({}, {})] * len(drill_list)
+
+        # 取得 AI 圖片路徑
+        image_paths = await asyncio.gather(
+            *(self._get_ai_image_path(drill_info) for drill_info in drill_list), return_exceptions=True
+        )
+        # 更新圖片索引(只重新掃描有變動的機台資料夾), 找不到圖片的項目標記為待處理, 不送 AI 分類
+        await asyncio.to_thread(
+            self.image_index.refresh, [drill_info["drill_machine_name"] for drill_info in drill_list]
+        )
+        candidates = []
+        for index, (drill_info, ai_image_path) in enumerate(zip(drill_list, image_paths)):
+            if isinstance(ai_image_path, Exception):
+                self.logger.error(f"AI 預測失敗: {ai_image_path}")
+                results[index] = self._mark_pending(drill_info, None)
+                continue
+            found_image_path = self.image_index.find(ai_image_path)
+            if found_image_path is None:
+                results[index] = self._mark_pending(drill_info, None)
+                continue
+            candidates.append((index, drill_info, found_image_path))
+        if len(candidates) < len(drill_list):
+            self.logger.info(f"找不到鑽孔圖片 {len(drill_list) - len(candidates)} 筆, 標記為待處理")
+        if not candidates:
+            return results
+
+        # 查詢分類結果快取, 命中的項目不需再呼叫 AI 服務(prediction_record 已有紀錄)
+        image_stats = await asyncio.to_thread(
+            lambda: [get_image_stat(ai_image_path) for _, _, ai_image_path in candidates]
+        )
+        async with acquire_mydb() as mydb:
+            cached_results = await self.classification_cache.get_many(mydb, [
+                (ai_image_path, drill_info["product_name"], image_stat)
+                for (_, drill_info, ai_image_path), image_stat in zip(candidates, image_stats)
+            ])
+        items = []
+        for (index, drill_info, ai_image_path), image_stat, cached_result in zip(candidates, image_stats, cached_results):
+            if cached_result is None:
+                items.append((index, drill_info, ai_image_path, image_stat))
+                continue
+            # 預測紀錄一定有分類時間; 記憶體快取的舊項目沒有時以目前時間代替
+            classification_time = cached_result.get("classification_time") or datetime.datetime.now()
+            if isinstance(classification_time, datetime.datetime):
+                classification_time = classification_time.strftime("%Y-%m-%d %H:%M:%S")
+            # 已存在預測紀錄, 不需重複寫入
+            _, updated_drill_info = self._apply_ai_classification(
+                drill_info, ai_image_path, cached_result, classification_time, image_stat
             )
-            
+            results[index] = ({}, updated_drill_info)
+        if len(items) < len(candidates):
+            self.logger.info(f"AI 分類快取命中 {len(candidates) - len(items)} 筆")
+
+        async def classify(chunk):
+            ai_start_time = datetime.datetime.now()
+            async with self._ai_limit:
+                ai_classification_results = await get_ai_classification_batch([
+                    {"img_src": ai_image_path, "product_name": drill_info["product_name"]}
+                    for _, drill_info, ai_image_path, _ in chunk
+                ])
             ai_end_time = datetime.datetime.now()
             classification_time = ai_end_time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            print(f"AI 預測時間: {ai_end_time - ai_start_time}")
-            
-            # 建立預測資訊
-            prediction_info = {
-                "image_path": ai_image_path,
-                "product_name": drill_info["product_name"],
-                "classification_code": ai_classification_result["classification_code"],
-                "classification_model": ai_classification_result["classification_model"],
-                "mahalanobis_distance": ai_classification_result["distance"],
-                "classification_time": classification_time
-            }
-            
-            # 更新 drill 資訊
-            drill_info.update({
-                "classification_result": ai_classification_result["classification_code"],
-                "classification_time": classification_time,
-                "image_path": ai_image_path
-            })
-            
-            return prediction_info, drill_info
-            
-        except Exception as e:
-            self.logger.error(f"AI 預測失敗: {e}")
-            return {}, {}
+            self.logger.info(f"AI 預測時間: {len(chunk)} 筆, {ai_end_time - ai_start_time}")
+
+            failed_count = 0
+            for (index, drill_info, ai_image_path, image_stat), ai_classification_result in zip(chunk, ai_classification_results):
+                if ai_classification_result.get("classification_code") is None:
+                    # AI 服務異常(含斷路器開路)時標記為待處理, 不寫入預測紀錄
+                    failed_count += 1
+                    results[index] = self._mark_pending(drill_info, ai_image_path)
+                    continue
+                self.classification_cache.put(
+                    ai_image_path, drill_info["product_name"], image_stat,
+                    dict(ai_classification_result, classification_time=classification_time)
+                )
+                results[index] = self._apply_ai_classification(
+                    drill_info, ai_image_path, ai_classification_result, classification_time, image_stat
+                )
+            if failed_count:
+                self.logger.warning(
+                    f"AI 分類失敗 {failed_count} 筆, 標記為待處理 (斷路器: {ai_breaker.state}, 並行上限: {ai_limiter.limit})"
+                )
+
+        batch_size = max(1, self.config.ai_batch_size)
+        chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        outcomes = await asyncio.gather(*(classify(chunk) for chunk in chunks), return_exceptions=True)
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, Exception):
+                self.logger.error(f"AI 預測失敗: {outcome}")
+                for index, drill_info, ai_image_path, _ in chunk:
+                    if not results[index][1]:
+                        results[index] = self._mark_pending(drill_info, ai_image_path)
+        return results
     
-    async def _process_single_board(self, board, mydb, ms_exec) -> Tuple[Dict, Dict, Dict]:
-        """處理每個 board 資料"""
+    async def _enrich_boards(self, boards_info: List, ms_exec) -> BoardLookup:
+        """取得整批 Board 的對照表: tMeasure 以 IN (...) 查詢, tDrillMachine、tProduct 由維度快取取得"""
+        (machine_map, product_map), measure_map = await asyncio.gather(
+            self.dimension_cache.resolve(
+                ms_exec,
+                [board.DrillMachineID for board in boards_info],
+                [board.ProductID for board in boards_info]
+            ),
+            ms_exec(tqm_crud.get_measure_info_by_board_ids, [board.ID_B for board in boards_info])
+        )
+        return BoardLookup(machine_map=machine_map, measure_map=measure_map, product_map=product_map)
+
+    async def _build_drill_info(self, board, acquire_mydb, lookup: BoardLookup) -> Dict:
+        """將 board 資料轉換為 drill 資訊"""
+        board_id = board.ID_B
+        product_id = board.ProductID
+        machine_id = board.DrillMachineID
+        print(f"Board info: board_id={board_id}, product_id={product_id}, machine_id={machine_id}")
+        
+        # 由整批查詢的對照表取得 MSSQL 資料
+        machine_info = lookup.machine_map.get(machine_id)
+        measure_info = lookup.measure_map.get(board_id)
+        product_name = lookup.product_map.get(product_id)
+
+        # 處理產品資訊
+        product_info = await self._load_product_info(product_name, board.Lot, acquire_mydb)
+
+        if not (measure_info and machine_info):
+            self.logger.warning(f"警告，此筆資料不完整: board_id={board_id}")
+            self.logger.warning(f"measure_info: {orjson.dumps(measure_info)}")
+            self.logger.warning(f"machine_info: {orjson.dumps(machine_info)}")
+            self.logger.warning(f"product_info: {orjson.dumps(product_info)}")
+            return {}
+
+        # 轉換為 drill 資訊
+        return self.transfer.get_drill_info_transfer(board, measure_info, product_info, machine_info)
+
+    @staticmethod
+    def _get_drill_key(drill_info: Dict) -> Tuple[str, int, datetime.datetime]:
+        """drill 資訊的重複檢查鍵值 (lot_number, drill_spindle_id, aoi_time)"""
+        return drill_info["lot_number"], drill_info["drill_spindle_id"], drill_info["aoi_time"]
+
+    async def _filter_existing_drill_info(self, mydb, drill_list: List[Dict]) -> List[Dict]:
+        """整批檢查是否已存在 DB, 最近處理過的鍵值直接由記憶體判斷"""
+        keys = [self._get_drill_key(drill_info) for drill_info in drill_list]
+        candidates = [key for key in keys if key not in self._recent_keys]
+
+        existing = set()
+        if candidates:
+            existing = await drill_crud.get_drill_info_existing_keys(mydb, candidates)
+            self._recent_keys.add_many(existing)
+
+        result, seen = [], set()
+        for key, drill_info in zip(keys, drill_list):
+            if key in existing or key in seen or key in self._recent_keys:
+                continue
+            seen.add(key)
+            result.append(drill_info)
+        return result
+
+    async def _gather_boards(self, func, items: List) -> List:
+        """以 max_concurrent_boards 為上限並行執行, 結果依原始順序回傳, 失敗的項目回傳 None"""
+        board_limit = asyncio.Semaphore(max(1, self.config.max_concurrent_boards))
+
+        async def run(item):
+            async with board_limit:
+                return await func(item)
+
+        results = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                self.logger.error(f"處理各別需求資訊錯誤: {result}")
+                results[index] = None
+        return results
+
+    async def _load_cursor(self, mydb) -> Tuple[str, int]:
+        """取得 (AOITime, ID_B) keyset cursor, 優先使用 checkpoint"""
+        checkpoint = await checkpoint_crud.get_checkpoint(mydb, self.config.checkpoint_name)
+        if checkpoint:
+            return checkpoint.aoi_time, checkpoint.board_id
+
+        # 指定匯入範圍時由範圍起點開始(ID_B 皆大於 0, 包含起點時間的 Board)
+        if self.config.start_aoi_time:
+            return self.config.start_aoi_time, 0
+
+        # 尚無 checkpoint 時由最後一筆 drill_info 接續, 相同 AOITime 的 Board 交由重複檢查略過
+        last_drill_info = await drill_crud.get_drill_info_by_last_aoitime(mydb)
+        if last_drill_info and last_drill_info.aoi_time:
+            return last_drill_info.aoi_time.strftime("%Y/%m/%d %H:%M:%S"), 0
+        return "", 0
+
+    async def _run_stage(self, handler, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue], workers: int = 1):
+        """執行 pipeline 的一個階段, 收到結束標記後轉送給下一個階段"""
+        async def worker():
+            while True:
+                batch = await in_queue.get()
+                if batch is _PIPELINE_END:
+                    # 放回結束標記讓同階段的其他 worker 也能結束
+                    in_queue.put_nowait(_PIPELINE_END)
+                    return
+                result = await handler(batch)
+                if out_queue is not None and result is not None:
+                    await out_queue.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+        if out_queue is not None:
+            await out_queue.put(_PIPELINE_END)
+
+    async def _fetch_stage(self, ms_exec, cursor: Tuple[str, int], out_queue: asyncio.Queue, stop_event: asyncio.Event):
+        """擷取階段: 以 keyset cursor 分頁擷取 Board, 佇列滿時暫停擷取"""
+        last_aoi_time, last_board_id = cursor
+        seq = 0
+        while not stop_event.is_set():
+            boards_info = await ms_exec(
+                tqm_crud.get_boards_info_by_cursor, last_aoi_time, last_board_id, self.config.batch_size,
+                self.config.end_aoi_time
+            )
+            if not boards_info:
+                self.logger.info("沒有找到新的 Board 資料！")
+                break
+
+            self.logger.info(f"擷取 {len(boards_info)} 筆 Board 資料 (batch={seq})")
+            last_aoi_time, last_board_id = boards_info[-1].AOITime, boards_info[-1].ID_B
+            await out_queue.put(BoardBatch(seq=seq, boards_info=boards_info, checkpoint=(last_aoi_time, last_board_id)))
+            seq += 1
+
+            if len(boards_info) < self.config.batch_size:
+                break
+            if self.config.fetch_interval > 0:
+                await asyncio.sleep(self.config.fetch_interval)
+        await out_queue.put(_PIPELINE_END)
+
+    async def _enrich_stage(self, batch: BoardBatch, ms_exec, acquire_mydb) -> BoardBatch:
+        """轉換階段: 整批取得 MSSQL 對照資料並轉換為 drill 資訊"""
+        batch.lookup = await self._enrich_boards(batch.boards_info, ms_exec)
+        await self._prefetch_product_info(list(batch.lookup.product_map.values()), acquire_mydb)
+        drill_list = await self._gather_boards(
+            lambda board: self._build_drill_info(board, acquire_mydb, batch.lookup), batch.boards_info
+        )
+        batch.drill_list = [drill_info for drill_info in drill_list if drill_info]
+        return batch
+
+    async def _dedup_stage(self, batch: BoardBatch, mydb) -> BoardBatch:
+        """重複檢查階段: 整批檢查是否已存在 DB, 並立即送出警告(不等待 AI 分類與儲存)"""
+        batch.drill_list = await self._filter_existing_drill_info(mydb, batch.drill_list)
+        batch.highlight_list = [
+            highlight_info for highlight_info in map(self._check_highlight_condition, batch.drill_list) if highlight_info
+        ]
+        await self._send_fast_alerts(mydb, batch.highlight_list)
+        return batch
+
+    async def _send_fast_alerts(self, mydb, highlight_list: List[Dict]):
+        """快速警告路徑: PPM 判定只依賴轉換結果, 重複檢查後即寫入 outbox 並通知寄送器"""
+        if not highlight_list or not self.config.enable_email:
+            return
         try:
-            board_id = board.ID_B
-            product_id = board.ProductID
-            machine_id = board.DrillMachineID
-            print(f"Board info: board_id={board_id}, product_id={product_id}, machine_id={machine_id}")
-            
-            # 先取得 MSSQL 中所需的資料
-            machine_info, measure_info, product_name = await asyncio.gather(
-                ms_exec(tqm_crud.get_machine_name, machine_id),
-                ms_exec(tqm_crud.get_measure_info, board_id),
-                ms_exec(tqm_crud.get_product_name, product_id)
+            await alert_crud.enqueue_alert_outbox_all(mydb, highlight_list)
+        except Exception as err:
+            # 寫入失敗時於批次儲存時補寫
+            self.logger.error(f"警告寫入 outbox 錯誤: {err}")
+            await mydb.rollback()
+            return
+        alert_sender.notify()
+
+    async def _classify_stage(self, batch: BoardBatch, acquire_mydb) -> BoardBatch:
+        """分類階段: 執行 AI 預測"""
+        results = await self._perform_ai_prediction(batch.drill_list, acquire_mydb)
+        for prediction_info, drill_info in results:
+            if prediction_info:
+                batch.prediction_list.append(prediction_info)
+            if drill_info:
+                batch.insert_list.append(drill_info)
+        return batch
+
+    def _make_persist_stage(self, mydb, stop_event: asyncio.Event):
+        """儲存階段: 依擷取順序寫入資料與 checkpoint, 儲存失敗後停止擷取且不再推進 checkpoint"""
+        pending: Dict[int, BoardBatch] = {}
+        state = {"next_seq": 0}
+
+        async def persist(batch: BoardBatch) -> Optional[List[BoardBatch]]:
+            pending[batch.seq] = batch
+            ready = []
+            while state["next_seq"] in pending:
+                ready.append(pending.pop(state["next_seq"]))
+                state["next_seq"] += 1
+
+            saved = []
+            for ready_batch in ready:
+                if stop_event.is_set():
+                    continue
+                if self.config.enable_save and not await self._save_batch_data(
+                    mydb, ready_batch.prediction_list, ready_batch.insert_list, ready_batch.checkpoint,
+                    ready_batch.highlight_list
+                ):
+                    self.logger.error(f"批次儲存失敗，停止處理並保留 checkpoint (batch={ready_batch.seq})")
+                    stop_event.set()
+                    continue
+                self.logger.info(f"批次處理完成，更新 cursor: {ready_batch.checkpoint}")
+                saved.append(ready_batch)
+            return saved or None
+
+        return persist
+
+    async def _run_pipeline(self, ms_exec, cursor: Tuple[str, int]) -> bool:
+        """以有界佇列串接 fetch → enrich → dedup(快速警告) → classify → persist"""
+        queue_size = max(1, self.config.pipeline_queue_size)
+        enrich_queue, dedup_queue, classify_queue, persist_queue = (
+            asyncio.Queue(maxsize=queue_size) for _ in range(4)
+        )
+        stop_event = asyncio.Event()
+
+        async with AsyncExitStack() as stack:
+            acquire_mydb = await stack.enter_async_context(self._mysql_pool_context())
+            dedup_db = await stack.enter_async_context(mysql_session())
+            persist_db = await stack.enter_async_context(mysql_session())
+
+            tasks = [asyncio.create_task(stage) for stage in (
+                self._fetch_stage(ms_exec, cursor, enrich_queue, stop_event),
+                self._run_stage(
+                    lambda batch: self._enrich_stage(batch, ms_exec, acquire_mydb),
+                    enrich_queue, dedup_queue, self.config.enrich_workers
+                ),
+                self._run_stage(lambda batch: self._dedup_stage(batch, dedup_db), dedup_queue, classify_queue),
+                self._run_stage(
+                    lambda batch: self._classify_stage(batch, acquire_mydb),
+                    classify_queue, persist_queue, self.config.classify_workers
+                ),
+                self._run_stage(self._make_persist_stage(persist_db, stop_event), persist_queue, None),
+            )]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in tasks:
+                    if task.done() and task.exception():
+                        raise task.exception()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        # 儲存失敗時 stop_event 會被設定, 表示未處理完整個範圍
+        return not stop_event.is_set()
+
+    async def get_board_watermark(self) -> Tuple:
+        """取得 tBoard 的新資料水位(最大 ID_B 與 AOITime)"""
+        def probe():
+            with mssql_session() as db:
+                return tqm_crud.get_board_watermark(db)
+
+        return await asyncio.to_thread(probe)
+
+    async def retry_pending_classification(self, force: bool = False) -> int:
+        """重新分類待處理的 drill 資料(找不到圖片或 AI 分類失敗), 回傳完成分類的筆數
+
+        checkpoint 已越過這些資料, 由此定期補做分類; 以 aoi_time 與重試次數限制範圍, 每 pending_retry_interval 秒最多執行一次。
+        """
+        now = time.monotonic()
+        if not self.config.enable_save:
+            return 0
+        if not force and self._last_pending_retry is not None and now - self._last_pending_retry < self.config.pending_retry_interval:
+            return 0
+        self._last_pending_retry = now
+
+        since = datetime.datetime.now() - datetime.timedelta(seconds=self.config.pending_retry_max_age)
+        async with mysql_session() as mydb:
+            rows = await drill_crud.get_pending_drill_info(
+                mydb, AI_PENDING_RESULT, since, self.config.pending_retry_max_attempts, self.config.pending_retry_batch_size
             )
+            if not rows:
+                return 0
+            drill_list = [{
+                "id": row.id,
+                "lot_number": row.lot_number,
+                "product_name": row.product_name,
+                "drill_machine_name": row.drill_machine_name,
+                "drill_spindle_id": row.drill_spindle_id,
+                "drill_time": row.drill_time,
+                "aoi_time": row.aoi_time,
+                "classification_result": AI_PENDING_RESULT,
+                "classification_time": None,
+                "image_path": row.image_path
+            } for row in rows]
+
+            @asynccontextmanager
+            async def acquire_mydb():
+                yield mydb
+
+            # drill_info 於分類時就地更新, 仍無法分類的項目維持待處理並累計重試次數
+            results = await self._perform_ai_prediction(drill_list, acquire_mydb)
+            prediction_list = [prediction_info for prediction_info, _ in results if prediction_info]
+            resolved_list = [drill_info for drill_info in drill_list if drill_info["classification_result"] != AI_PENDING_RESULT]
+            try:
+                await drill_crud.update_drill_classification_all(mydb, drill_list, commit=False)
+                if prediction_list:
+                    await prediction_crud.upsert_prediction_record_all(mydb, prediction_list, commit=False)
+                if resolved_list and self.config.enable_email:
+                    # 只會更新已存在的警告; 已寄出的警告改為寄送分類結果的更新通知
+                    await alert_crud.attach_alert_outbox_classification(mydb, resolved_list, AI_PENDING_RESULT, commit=False)
+                await mydb.commit()
+            except Exception as sql_err:
+                self.logger.error(f"待分類資料更新錯誤: {sql_err}")
+                await mydb.rollback()
+                return 0
 
-            # 處理產品資訊
-            product_info = await self._get_or_create_product_info(product_name, board.Lot, mydb)
-
-            if not (measure_info and machine_info):
-                self.logger.warning(f"警告，此筆資料不完整: board_id={board_id}")
-                self.logger.warning(f"measure_info: {orjson.dumps(measure_info)}")
-                self.logger.warning(f"machine_info: {orjson.dumps(machine_info)}")
-                self.logger.warning(f"product_info: {orjson.dumps(product_info)}")
-                return {}, {}, {}
-
-            # 轉換為 drill 資訊
-            drill_info = self.transfer.get_drill_info_transfer(board, measure_info, product_info, machine_info)
-            
-            # 檢查是否已存在 DB
-            if await drill_crud.get_drill_info_check(mydb, drill_info):
-                return {}, {}, {}
-
-            # 執行 AI 預測
-            prediction_info, updated_drill_info = await self._perform_ai_prediction(drill_info)
-            
-            # 檢查警告條件
-            highlight_info = self._check_highlight_condition(updated_drill_info)
-            
-            return prediction_info, updated_drill_info, highlight_info
+        self.logger.info(f"重新分類待處理資料 {len(drill_list)} 筆, 完成 {len(resolved_list)} 筆")
+        return len(resolved_list)
 
+    async def warm_up(self):
+        """啟動時預先載入維度快取"""
+        try:
+            async with self._mssql_executor_context() as ms_exec:
+                await self.dimension_cache.load(ms_exec)
         except Exception as e:
-            self.logger.error(f"處理 Board 的資料錯誤: {e}")
-            return {}, {}, {}
-        
-    async def run_process(self):
-        """執行 TQM 處理流程"""
+            self.logger.error(f"維度快取載入錯誤: {e}")
+
+    async def run_process(self) -> bool:
+        """執行 TQM 處理流程, 回傳是否已處理完所有 Board"""
         self.logger.info("=== 開始 TQM 任務處理流程 ===")
         # 設定開始時間
         start_process_time = datetime.datetime.now()
         try:
+            # API 程序修改管制界限後, 清除本程序的產品快取
+            await sync_product_criteria_cache()
             async with self._mssql_executor_context() as ms_exec:
                 # 1. 取得時間範圍
                 last_board_info = await ms_exec(tqm_crud.get_board_info_by_last_aoitime)
+                if not last_board_info:
+                    self.logger.warning("找不到任何 Board 資料")
+                    return True
 
                 async with mysql_session() as mydb:
-                    last_drill_info = await drill_crud.get_drill_info_by_last_aoitime(mydb)
-                    
-                    if not last_drill_info:
-                        first_board_info = await ms_exec(tqm_crud.get_board_info_by_first_aoitime)
-                        start_time = first_board_info.AOITime if first_board_info else None
-                        if not start_time:
-                            self.logger.warning("找不到任何 Board 資料")
-                            return
-                    else:
-                        start_time = last_drill_info.aoi_time.strftime("%Y/%m/%d %H:%M:%S")
-                    
-                    end_time = last_board_info.AOITime
-                    self.logger.info(f"處理機鑽 Board 的時間範圍: {start_time} - {end_time}")
-
-                    # 分批處理主迴圈
-                    while end_time > start_time:
-                        # 2. 擷取主板資料
-                        boards_info = await ms_exec(tqm_crud.get_boards_info_by_datetime, start_time)
-                        if not boards_info:
-                            self.logger.info("沒有找到新的 Board 資料！")
-                            break
-
-                        self.logger.info(f"開始處理 {len(boards_info)} 筆 Board 資料")
-
-                        # 3. 處理各別資料
-                        prediction_list, insert_list, highlight_list = [], [], []
-
-                        for board in boards_info:
-                            try:
-                                prediction_info, drill_info, highlight_info = await self._process_single_board(board, mydb, ms_exec)
-                                
-                                if prediction_info:
-                                    prediction_list.append(prediction_info)
-                                if drill_info:
-                                    insert_list.append(drill_info)
-                                if highlight_info:
-                                    highlight_list.append(highlight_info)
-                                    
-                            except Exception as e:
-                                self.logger.error(f"處理各別需求資訊錯誤: {e}")
-                                continue
-                        
-                        # 4. 批次儲存資料 - 在呼叫前判斷
-                        if self.config.enable_save:
-                            await self._save_batch_data(mydb, prediction_list, insert_list)
-                        
-                        # 5. 發送警告郵件 - 在呼叫前判斷
-                        if self.config.enable_email:
-                            await self._send_alert_emails(mydb, highlight_list)
-
-                        # 更新開始時間
-                        start_time = boards_info[-1].AOITime
-                        self.logger.info(f"批次處理完成，更新開始時間: {start_time}")
+                    cursor = await self._load_cursor(mydb)
+                    if self.config.enable_save:
+                        # 上次程序於批次提交後、日彙總重算前中止時, 繼續重算
+                        await self._drain_failrate_dirty(mydb)
+                self.logger.info(f"處理機鑽 Board 的時間範圍: {cursor} - {self.config.end_aoi_time or last_board_info.AOITime}")
+
+                # 2. 分批處理 pipeline
+                completed = await self._run_pipeline(ms_exec, cursor)
 
             end_process_time = datetime.datetime.now()
             processing_time = end_process_time - start_process_time
+            self.logger.info(f"維度快取統計: {self.dimension_cache.get_stats()}")
             self.logger.info(f"=== TQM 處理流程完成，總耗時: {processing_time} ===")
+            return completed
 
         except Exception as e:
             self.logger.error(f"TQM 任務處理錯誤: {e}")
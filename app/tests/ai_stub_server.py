@@ -0,0 +1,98 @@
+"""
+# app/tests/ai_stub_server.py
+AI Service Center 測試用 stub: 提供 /drill_map/classify 與 /drill_map/classify_batch
+
+    python -m app.tests.ai_stub_server --port 8009
+
+以 asyncio.sleep 模擬推論成本: 每個請求固定 request_cost 秒(載入、排程), 每張圖片 image_cost 秒,
+批次請求每張 batch_image_cost 秒; 同一時間最多 workers 個請求進行推論(模擬 GPU 數量)。
+"""
+import socket
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+
+class ClassifyItem(BaseModel):
+    img_src: str
+    product_name: str
+
+
+class ClassifyBatch(BaseModel):
+    items: List[ClassifyItem]
+
+
+def _get_result(item: ClassifyItem) -> Dict:
+    return {"classification_code": "A1", "classification_model": "stub", "distance": 0.1, "img_src": item.img_src}
+
+
+def create_stub_app(request_cost: float = 0.005, image_cost: float = 0.002, batch_image_cost: Optional[float] = None,
+                    workers: int = 1) -> FastAPI:
+    """建立 stub app, app.state.stats 記錄收到的請求數與圖片數"""
+    app = FastAPI()
+    app.state.stats = {"requests": 0, "images": 0}
+    batch_image_cost = image_cost if batch_image_cost is None else batch_image_cost
+    slots = {"semaphore": None}
+
+    async def infer(image_count: int, cost: float):
+        # Semaphore 需於 server 的 event loop 內建立
+        if slots["semaphore"] is None:
+            slots["semaphore"] = asyncio.Semaphore(max(1, workers))
+        async with slots["semaphore"]:
+            await asyncio.sleep(request_cost + image_count * cost)
+        app.state.stats["requests"] += 1
+        app.state.stats["images"] += image_count
+
+    @app.post("/drill_map/classify")
+    async def classify(item: ClassifyItem):
+        await infer(1, image_cost)
+        return {"code": "0", "error": "", "data": _get_result(item)}
+
+    @app.post("/drill_map/classify_batch")
+    async def classify_batch(body: ClassifyBatch):
+        await infer(len(body.items), batch_image_cost)
+        return {"code": "0", "error": "", "data": [_get_result(item) for item in body.items]}
+
+    return app
+
+
+@asynccontextmanager
+async def run_stub_server(app: Optional[FastAPI] = None, host: str = "127.0.0.1",
+                          port: int = 0) -> AsyncIterator[Tuple[str, int]]:
+    """於目前的 event loop 啟動 stub server, port 為 0 時使用系統配置的空閒 port, 回傳 (host, port)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    server = uvicorn.Server(uvicorn.Config(app or create_stub_app(), log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    try:
+        while not server.started:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.01)
+        yield host, sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        await task
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Service Center stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8009)
+    parser.add_argument("--request-cost", type=float, default=0.005, help="每個請求的固定成本(秒)")
+    parser.add_argument("--image-cost", type=float, default=0.002, help="單張分類每張圖片的成本(秒)")
+    parser.add_argument("--batch-image-cost", type=float, default=None, help="批次分類每張圖片的成本(秒)")
+    parser.add_argument("--workers", type=int, default=1, help="同時推論的請求數")
+    args = parser.parse_args()
+    app = create_stub_app(args.request_cost, args.image_cost, args.batch_image_cost, args.workers)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
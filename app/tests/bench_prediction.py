@@ -0,0 +1,121 @@
+"""
+# app/tests/bench_prediction.py
+以 ai_stub_server 量測單張分類與批次分類的吞吐量 (images/s)
+
+    python -m app.tests.bench_prediction --images 500 --batch-size 50
+
+數值反映 stub 的成本模型(每請求固定成本 + 每張成本), 用於比較兩種呼叫方式, 不代表實際 GPU 推論速度。
+"""
+import time
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Dict, List
+import httpx
+from app.config import Config
+from app.services import prediction_service
+from app.utils.circuit_helper import AdaptiveLimiter, CircuitBreaker
+from app.tests.ai_stub_server import create_stub_app, run_stub_server
+
+
+@asynccontextmanager
+async def use_ai_service(host: str, port: int, max_connections: int):
+    """暫時將 prediction_service 指向 stub, 結束後還原設定與全域狀態"""
+    saved_config = (Config.AI_SERVICE_HOST, Config.AI_SERVICE_PORT)
+    saved_state = (prediction_service._ai_client, prediction_service._batch_supported,
+                   prediction_service.ai_breaker, prediction_service.ai_limiter)
+    Config.AI_SERVICE_HOST, Config.AI_SERVICE_PORT = host, str(port)
+    # init_ai_client 使用的 proxies 參數在新版 httpx 已移除, 此處自行建立等效的連線池
+    client = httpx.AsyncClient(
+        trust_env=False,
+        timeout=httpx.Timeout(float(Config.AI_CLIENT_TIMEOUT), connect=5.0),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+    prediction_service._ai_client = client
+    prediction_service._batch_supported = None
+    prediction_service.ai_breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
+    prediction_service.ai_limiter = AdaptiveLimiter(max_limit=max_connections)
+    try:
+        yield
+    finally:
+        await client.aclose()
+        Config.AI_SERVICE_HOST, Config.AI_SERVICE_PORT = saved_config
+        (prediction_service._ai_client, prediction_service._batch_supported,
+         prediction_service.ai_breaker, prediction_service.ai_limiter) = saved_state
+
+
+async def _run_single(items: List[Dict[str, str]]) -> List[dict]:
+    return list(await asyncio.gather(*(
+        prediction_service.get_ai_classification(img_src=item["img_src"], product_name=item["product_name"])
+        for item in items
+    )))
+
+
+async def _run_batch(items: List[Dict[str, str]], batch_size: int) -> List[dict]:
+    chunks = await asyncio.gather(*(
+        prediction_service.get_ai_classification_batch(items[i:i + batch_size])
+        for i in range(0, len(items), batch_size)
+    ))
+    return [result for chunk in chunks for result in chunk]
+
+
+async def run_benchmark(image_count: int = 500, batch_size: int = 50, request_cost: float = 0.005,
+                        image_cost: float = 0.002, batch_image_cost: float = 0.0005, workers: int = 1,
+                        max_connections: int = 16) -> Dict[str, dict]:
+    """
+    分別以單張分類與批次分類送出 image_count 張圖片
+    :return: {"single": {...}, "batch": {...}}, 各含 images, classified, requests, seconds, images_per_sec
+    """
+    items = [{"img_src": f"img_{i}.jpg", "product_name": "STUB"} for i in range(image_count)]
+    app = create_stub_app(request_cost, image_cost, batch_image_cost, workers)
+    report = {}
+    async with run_stub_server(app) as (host, port):
+        for mode in ("single", "batch"):
+            async with use_ai_service(host, port, max_connections):
+                app.state.stats.update(requests=0, images=0)
+                start_time = time.perf_counter()
+                if mode == "single":
+                    results = await _run_single(items)
+                else:
+                    results = await _run_batch(items, batch_size)
+                seconds = time.perf_counter() - start_time
+            report[mode] = {
+                "images": image_count,
+                "classified": sum(1 for result in results if result.get("classification_code")),
+                "requests": app.state.stats["requests"],
+                "seconds": seconds,
+                "images_per_sec": image_count / seconds if seconds > 0 else 0.0,
+            }
+    return report
+
+
+def format_report(report: Dict[str, dict]) -> str:
+    lines = [
+        f"{mode:<6} {row['images']} images, {row['classified']} classified, {row['requests']} requests, "
+        f"{row['seconds']:.3f}s, {row['images_per_sec']:.1f} images/s"
+        for mode, row in report.items()
+    ]
+    if report.get("single", {}).get("images_per_sec"):
+        lines.append(f"batch / single = {report['batch']['images_per_sec'] / report['single']['images_per_sec']:.1f}x")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI 分類吞吐量量測 (stub)")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--request-cost", type=float, default=0.005, help="每個請求的固定成本(秒)")
+    parser.add_argument("--image-cost", type=float, default=0.002, help="單張分類每張圖片的成本(秒)")
+    parser.add_argument("--batch-image-cost", type=float, default=0.0005, help="批次分類每張圖片的成本(秒)")
+    parser.add_argument("--workers", type=int, default=1, help="stub 同時推論的請求數")
+    parser.add_argument("--max-connections", type=int, default=16)
+    args = parser.parse_args()
+    report = asyncio.run(run_benchmark(
+        args.images, args.batch_size, args.request_cost, args.image_cost,
+        args.batch_image_cost, args.workers, args.max_connections
+    ))
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
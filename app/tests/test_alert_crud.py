@@ -0,0 +1,43 @@
+import types
+import datetime
+import pytest
+from sqlalchemy import DateTime
+from sqlalchemy.dialects import mysql
+from app.crud import alert as alert_crud
+from app.models import mysql_models as models
+
+
+class RecordingSession:
+    """記錄執行的 SQL(以 MySQL 語法編譯)與參數"""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        self.statements.append((str(stmt.compile(dialect=mysql.dialect())), params))
+        return types.SimpleNamespace(rowcount=len(params or []))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def test_outbox_aoi_time_matches_drill_result_type():
+    assert isinstance(models.AlertOutbox.__table__.c.aoi_time.type, DateTime)
+    assert isinstance(models.DrillInfo.__table__.c.aoi_time.type, DateTime)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_and_attach_bind_aoi_time_as_datetime():
+    db = RecordingSession()
+    aoi_time = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    highlight = {"machine_name": "ND01", "spindle_id": 0, "lot_number": "L1", "aoi_time": aoi_time}
+    await alert_crud.enqueue_alert_outbox_all(db, [highlight], commit=False)
+    drill = {"lot_number": "L1", "drill_spindle_id": 0, "aoi_time": aoi_time, "classification_result": "OK"}
+    await alert_crud.attach_alert_outbox_classification(db, [drill], "PENDING", commit=False)
+
+    (_, insert_rows), (update_sql, update_rows), _ = db.statements
+    assert insert_rows[0]["aoi_time"] == aoi_time
+    assert "alert_outbox.aoi_time = %s" in update_sql
+    assert update_rows[0]["b_aoi_time"] == aoi_time
+    assert db.commits == 0
@@ -0,0 +1,176 @@
+import json
+import asyncio
+import email
+import types
+import datetime
+from email.header import decode_header
+from contextlib import asynccontextmanager
+import pytest
+from app.services import alert_service, email_service
+from app.services.alert_service import AlertSender, AlertThrottle
+from app.crud import alert as alert_crud
+
+
+class FakeSMTP:
+    """記錄寄出郵件的 SMTP 替身, fail 為 True 時寄送失敗"""
+    sent = []
+    fail = False
+
+    def __init__(self, address):
+        self.address = address
+
+    def sendmail(self, sender, receivers, message):
+        if FakeSMTP.fail:
+            raise OSError("connection reset")
+        FakeSMTP.sent.append((sender, receivers, message))
+
+    def quit(self):
+        pass
+
+
+def make_alert(alert_id: int, machine_name: str, spindle_id: int) -> types.SimpleNamespace:
+    payload = {"machine_name": machine_name, "spindle_id": spindle_id, "lot_number": f"L{alert_id}",
+               "ppm": 1200, "ppm_control_limit": 1000}
+    return types.SimpleNamespace(
+        id=alert_id, machine_name=machine_name, spindle_id=spindle_id, payload=json.dumps(payload),
+        classification_result=None, is_followup=False, status=alert_crud.ALERT_STATUS_PENDING, attempts=0,
+        next_attempt_time=None
+    )
+
+
+def get_subject(message: str) -> str:
+    return "".join(
+        part.decode(charset or "utf-8") if isinstance(part, bytes) else part
+        for part, charset in decode_header(email.message_from_string(message)["Subject"])
+    )
+
+
+class UnavailableRedis:
+    """Redis 無法連線, 節流改用程序內記憶體"""
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis unavailable")
+
+    async def delete(self, *args, **kwargs):
+        raise ConnectionError("redis unavailable")
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """以記憶體資料模擬 alert_outbox 與 mail_list"""
+    rows = {}
+
+    @asynccontextmanager
+    async def mysql_session():
+        yield None
+
+    async def get_due_alert_outbox(mydb, limit=100):
+        now = datetime.datetime.now()
+        return [row for row in rows.values() if row.status == alert_crud.ALERT_STATUS_PENDING
+                and (row.next_attempt_time is None or row.next_attempt_time <= now)][:limit]
+
+    async def get_suppressed_alert_outbox(mydb, limit=1000):
+        return [row for row in rows.values() if row.status == alert_crud.ALERT_STATUS_SUPPRESSED][:limit]
+
+    async def mark_alert_outbox_suppressed(mydb, alert_ids, commit=True):
+        for alert_id in alert_ids:
+            rows[alert_id].status = alert_crud.ALERT_STATUS_SUPPRESSED
+
+    async def mark_alert_outbox_sent(mydb, alert_ids, commit=True):
+        for alert_id in alert_ids:
+            rows[alert_id].status = alert_crud.ALERT_STATUS_SENT
+
+    async def mark_alert_outbox_retry(mydb, alert_ids, attempts, next_attempt_time, error, commit=True):
+        for alert_id in alert_ids:
+            row = rows[alert_id]
+            row.attempts = attempts
+            row.next_attempt_time = next_attempt_time
+            row.status = alert_crud.ALERT_STATUS_PENDING if next_attempt_time else alert_crud.ALERT_STATUS_FAILED
+
+    async def get_mail_info(mydb):
+        return [types.SimpleNamespace(send_type="to", email="ee@example.com")]
+
+    monkeypatch.setattr(alert_service, "mysql_session", mysql_session)
+    monkeypatch.setattr(alert_service.alert_crud, "get_due_alert_outbox", get_due_alert_outbox)
+    monkeypatch.setattr(alert_service.alert_crud, "get_suppressed_alert_outbox", get_suppressed_alert_outbox)
+    monkeypatch.setattr(alert_service.alert_crud, "mark_alert_outbox_suppressed", mark_alert_outbox_suppressed)
+    monkeypatch.setattr(alert_service.alert_crud, "mark_alert_outbox_sent", mark_alert_outbox_sent)
+    monkeypatch.setattr(alert_service.alert_crud, "mark_alert_outbox_retry", mark_alert_outbox_retry)
+    monkeypatch.setattr(alert_service.mail_crud, "get_mail_info", get_mail_info)
+    monkeypatch.setattr(alert_service, "redis_client", UnavailableRedis())
+    monkeypatch.setattr(email_service.smtplib, "SMTP", FakeSMTP)
+    FakeSMTP.sent = []
+    FakeSMTP.fail = False
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_digest_groups_alerts_by_machine(outbox):
+    for alert in (make_alert(1, "ND01", 0), make_alert(2, "ND01", 1), make_alert(3, "ND45", 0)):
+        outbox[alert.id] = alert
+    sender = AlertSender(host="localhost", port="1025", digest=True, throttle=AlertThrottle(window=0))
+
+    assert await sender.send_pending() == 3
+    assert len(FakeSMTP.sent) == 2
+    assert all(row.status == alert_crud.ALERT_STATUS_SENT for row in outbox.values())
+
+
+@pytest.mark.asyncio
+async def test_failed_send_is_retried_with_backoff(outbox):
+    outbox[1] = make_alert(1, "ND01", 0)
+    sender = AlertSender(host="localhost", port="1025", digest=False, throttle=AlertThrottle(window=0))
+
+    FakeSMTP.fail = True
+    assert await sender.send_pending() == 0
+    assert outbox[1].attempts == 1
+    assert outbox[1].next_attempt_time > datetime.datetime.now()
+
+    # 到重試時間後再次寄送
+    FakeSMTP.fail = False
+    outbox[1].next_attempt_time = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    assert await sender.send_pending() == 1
+    assert outbox[1].status == alert_crud.ALERT_STATUS_SENT
+
+
+@pytest.mark.asyncio
+async def test_followup_is_sent_within_throttle_window(outbox):
+    outbox[1] = make_alert(1, "ND01", 0)
+    sender = AlertSender(host="localhost", port="1025", digest=False, throttle=AlertThrottle(window=600))
+    assert await sender.send_pending() == 1
+
+    # AI 分類結果於警告寄出後才完成, 改為待寄送的更新通知
+    outbox[1].classification_result = "NG"
+    outbox[1].is_followup = True
+    outbox[1].status = alert_crud.ALERT_STATUS_PENDING
+    # 同一機台/軸的新警告仍受節流限制
+    outbox[2] = make_alert(2, "ND01", 0)
+
+    assert await sender.send_pending() == 1
+    assert outbox[1].status == alert_crud.ALERT_STATUS_SENT
+    assert outbox[2].status == alert_crud.ALERT_STATUS_SUPPRESSED
+    assert get_subject(FakeSMTP.sent[-1][2]).startswith("[AI 判定更新]")
+    assert "NG" in email.message_from_string(FakeSMTP.sent[-1][2]).get_payload()[0].get_payload(decode=True).decode()
+
+
+@pytest.mark.asyncio
+async def test_throttle_suppresses_repeats_and_escalates_after_window(outbox):
+    outbox[1] = make_alert(1, "ND01", 0)
+    outbox[2] = make_alert(2, "ND01", 1)
+    sender = AlertSender(host="localhost", port="1025", digest=False, throttle=AlertThrottle(window=0.2))
+    assert await sender.send_pending() == 2
+
+    # 同一機台/軸在時間窗內的新警告暫存, 其他軸不受影響
+    outbox[3] = make_alert(3, "ND01", 0)
+    outbox[4] = make_alert(4, "ND01", 0)
+    outbox[5] = make_alert(5, "ND01", 2)
+    assert await sender.send_pending() == 1
+    assert outbox[3].status == outbox[4].status == alert_crud.ALERT_STATUS_SUPPRESSED
+    assert outbox[5].status == alert_crud.ALERT_STATUS_SENT
+
+    # 時間窗結束後, 暫存的警告併入同一封升級郵件
+    await asyncio.sleep(0.25)
+    FakeSMTP.sent = []
+    assert await sender.send_pending() == 2
+    assert outbox[3].status == outbox[4].status == alert_crud.ALERT_STATUS_SENT
+    assert len(FakeSMTP.sent) == 1
+    assert get_subject(FakeSMTP.sent[0][2]).startswith("[Escalation]")
@@ -0,0 +1,53 @@
+import types
+from contextlib import asynccontextmanager
+import pytest
+from app import backfill
+
+
+def test_split_range_covers_range_without_gaps():
+    shards = backfill.split_range("2024-01-01 00:00:00", "2024-01-01 00:00:10", 3)
+    assert shards == [
+        ("2024/01/01 00:00:00", "2024/01/01 00:00:03"),
+        ("2024/01/01 00:00:03", "2024/01/01 00:00:06"),
+        ("2024/01/01 00:00:06", "2024/01/01 00:00:10"),
+    ]
+    # 秒數少於 shard 數時略過空的 shard
+    assert len(backfill.split_range("2024/01/01 00:00:00", "2024/01/01 00:00:02", 8)) == 2
+
+
+def test_split_range_rejects_empty_range():
+    with pytest.raises(ValueError):
+        backfill.split_range("2024-01-02 00:00:00", "2024-01-01 00:00:00", 2)
+    with pytest.raises(ValueError):
+        backfill.split_range("2024-01-01", "2024-01-02 00:00:00", 2)
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    """以記憶體資料取代 ingestion_checkpoint"""
+    rows = {}
+
+    @asynccontextmanager
+    async def mysql_session():
+        yield None
+
+    async def get_checkpoint(mydb, name):
+        return rows.get(name)
+
+    monkeypatch.setattr(backfill, "mysql_session", mysql_session)
+    monkeypatch.setattr(backfill.checkpoint_crud, "get_checkpoint", get_checkpoint)
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_finished_shard_is_skipped_and_reported_done(checkpoints, monkeypatch):
+    shard_start, shard_end = "2024/01/01 00:00:00", "2024/01/02 00:00:00"
+    name = backfill.get_shard_checkpoint_name(shard_start, shard_end)
+    assert name == "backfill.20240101000000.20240102000000"
+    checkpoints[name] = types.SimpleNamespace(aoi_time=shard_end, board_id=backfill.SHARD_DONE_BOARD_ID)
+    monkeypatch.setattr(backfill, "TQMProcessor", None)
+
+    assert (await backfill.run_shard(shard_start, shard_end))["status"] == "done"
+
+    progress = await backfill.get_backfill_progress("2024-01-01 00:00:00", "2024-01-03 00:00:00", shards=2)
+    assert [(row["aoi_time"], row["done"]) for row in progress] == [(shard_end, True), (None, False)]
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from app.utils.cache_helper import AsyncTTLCache, LRUCache
+
+
+@pytest.mark.asyncio
+async def test_async_ttl_cache_single_flight():
+    cache = AsyncTTLCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(10)))
+    assert results == ["value"] * 10
+    assert len(calls) == 1
+    assert await cache.get_or_load("key", loader) == "value"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_ttl_cache_ttl_for_and_expiry():
+    cache = AsyncTTLCache(ttl=60)
+
+    async def loader():
+        return None
+
+    await cache.get_or_load("negative", loader, ttl_for=lambda value: 0 if value is None else None)
+    assert "negative" not in cache
+
+    await cache.get_or_load("positive", lambda: asyncio.sleep(0, result=1), ttl_for=lambda value: None)
+    assert cache.get("positive") == 1
+
+
+@pytest.mark.asyncio
+async def test_async_ttl_cache_invalidate_during_load_does_not_store():
+    cache = AsyncTTLCache(ttl=60)
+    started = asyncio.Event()
+
+    async def loader():
+        started.set()
+        await asyncio.sleep(0.01)
+        return "stale"
+
+    task = asyncio.ensure_future(cache.get_or_load("key", loader))
+    await started.wait()
+    cache.invalidate("key")
+    assert await task == "stale"
+    assert "key" not in cache
+
+
+@pytest.mark.asyncio
+async def test_async_ttl_cache_loader_error_is_not_cached():
+    cache = AsyncTTLCache(ttl=60)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load("key", failing)
+    assert await cache.get_or_load("key", lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(capacity=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_overwrite_and_clear():
+    cache = LRUCache(capacity=2)
+    cache.set("a", 1)
+    cache.set("a", 2)
+    assert cache.get("a") == 2 and len(cache) == 1
+    cache.clear()
+    assert cache.get("a", "missing") == "missing"
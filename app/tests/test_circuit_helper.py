@@ -0,0 +1,76 @@
+import time
+import asyncio
+import pytest
+from app.utils.circuit_helper import AdaptiveLimiter, CircuitBreaker
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 半開期間只放行一個探測
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_released_or_stale_probe_allows_new_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+    # 探測超過 recovery_timeout 未回報時視為遺失
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_limiter_increases_on_fast_success_and_decreases_on_failure():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=8, initial_limit=4, latency_target=1.0)
+    for _ in range(50):
+        limiter.record(True, 0.1)
+    assert limiter.limit == 8
+
+    limiter.record(False, 0.1)
+    assert limiter.limit == 4
+    # 同一個目標延遲時間內只減少一次
+    limiter.record(False, 0.1)
+    limiter.record(True, 5.0)
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_concurrency():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=2, initial_limit=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.inflight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request() for _ in range(6)))
+    assert peak == 2
+    assert limiter.inflight == 0
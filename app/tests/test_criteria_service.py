@@ -0,0 +1,44 @@
+import pytest
+from app.services import criteria_service
+from app.services.criteria_service import ProductCriteria, product_criteria_cache, sync_product_criteria_cache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(criteria_service, "redis_client", fake)
+    monkeypatch.setattr(criteria_service, "_criteria_version", {"initialized": False, "value": None})
+    product_criteria_cache.invalidate()
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_first_version_bump_after_missing_key_invalidates(redis):
+    # 啟動時 Redis 尚無版本號
+    await sync_product_criteria_cache()
+    product_criteria_cache.set("P", ProductCriteria("P", 1000))
+
+    # 其他程序第一次修改管制界限 (None -> "1")
+    await redis.incr(criteria_service.CRITERIA_VERSION_KEY)
+    await sync_product_criteria_cache()
+    assert "P" not in product_criteria_cache
+
+
+@pytest.mark.asyncio
+async def test_unchanged_version_keeps_cache(redis):
+    await redis.incr(criteria_service.CRITERIA_VERSION_KEY)
+    await sync_product_criteria_cache()
+    product_criteria_cache.set("P", ProductCriteria("P", 1000))
+    await sync_product_criteria_cache()
+    assert product_criteria_cache.get("P") == ProductCriteria("P", 1000)
@@ -0,0 +1,25 @@
+import datetime
+import pytest
+from app.utils.cursor_helper import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("aoi_time", [
+    datetime.datetime(2024, 1, 1, 8, 0, 0),
+    datetime.datetime(2024, 12, 31, 23, 59, 59, 123456),
+])
+def test_cursor_round_trip(aoi_time):
+    cursor = encode_cursor(aoi_time, 12345)
+    # base64url 且去除 padding, 可直接放在 query string
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (aoi_time, 12345)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "eyJmb28iOjF9",  # {"foo":1}
+    encode_cursor(datetime.datetime(2024, 1, 1), 1)[:-3],
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
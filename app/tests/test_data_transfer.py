@@ -0,0 +1,127 @@
+import random
+import types
+from collections import defaultdict
+from datetime import datetime, timedelta
+import pytest
+from app.utils import data_transfer
+from app.utils.cache_helper import LRUCache
+from app.utils.data_transfer import DataTransfer
+
+MACHINE_NAMES = ["ND01", "ND25", "ND40", "ND41", "ND45", "ND4", "NX99"]
+
+
+def get_failrate_filter_data_by_loop(data: list, datetime_limit: dict, drill_machine_name: str = None) -> dict:
+    """bisect 改寫前的逐筆比對所有區間實作, 作為等價性比對的基準"""
+    def group_by_freq(rows):
+        grouped_data = defaultdict(list)
+        for item in rows:
+            for key, value in datetime_limit.items():
+                start_time = datetime.strptime(value[0], "%Y-%m-%d %H:%M:%S")
+                end_time = datetime.strptime(value[1], "%Y-%m-%d %H:%M:%S")
+                if start_time <= item.aoi_time < end_time:
+                    grouped_data[key].append(item)
+        return grouped_data
+
+    def count(grouped_data):
+        result = {}
+        for key, value in grouped_data.items():
+            total_count = len(value)
+            fail_count = len([item for item in value if item.judge_ppm == 0])
+            result[key] = {
+                "total_count": total_count,
+                "fail_count": fail_count,
+                "fail_rate": round(fail_count / total_count, 4) if total_count > 0 else 0
+            }
+        return result
+
+    if drill_machine_name:
+        return count(group_by_freq(data))
+    return {
+        "hitachi": count(group_by_freq([item for item in data if item.drill_machine_name < "ND41"])),
+        "posalux": count(group_by_freq([item for item in data if item.drill_machine_name > "ND40"])),
+    }
+
+
+def make_rows(rng: random.Random, start: datetime, end: datetime, count: int) -> list:
+    # 時間範圍前後各多取 40 天, 包含落在所有區間外的資料
+    span = int((end - start).total_seconds()) + 80 * 86400
+    return [types.SimpleNamespace(
+        aoi_time=start - timedelta(days=40) + timedelta(seconds=rng.randrange(span)),
+        drill_machine_name=rng.choice(MACHINE_NAMES),
+        judge_ppm=rng.choice([0, 1, 1, None]),
+    ) for _ in range(count)]
+
+
+@pytest.mark.parametrize("transfer_type", ["day", "week", "month"])
+@pytest.mark.parametrize("drill_machine_name", [None, "ND01"])
+def test_failrate_filter_data_matches_loop(transfer_type, drill_machine_name):
+    rng = random.Random(f"{transfer_type}-{drill_machine_name}")
+    transfer = DataTransfer()
+    for _ in range(3):
+        start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(365), hours=rng.randrange(24))
+        end = start + timedelta(days=rng.randrange(1, 120))
+        datetime_limit = transfer.get_datetime_transfer(
+            start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"), transfer_type
+        )
+        rows = make_rows(rng, start, end, 300)
+
+        result = transfer.get_failrate_filter_data(rows, datetime_limit, drill_machine_name)
+        expected = get_failrate_filter_data_by_loop(rows, datetime_limit, drill_machine_name)
+        # 區間鍵的輸出順序(資料第一次出現的順序)也需一致
+        if drill_machine_name:
+            assert list(result.items()) == list(expected.items())
+        else:
+            for group in ("hitachi", "posalux"):
+                assert list(result[group].items()) == list(expected[group].items())
+
+
+@pytest.fixture
+def ar_sources(monkeypatch):
+    """以記憶體取代 Redis 與 SOAP, 記錄呼叫"""
+    state = {"redis": {}, "redis_error": None, "calls": []}
+
+    async def get_cache(key):
+        state["calls"].append("redis_get")
+        if state["redis_error"]:
+            raise state["redis_error"]
+        return state["redis"].get(key)
+
+    async def set_cache(key, value):
+        state["calls"].append("redis_set")
+        if state["redis_error"]:
+            raise state["redis_error"]
+        state["redis"][key] = value
+
+    async def call_soap_method(payload):
+        state["calls"].append(("soap", payload["StepId"]))
+        return 1.5
+
+    transfer = DataTransfer()
+    monkeypatch.setattr(data_transfer, "_ar_value_cache", LRUCache(10))
+    monkeypatch.setattr(data_transfer, "get_cache", get_cache)
+    monkeypatch.setattr(data_transfer, "set_cache", set_cache)
+    monkeypatch.setattr(transfer._DataTransfer__soap_service, "call_soap_method", call_soap_method)
+    state["transfer"] = transfer
+    return state
+
+
+@pytest.mark.asyncio
+async def test_ar_value_is_cached_in_memory_and_redis(ar_sources):
+    transfer = ar_sources["transfer"]
+    assert await transfer.get_ppm_ar_value("L001") == 1.5
+    assert await transfer.get_ppm_ar_value("L001") == 1.5
+    assert ar_sources["calls"] == ["redis_get", ("soap", "9241"), "redis_set"]
+    assert list(ar_sources["redis"]) == ["soap.k9.drill.arvalue.L001.9241.外層Annual Ring"]
+
+    # 其他程序寫入 Redis 的值不需再呼叫 SOAP
+    ar_sources["calls"].clear()
+    ar_sources["redis"]["soap.k9.drill.arvalue.L0000000002.7276.內層Annual Ring"] = 2.5
+    assert await transfer.get_ppm_ar_value("L0000000002") == 2.5
+    assert ar_sources["calls"] == ["redis_get"]
+
+
+@pytest.mark.asyncio
+async def test_ar_value_falls_back_to_soap_when_redis_is_down(ar_sources):
+    ar_sources["redis_error"] = ConnectionError("redis down")
+    assert await ar_sources["transfer"].get_ppm_ar_value("L001") == 1.5
+    assert ar_sources["calls"] == ["redis_get", ("soap", "9241"), "redis_set"]
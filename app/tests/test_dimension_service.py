@@ -0,0 +1,77 @@
+import types
+import pytest
+from app.services import dimension_service
+from app.services.dimension_service import DimensionCache
+
+
+@pytest.fixture
+def mssql(monkeypatch):
+    """以記憶體資料取代 tDrillMachine / tProduct 查詢, 並記錄呼叫次數"""
+    machines = {1: types.SimpleNamespace(ID_DM=1, Name_DM="ND01")}
+    products = {10: "P-10"}
+    calls = []
+
+    def record(name, result):
+        def query(db, *args):
+            calls.append(name)
+            return result(*args)
+        return query
+
+    monkeypatch.setattr(dimension_service.tqm_crud, "get_machine_info_all", record("machines", lambda: list(machines.values())))
+    monkeypatch.setattr(dimension_service.tqm_crud, "get_product_name_after_id", record(
+        "products_after", lambda last_id: {key: value for key, value in products.items() if key > last_id}
+    ))
+    monkeypatch.setattr(dimension_service.tqm_crud, "get_machine_info_by_ids", record(
+        "machines_by_ids", lambda ids: {key: machines[key] for key in ids if key in machines}
+    ))
+    monkeypatch.setattr(dimension_service.tqm_crud, "get_product_name_by_ids", record(
+        "products_by_ids", lambda ids: {key: products[key] for key in ids if key in products}
+    ))
+
+    async def ms_exec(func, *args):
+        return func(None, *args)
+
+    return types.SimpleNamespace(exec=ms_exec, calls=calls, machines=machines, products=products)
+
+
+@pytest.mark.asyncio
+async def test_resolve_hits_cache_without_mssql(mssql):
+    cache = DimensionCache(refresh_interval=3600)
+    await cache.load(mssql.exec)
+    mssql.calls.clear()
+
+    machine_map, product_map = await cache.resolve(mssql.exec, [1], [10])
+    assert machine_map[1].Name_DM == "ND01"
+    assert product_map == {10: "P-10"}
+    assert mssql.calls == []
+
+
+@pytest.mark.asyncio
+async def test_resolve_caches_absent_ids_until_scheduled_refresh(mssql):
+    cache = DimensionCache(refresh_interval=3600)
+    await cache.load(mssql.exec)
+    mssql.calls.clear()
+
+    machine_map, product_map = await cache.resolve(mssql.exec, [1, 99], [10, 999])
+    assert 99 not in machine_map and 999 not in product_map
+    assert "machines_by_ids" in mssql.calls and "products_by_ids" in mssql.calls
+
+    # 不存在的 ID 不再觸發強制更新與 IN 查詢
+    mssql.calls.clear()
+    await cache.resolve(mssql.exec, [1, 99], [10, 999])
+    assert mssql.calls == []
+    assert cache.get_stats()["absent_hits"] == 2
+
+
+
+@pytest.mark.asyncio
+async def test_scheduled_refresh_retries_absent_ids(mssql):
+    cache = DimensionCache(refresh_interval=0)
+    await cache.load(mssql.exec)
+    _, product_map = await cache.resolve(mssql.exec, [], [999])
+    assert product_map == {}
+
+    # 補登的資料於下次定期更新後可被取得
+    mssql.products[999] = "P-999"
+    _, product_map = await cache.resolve(mssql.exec, [], [999])
+    assert product_map == {999: "P-999"}
@@ -0,0 +1,72 @@
+import json
+import datetime
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.routes import drill
+from app.database.mysql import get_mysql_db
+from app.utils.cursor_helper import decode_cursor
+
+ROWS = [
+    {"id": index, "lot_number": f"L{index}", "aoi_time": datetime.datetime(2024, 1, 1, 8, 0, index), "ppm": 12.5}
+    for index in range(1, 4)
+]
+PARAMS = {"start_time": "2024-01-01 00:00:00", "end_time": "2024-01-02 00:00:00"}
+
+
+def create_client(monkeypatch) -> httpx.AsyncClient:
+    async def stream_judge_info(db, start_time, end_time, after=None, chunk_size=1000):
+        rows = [row for row in ROWS if after is None or (row["aoi_time"], row["id"]) > after]
+        for i in range(0, len(rows), 2):
+            yield rows[i:i + 2]
+
+    async def get_judge_info_page(db, start_time, end_time, limit, after=None):
+        rows = [row for row in ROWS if after is None or (row["aoi_time"], row["id"]) > after]
+        if len(rows) <= limit:
+            return rows, None
+        return rows[:limit], (rows[limit - 1]["aoi_time"], rows[limit - 1]["id"])
+
+    async def get_mysql_db_override():
+        yield None
+
+    monkeypatch.setattr(drill.crud, "stream_judge_info", stream_judge_info)
+    monkeypatch.setattr(drill.crud, "get_judge_info_page", get_judge_info_page)
+    app = FastAPI()
+    app.include_router(drill.router)
+    app.dependency_overrides[get_mysql_db] = get_mysql_db_override
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_judge_stream_returns_ndjson(monkeypatch):
+    async with create_client(monkeypatch) as client:
+        response = await client.get("/api/drill/judge", params={**PARAMS, "stream": "true"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [1, 2, 3]
+    # 與分頁回應相同, datetime 以 ISO 格式輸出
+    assert lines[0]["aoi_time"] == "2024-01-01T08:00:01"
+
+
+@pytest.mark.asyncio
+async def test_judge_pages_follow_next_cursor(monkeypatch):
+    ids, cursor = [], None
+    async with create_client(monkeypatch) as client:
+        while True:
+            params = {**PARAMS, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            data = (await client.get("/api/drill/judge", params=params)).json()["data"]
+            ids.extend(item["id"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+            decode_cursor(cursor)
+    assert ids == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_judge_rejects_invalid_cursor(monkeypatch):
+    async with create_client(monkeypatch) as client:
+        response = await client.get("/api/drill/judge", params={**PARAMS, "cursor": "not a cursor"})
+    assert response.status_code == 422
@@ -0,0 +1,110 @@
+import types
+import datetime
+import pytest
+from sqlalchemy.dialects import mysql
+from app.crud import drill as drill_crud
+
+
+class RecordingSession:
+    """記錄執行的 SQL(以 MySQL 語法編譯), select 回傳 rows"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        self.statements.append((str(stmt.compile(dialect=mysql.dialect())), params))
+        rows = self.rows
+        return types.SimpleNamespace(scalars=lambda: types.SimpleNamespace(all=lambda: rows), all=lambda: rows)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_mark_failrate_dirty_bumps_version_on_duplicate():
+    db = RecordingSession()
+    aoi_time = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    info_list = [
+        {"aoi_time": aoi_time, "drill_machine_name": "ND01", "drill_spindle_id": 0},
+        {"aoi_time": aoi_time, "drill_machine_name": "ND01", "drill_spindle_id": 0},
+        {"aoi_time": None, "drill_machine_name": "ND01", "drill_spindle_id": 1},
+    ]
+    await drill_crud.mark_drill_failrate_dirty(db, info_list, commit=False)
+
+    sql, params = db.statements[0]
+    assert "ON DUPLICATE KEY UPDATE version = (drill_failrate_dirty.version + %s)" in sql
+    assert [(row["day"], row["drill_machine_name"], row["drill_spindle_id"]) for row in params] == [
+        (datetime.date(2024, 1, 1), "ND01", 0)
+    ]
+    assert db.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_failrate_dirty_deletes_only_unchanged_versions():
+    rows = [types.SimpleNamespace(day=datetime.date(2024, 1, 1), drill_machine_name="ND01", drill_spindle_id=0, version=3)]
+    db = RecordingSession(rows)
+
+    assert await drill_crud.drain_drill_failrate_dirty(db, limit=10) == 1
+    statements = [sql for sql, _ in db.statements]
+    assert statements[1].startswith("INSERT INTO drill_failrate_daily")
+    delete_sql, delete_params = db.statements[2]
+    assert delete_sql.startswith("DELETE FROM drill_failrate_dirty")
+    assert "drill_failrate_dirty.version = %s" in delete_sql
+    assert delete_params[0]["b_version"] == 3
+    assert db.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_existing_keys_checks_batch_with_chunked_tuple_in():
+    aoi_time = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    db = RecordingSession([("L1", 0, aoi_time)])
+    keys = [("L1", 0, aoi_time), ("L1", 1, aoi_time), ("L1", 0, aoi_time), ("L2", 0, aoi_time)]
+
+    assert await drill_crud.get_drill_info_existing_keys(db, keys, chunk_size=2) == {("L1", 0, aoi_time)}
+    assert len(db.statements) == 2
+    assert "(lot_drill_result.lot_number, lot_drill_result.drill_spindle_id, lot_drill_result.aoi_time) IN" in db.statements[0][0]
+
+
+@pytest.mark.asyncio
+async def test_upsert_drill_info_keeps_keys_and_feedback_columns():
+    db = RecordingSession()
+    info_list = [{"lot_number": f"L{i}", "drill_spindle_id": 0, "feedback_result": "OK"} for i in range(5)]
+    await drill_crud.upsert_drill_info_all(db, info_list, chunk_size=2, commit=False)
+
+    assert [len(params) for _, params in db.statements] == [2, 2, 1]
+    sql = db.statements[0][0]
+    update_clause = sql.split("ON DUPLICATE KEY UPDATE", 1)[1]
+    assert "classification_result = VALUES(classification_result)" in update_clause
+    for column in ("lot_number =", "drill_spindle_id =", "aoi_time =", "feedback_result", "report_ee", "comment"):
+        assert column not in update_clause
+    assert "feedback_result" not in db.statements[0][1][0]
+    assert db.commits == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("freq_type, label_sql", [
+    ("day", "date_format(timestampadd(SECOND, %s, lot_drill_result.aoi_time), %s)"),
+    ("month", "date_format(timestampadd(SECOND, %s, lot_drill_result.aoi_time), %s)"),
+    ("week", "concat(year(timestampadd(DAY, -mod(weekday(timestampadd(SECOND, %s, lot_drill_result.aoi_time))"),
+])
+async def test_failrate_count_groups_by_bucket_label_in_sql(freq_type, label_sql):
+    db = RecordingSession()
+    search_items = {"start_time": "2024-01-01 08:00:00", "end_time": "2024-01-31 07:59:59", "drill_machine_name": None}
+    await drill_crud.get_drill_failrate_count_by_freq(db, search_items, freq_type, offset_seconds=28800)
+
+    sql = db.statements[0][0]
+    select_sql, group_by_sql = sql.split("GROUP BY", 1)
+    assert label_sql in select_sql and label_sql in group_by_sql
+    assert "hitachi_total_count" in sql and "posalux_fail_count" in sql
+
+    search_items["drill_machine_name"] = "ND01"
+    await drill_crud.get_drill_failrate_count_by_freq(db, search_items, freq_type)
+    assert "lot_drill_result.drill_machine_name = %s" in db.statements[1][0]
+    assert "total_count" in db.statements[1][0] and "hitachi" not in db.statements[1][0]
+
+
+def test_failrate_bucket_label_rejects_unknown_freq_type():
+    with pytest.raises(ValueError):
+        drill_crud._get_failrate_bucket_label("year", 0)
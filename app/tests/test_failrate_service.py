@@ -0,0 +1,119 @@
+import types
+import datetime
+import pytest
+from app.services import failrate_service
+from app.utils.data_transfer import DataTransfer
+
+
+@pytest.mark.parametrize("freq_type", ["day", "week", "month"])
+def test_day_label_matches_datetime_transfer(freq_type):
+    # 跨年、閏年與 ISO 週數跨年的日期; 逐日取 get_datetime_transfer 第一個區間的鍵比對
+    transfer = DataTransfer()
+    day = datetime.date(2019, 12, 1)
+    while day < datetime.date(2026, 2, 1):
+        day_start = datetime.datetime.combine(day, datetime.time.min)
+        datetime_limit = transfer.get_datetime_transfer(
+            day_start.strftime(failrate_service.TIME_FORMAT),
+            (day_start + datetime.timedelta(seconds=1)).strftime(failrate_service.TIME_FORMAT),
+            freq_type
+        )
+        assert failrate_service._get_day_label(day, freq_type) == next(iter(datetime_limit))
+        day += datetime.timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_rollup_counts_machine_in_every_matching_group(monkeypatch):
+    rows = [
+        types.SimpleNamespace(day=datetime.date(2024, 3, 1), drill_machine_name=name, total_count=10, fail_count=1)
+        for name in ("ND01", "ND405", "ND45")
+    ]
+
+    async def get_drill_failrate_daily(db, start_day, end_day, drill_machine_name):
+        return rows
+
+    monkeypatch.setattr(failrate_service.drill_crud, "get_drill_failrate_daily", get_drill_failrate_daily)
+    counts = await failrate_service._get_counts_by_rollup(
+        None, datetime.datetime(2024, 3, 1), datetime.datetime(2024, 3, 1, 23, 59, 59), "day", None
+    )
+    # ND405 同時符合 < ND41 與 > ND40, 與 SQL 彙總及原本的 list 篩選相同, 兩個分組都計入
+    assert counts["2024-03-01"]["hitachi"] == [20, 2]
+    assert counts["2024-03-01"]["posalux"] == [20, 2]
+
+
+@pytest.mark.asyncio
+async def test_query_counts_use_start_time_offset_and_group_columns(monkeypatch):
+    calls = []
+
+    async def get_drill_failrate_count_by_freq(db, search_items, freq_type, offset_seconds):
+        calls.append((search_items, freq_type, offset_seconds))
+        return [types.SimpleNamespace(label="2024-03-01", hitachi_total_count=10, hitachi_fail_count=2,
+                                      posalux_total_count=None, posalux_fail_count=None)]
+
+    monkeypatch.setattr(failrate_service.drill_crud, "get_drill_failrate_count_by_freq", get_drill_failrate_count_by_freq)
+    counts = await failrate_service._get_counts(
+        None, datetime.datetime(2024, 3, 1, 8, 30, 0), datetime.datetime(2024, 3, 2, 8, 29, 59), "day", None
+    )
+    assert calls[0][1:] == ("day", 8 * 3600 + 30 * 60)
+    assert calls[0][0]["start_time"] == "2024-03-01 08:30:00"
+    assert counts["2024-03-01"] == {"hitachi": [10, 2], "posalux": [0, 0]}
+
+
+@pytest.fixture
+def bucket_cache(monkeypatch):
+    """以記憶體取代 Redis 區間快取與版本號, 記錄重新計算的範圍與寫入的 TTL"""
+    state = {"cache": {}, "version": 0, "ttl": {}, "spans": []}
+
+    class FakeRedis:
+        async def get(self, key):
+            return state["version"]
+
+        async def incr(self, key):
+            state["version"] += 1
+
+    async def get_cache_many(keys):
+        return [state["cache"].get(key) for key in keys]
+
+    async def set_cache_many(items, ex=None):
+        for key, value in items.items():
+            state["cache"][key] = value
+            state["ttl"][key] = ex
+
+    async def get_counts(db, start, end, freq_type, drill_machine_name):
+        state["spans"].append((start, end))
+        day, counts = start.date(), {}
+        while day <= end.date():
+            counts[day.strftime("%Y-%m-%d")] = {"hitachi": [10, day.day], "posalux": [0, 0]}
+            day += datetime.timedelta(days=1)
+        return counts
+
+    async def get_closed_watermark(db):
+        return datetime.datetime(2024, 3, 3)
+
+    monkeypatch.setattr(failrate_service, "redis_client", FakeRedis())
+    monkeypatch.setattr(failrate_service, "get_cache_many", get_cache_many)
+    monkeypatch.setattr(failrate_service, "set_cache_many", set_cache_many)
+    monkeypatch.setattr(failrate_service, "_get_counts", get_counts)
+    monkeypatch.setattr(failrate_service, "_get_closed_watermark", get_closed_watermark)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_sliding_range_recomputes_only_missing_buckets(bucket_cache, monkeypatch):
+    monkeypatch.setattr(failrate_service.Config, "FAILRATE_CLOSED_BUCKET_CACHE_TTL", "86400")
+    monkeypatch.setattr(failrate_service.Config, "FAILRATE_OPEN_BUCKET_CACHE_TTL", "60")
+    data = await failrate_service.get_failrate_data(None, "2024-03-01 00:00:00", "2024-03-03 23:59:59", "day")
+    assert list(data["hitachi"]) == ["2024-03-01", "2024-03-02", "2024-03-03"]
+    assert data["posalux"] == {}
+    assert bucket_cache["spans"] == [(datetime.datetime(2024, 3, 1), datetime.datetime(2024, 3, 3, 23, 59, 59))]
+    # 結束時間不晚於 checkpoint 的區間長期快取, 仍在匯入中的區間短期快取
+    assert sorted(bucket_cache["ttl"].values()) == [60, 86400, 86400]
+
+    # 查詢範圍往後滑動一天, 只計算新的區間
+    data = await failrate_service.get_failrate_data(None, "2024-03-02 00:00:00", "2024-03-04 23:59:59", "day")
+    assert list(data["hitachi"]) == ["2024-03-02", "2024-03-03", "2024-03-04"]
+    assert bucket_cache["spans"][1:] == [(datetime.datetime(2024, 3, 4), datetime.datetime(2024, 3, 4, 23, 59, 59))]
+
+    # 版本號遞增後所有區間重新計算
+    await failrate_service.invalidate_failrate_cache()
+    await failrate_service.get_failrate_data(None, "2024-03-02 00:00:00", "2024-03-04 23:59:59", "day")
+    assert bucket_cache["spans"][2:] == [(datetime.datetime(2024, 3, 2), datetime.datetime(2024, 3, 4, 23, 59, 59))]
@@ -0,0 +1,48 @@
+import os
+import pytest
+from app.utils.image_index import DrillImageIndex
+
+SUFFIX = "ND01SP1L001Target.jpg"
+
+
+def touch(folder, name):
+    with open(os.path.join(folder, name), "wb"):
+        pass
+
+
+@pytest.fixture
+def image_root(tmp_path):
+    folder = tmp_path / "ND01"
+    folder.mkdir()
+    touch(folder, f"20240101080003{SUFFIX}")
+    touch(folder, f"20240101080010{SUFFIX}")
+    touch(folder, "thumbs.db")
+    return tmp_path
+
+
+def test_find_nearest_image_within_tolerance(image_root):
+    index = DrillImageIndex(str(image_root), tolerance=2)
+    index.refresh(["ND01", "ND99"])
+
+    expected = os.path.join(str(image_root), "ND01", f"20240101080003{SUFFIX}")
+    assert index.find(os.path.join("/any", "ND01", f"20240101080002{SUFFIX}")) == expected
+    assert index.find(os.path.join("/any", "ND01", f"20240101080006{SUFFIX}")) is None
+    assert index.find(os.path.join("/any", "ND99", f"20240101080003{SUFFIX}")) is None
+    assert index.find(None) is None
+    assert index.get_stats() == {"scans": 1, "hits": 1, "misses": 2, "machines": 1}
+
+
+def test_refresh_rescans_only_changed_folders(image_root):
+    index = DrillImageIndex(str(image_root), tolerance=2)
+    index.refresh(["ND01"])
+    index.refresh(["ND01"])
+    assert index.get_stats()["scans"] == 1
+
+    # 新增圖片後資料夾 mtime 改變, 重新掃描
+    folder = image_root / "ND01"
+    touch(folder, f"20240101090000{SUFFIX}")
+    stat = os.stat(folder)
+    os.utime(folder, (stat.st_atime, stat.st_mtime + 10))
+    index.refresh(["ND01"])
+    assert index.get_stats()["scans"] == 2
+    assert index.find(os.path.join("/any", "ND01", f"20240101090001{SUFFIX}"))
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from app.utils import lock_helper
+from app.utils.lock_helper import single_runner
+
+
+class FakeRedis:
+    """只支援 lease 使用到的 SET NX 與 Lua 腳本; renew 為 False 時模擬 lease 被其他程序取得"""
+
+    def __init__(self):
+        self.data = {}
+        self.renew = True
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != token:
+            return 0
+        if script == lock_helper._RELEASE_SCRIPT:
+            del self.data[key]
+            return 1
+        return 1 if self.renew else 0
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(lock_helper, "redis_client", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_single_runner_excludes_second_runner(redis):
+    async with single_runner("job", ttl=3) as first:
+        assert first
+        async with single_runner("job", ttl=3) as second:
+            assert not second
+    assert "lock.k9.drill.job" not in redis.data
+
+
+@pytest.mark.asyncio
+async def test_single_runner_cancels_body_when_lease_is_lost(redis):
+    progress = []
+    async with single_runner("job", ttl=0.3) as acquired:
+        assert acquired
+        redis.renew = False
+        for step in range(20):
+            progress.append(step)
+            await asyncio.sleep(0.05)
+    # lease 遺失後於下一次延長時中止, 不會跑完全部步驟
+    assert len(progress) < 20
+
+
+@pytest.mark.asyncio
+async def test_single_runner_propagates_external_cancel(redis):
+    started = asyncio.Event()
+
+    async def job():
+        async with single_runner("job", ttl=3):
+            started.set()
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(job())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert "lock.k9.drill.job" not in redis.data
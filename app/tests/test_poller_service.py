@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from app.services.poller_service import AdaptivePoller
+
+
+async def run_poller(results, duration=0.5):
+    """水位固定不變, run 依序回傳 results(用完後沿用最後一個), 執行 duration 秒後回傳 run 的呼叫次數"""
+    stop_event = asyncio.Event()
+    calls = []
+
+    async def probe():
+        return "wm-1"
+
+    async def run():
+        calls.append(True)
+        return results[min(len(calls), len(results)) - 1]
+
+    poller = AdaptivePoller(probe, run, min_interval=0.1, max_interval=0.1, max_run_interval=60)
+    task = asyncio.create_task(poller.run_forever(stop_event))
+    await asyncio.sleep(duration)
+    stop_event.set()
+    await task
+    return len(calls)
+
+
+@pytest.mark.asyncio
+async def test_poller_retries_until_run_completes():
+    # 水位未變動, 但未完成時仍會重試, 完成後便等待新資料
+    assert await run_poller([False, False, True]) == 3
+
+
+@pytest.mark.asyncio
+async def test_poller_waits_for_new_data_after_completed_run():
+    assert await run_poller([True]) == 1
+
+
+@pytest.mark.asyncio
+async def test_poller_treats_skipped_run_as_done():
+    # 其他程序持有 lease 時 run 回傳 None, 不視為未完成
+    assert await run_poller([None]) == 1
@@ -0,0 +1,13 @@
+import pytest
+from app.tests.bench_prediction import format_report, run_benchmark
+
+
+@pytest.mark.asyncio
+async def test_batch_throughput_exceeds_single_against_stub():
+    report = await run_benchmark(image_count=100, batch_size=25)
+    print("\n" + format_report(report))
+    assert report["single"]["classified"] == 100
+    assert report["batch"]["classified"] == 100
+    assert report["single"]["requests"] == 100
+    assert report["batch"]["requests"] == 4
+    assert report["batch"]["images_per_sec"] > report["single"]["images_per_sec"]
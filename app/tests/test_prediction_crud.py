@@ -0,0 +1,33 @@
+import types
+import pytest
+from sqlalchemy.dialects import mysql
+from app.crud import prediction as prediction_crud
+
+
+class RecordingSession:
+    """記錄執行的 SQL(以 MySQL 語法編譯)與參數"""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        self.statements.append((str(stmt.compile(dialect=mysql.dialect())), params))
+        return types.SimpleNamespace()
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_prediction_record_updates_only_non_key_columns():
+    db = RecordingSession()
+    info_list = [{"image_path": f"/images/{i}.jpg", "product_name": "P"} for i in range(3)]
+    await prediction_crud.upsert_prediction_record_all(db, info_list, chunk_size=2)
+
+    assert [len(params) for _, params in db.statements] == [2, 1]
+    update_clause = db.statements[0][0].split("ON DUPLICATE KEY UPDATE", 1)[1]
+    assert "classification_code = VALUES(classification_code)" in update_clause
+    assert "image_path =" not in update_clause
+    assert "product_name =" not in update_clause
+    assert db.commits == 1
@@ -0,0 +1,95 @@
+import asyncio
+import httpx
+import pytest
+from app.services import prediction_service
+from app.utils.circuit_helper import AdaptiveLimiter, CircuitBreaker
+
+ITEMS = [{"img_src": f"img{i}.jpg", "product_name": "P"} for i in range(3)]
+
+
+@pytest.fixture
+def ai_service(monkeypatch):
+    """以 httpx.MockTransport 模擬 AI Service Center, 記錄收到的請求路徑"""
+    state = {"handler": None, "paths": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        state["paths"].append(request.url.path.rsplit("/", 1)[-1])
+        return state["handler"](request)
+
+    monkeypatch.setattr(prediction_service, "_ai_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(prediction_service, "_batch_supported", None)
+    monkeypatch.setattr(prediction_service, "ai_breaker", CircuitBreaker(failure_threshold=5, recovery_timeout=30))
+    monkeypatch.setattr(prediction_service, "ai_limiter", AdaptiveLimiter(max_limit=4))
+    return state
+
+
+def classify_result(index):
+    return {"classification_code": f"C{index}", "classification_model": "m", "distance": 0.1}
+
+
+@pytest.mark.asyncio
+async def test_batch_success(ai_service):
+    ai_service["handler"] = lambda request: httpx.Response(
+        200, json={"code": "0", "data": [classify_result(i) for i in range(len(ITEMS))]}
+    )
+    results = await prediction_service.get_ai_classification_batch(ITEMS)
+    assert [result["classification_code"] for result in results] == ["C0", "C1", "C2"]
+    assert ai_service["paths"] == ["classify_batch"]
+
+
+@pytest.mark.asyncio
+async def test_batch_timeout_does_not_resend_per_image(ai_service):
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    ai_service["handler"] = handler
+    results = await prediction_service.get_ai_classification_batch(ITEMS)
+    assert all(result["classification_code"] is None for result in results)
+    assert ai_service["paths"] == ["classify_batch"]
+
+
+@pytest.mark.asyncio
+async def test_batch_5xx_does_not_resend_per_image(ai_service):
+    ai_service["handler"] = lambda request: httpx.Response(503)
+    results = await prediction_service.get_ai_classification_batch(ITEMS)
+    assert all(result["classification_code"] is None for result in results)
+    assert ai_service["paths"] == ["classify_batch"]
+
+
+@pytest.mark.asyncio
+async def test_batch_unsupported_falls_back_to_single(ai_service):
+    def handler(request):
+        if request.url.path.endswith("classify_batch"):
+            return httpx.Response(404)
+        return httpx.Response(200, json={"code": "0", "data": classify_result(0)})
+
+    ai_service["handler"] = handler
+    results = await prediction_service.get_ai_classification_batch(ITEMS)
+    assert [result["classification_code"] for result in results] == ["C0"] * 3
+    assert ai_service["paths"] == ["classify_batch"] + ["classify"] * 3
+
+    # 確認不支援批次 API 後直接使用單張 API
+    ai_service["paths"].clear()
+    await prediction_service.get_ai_classification_batch(ITEMS[:1])
+    assert ai_service["paths"] == ["classify"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_releases_half_open_breaker(ai_service, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    monkeypatch.setattr(prediction_service, "ai_breaker", breaker)
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    ai_service["handler"] = handler
+    probe = asyncio.create_task(prediction_service._post("classify", {}))
+    await asyncio.sleep(0.01)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    # 被取消的探測不會讓斷路器停留在半開
+    assert breaker.allow()
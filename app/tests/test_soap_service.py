@@ -0,0 +1,46 @@
+import asyncio
+import httpx
+import pytest
+from app.services import soap_service
+from app.services.soap_service import SOAPService
+
+SOAP_RESPONSE = '''<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+    <soap:Body>
+        <GetSpecValueResponse xmlns="http://tempuri.org/">
+            <GetSpecValueResult>1.5</GetSpecValueResult>
+        </GetSpecValueResponse>
+    </soap:Body>
+</soap:Envelope>'''
+
+
+@pytest.fixture
+def soap_server(monkeypatch):
+    """以 httpx.MockTransport 模擬 SOAP 服務, 記錄同時處理中的請求數"""
+    state = {"running": 0, "peak": 0, "status_code": 200}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return httpx.Response(state["status_code"], text=SOAP_RESPONSE)
+
+    monkeypatch.setattr(soap_service, "_soap_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(soap_service, "_soap_limit", asyncio.Semaphore(2))
+    return state
+
+
+@pytest.mark.asyncio
+async def test_soap_calls_share_client_within_concurrency_limit(soap_server):
+    service = SOAPService(soap_url="http://soap.test/service.asmx")
+    results = await asyncio.gather(*(service.call_soap_method({"ScheduleId": f"L{i}"}) for i in range(6)))
+    assert results == [1.5] * 6
+    assert soap_server["peak"] == 2
+
+
+@pytest.mark.asyncio
+async def test_soap_http_error_raises_connection_error(soap_server):
+    soap_server["status_code"] = 500
+    with pytest.raises(ConnectionError):
+        await SOAPService(soap_url="http://soap.test/service.asmx").call_soap_method({"ScheduleId": "L1"})
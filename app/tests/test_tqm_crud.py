@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.crud import tqm as tqm_crud
+from app.models import mssql_models as models
+
+
+@pytest.fixture
+def db():
+    """以 SQLite 記憶體資料庫建立 tBoard"""
+    engine = create_engine("sqlite://")
+    models.BoardInfo.__table__.create(engine)
+    with Session(engine) as session:
+        session.add_all([
+            models.BoardInfo(ID_B=1, Lot="L1", AOITime=""),
+            models.BoardInfo(ID_B=2, Lot="L2", AOITime="2024/01/01 08:00:00"),
+            models.BoardInfo(ID_B=3, Lot="L3", AOITime="2024/01/01 08:00:00"),
+            models.BoardInfo(ID_B=4, Lot="", AOITime="2024/01/01 08:00:01"),
+            models.BoardInfo(ID_B=5, Lot="L5", AOITime="2024/01/01 08:00:02"),
+            models.BoardInfo(ID_B=6, Lot="L6", AOITime=None),
+        ])
+        session.commit()
+        yield session
+
+
+def test_cursor_bootstrap_skips_boards_without_aoi_time(db):
+    # 尚無 checkpoint 與 drill 資料時 cursor 由 ("", 0) 開始
+    boards = tqm_crud.get_boards_info_by_cursor(db, "", 0)
+    assert [board.ID_B for board in boards] == [2, 3, 5]
+
+
+def test_cursor_pages_do_not_skip_same_aoi_time(db):
+    first = tqm_crud.get_boards_info_by_cursor(db, "", 0, limit=1)
+    last = first[-1]
+    second = tqm_crud.get_boards_info_by_cursor(db, last.AOITime, last.ID_B, limit=2)
+    assert [board.ID_B for board in first + second] == [2, 3, 5]
+    assert tqm_crud.get_boards_info_by_cursor(db, "", 0, end_aoi_time="2024/01/01 08:00:02")[-1].ID_B == 3
+
+
+@pytest.fixture
+def lookup_db():
+    """以 SQLite 記憶體資料庫建立 tMeasure / tProduct / tDrillMachine"""
+    engine = create_engine("sqlite://")
+    for model in (models.MeasureInfo, models.ProductInfo, models.MachineInfo):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add_all([
+            models.MeasureInfo(ID_M=1, BoardID=2, ToolID=3),
+            models.MeasureInfo(ID_M=2, BoardID=2, ToolID=-1),
+            models.MeasureInfo(ID_M=3, BoardID=2, ToolID=-1),
+            models.MeasureInfo(ID_M=4, BoardID=3, ToolID=-1),
+            models.ProductInfo(ID_PD=10, Name_PD="P-10"),
+            models.ProductInfo(ID_PD=11, Name_PD="P-11"),
+            models.MachineInfo(ID_DM=1, Name_DM="ND01"),
+        ])
+        session.commit()
+        yield session
+
+
+def test_measure_lookup_keeps_first_total_row_per_board(lookup_db):
+    measures = tqm_crud.get_measure_info_by_board_ids(lookup_db, [2, 3, 3, 9, None])
+    assert {board_id: measure.ID_M for board_id, measure in measures.items()} == {2: 2, 3: 4}
+
+
+def test_dimension_lookups_by_ids(lookup_db):
+    assert tqm_crud.get_product_name_by_ids(lookup_db, [10, 11, 12]) == {10: "P-10", 11: "P-11"}
+    assert {key: value.Name_DM for key, value in tqm_crud.get_machine_info_by_ids(lookup_db, [1, 2]).items()} == {1: "ND01"}
+
+
+def test_in_clause_is_chunked_and_deduplicated():
+    chunks = tqm_crud._chunked([1, 2, 2, None, 3, 4, 5], size=2)
+    assert chunks == [[1, 2], [3, 4], [5]]
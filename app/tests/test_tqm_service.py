@@ -0,0 +1,355 @@
+import asyncio
+import types
+import datetime
+from contextlib import asynccontextmanager
+import pytest
+from app.services import tqm_service, classification_service
+from app.services.tqm_service import TQMProcessor, TQMProcessorConfig
+
+IMAGE_STAT = (datetime.datetime(2024, 1, 1, 8, 0, 0), 1024)
+
+
+def make_drill_info(spindle_id: int = 0) -> dict:
+    return {
+        "lot_number": "L001",
+        "product_name": "P",
+        "drill_machine_name": "ND01",
+        "drill_spindle_id": spindle_id,
+        "drill_time": datetime.datetime(2024, 1, 1, 8, 0, 0),
+    }
+
+
+@asynccontextmanager
+async def acquire_mydb():
+    yield None
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    """以固定的圖片路徑與 AI 回應建立 TQMProcessor, 不存取檔案系統與資料庫"""
+    ai_calls = []
+
+    async def get_ai_classification_batch(items):
+        ai_calls.append(len(items))
+        return [{"classification_code": "A1", "classification_model": "m", "distance": 0.5} for _ in items]
+
+    async def get_prediction_record_by_image_paths(mydb, image_paths):
+        return []
+
+    monkeypatch.setattr(tqm_service, "get_ai_classification_batch", get_ai_classification_batch)
+    monkeypatch.setattr(tqm_service, "get_image_stat", lambda image_path: IMAGE_STAT)
+    monkeypatch.setattr(classification_service.prediction_crud, "get_prediction_record_by_image_paths",
+                        get_prediction_record_by_image_paths)
+
+    tqm = TQMProcessor(TQMProcessorConfig(enable_email=False))
+
+    async def get_ai_image_path(drill_info):
+        return f"/images/ND01/{drill_info['drill_spindle_id']}.jpg"
+
+    monkeypatch.setattr(tqm, "_get_ai_image_path", get_ai_image_path)
+    monkeypatch.setattr(tqm.image_index, "refresh", lambda machine_names: None)
+    monkeypatch.setattr(tqm.image_index, "find", lambda image_path: image_path)
+    tqm.ai_calls = ai_calls
+    return tqm
+
+
+@pytest.mark.asyncio
+async def test_classification_cache_hit_after_fresh_classification(processor):
+    first = await processor._perform_ai_prediction([make_drill_info()], acquire_mydb)
+    prediction_info, drill_info = first[0]
+    assert prediction_info["classification_code"] == "A1"
+    assert drill_info["classification_time"]
+
+    # 同一張圖片再次出現(重跑、圖片索引容許誤差內的兩片板)時由記憶體快取取得, 不再呼叫 AI
+    second = await processor._perform_ai_prediction([make_drill_info()], acquire_mydb)
+    prediction_info, drill_info = second[0]
+    assert prediction_info == {}
+    assert drill_info["classification_result"] == "A1"
+    assert drill_info["classification_time"] == first[0][1]["classification_time"]
+    assert processor.ai_calls == [1]
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def pending_db(processor, monkeypatch):
+    """以記憶體資料模擬待分類資料的讀取與更新"""
+    db = types.SimpleNamespace(session=FakeSession(), rows=[], updates=[], predictions=[])
+
+    @asynccontextmanager
+    async def mysql_session():
+        yield db.session
+
+    async def get_pending_drill_info(mydb, pending_result, since, max_attempts, limit):
+        assert pending_result == tqm_service.AI_PENDING_RESULT
+        return db.rows
+
+    async def update_drill_classification_all(mydb, info_list, commit=True):
+        db.updates.extend(info_list)
+
+    async def upsert_prediction_record_all(mydb, info_list, commit=True):
+        db.predictions.extend(info_list)
+
+    monkeypatch.setattr(tqm_service, "mysql_session", mysql_session)
+    monkeypatch.setattr(tqm_service.drill_crud, "get_pending_drill_info", get_pending_drill_info)
+    monkeypatch.setattr(tqm_service.drill_crud, "update_drill_classification_all", update_drill_classification_all)
+    monkeypatch.setattr(tqm_service.prediction_crud, "upsert_prediction_record_all", upsert_prediction_record_all)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_retry_pending_classification(processor, pending_db, monkeypatch):
+    pending_db.rows = [
+        types.SimpleNamespace(id=index + 1, image_path=None, aoi_time=None, **make_drill_info(index))
+        for index in range(2)
+    ]
+    # 主軸 1 的圖片仍未到
+    monkeypatch.setattr(processor.image_index, "find", lambda image_path: None if image_path.endswith("/1.jpg") else image_path)
+
+    assert await processor.retry_pending_classification() == 1
+    assert [(update["id"], update["classification_result"]) for update in pending_db.updates] == [
+        (1, "A1"), (2, tqm_service.AI_PENDING_RESULT)
+    ]
+    assert len(pending_db.predictions) == 1 and pending_db.session.commits == 1
+
+    # 未到重試間隔時不執行
+    assert await processor.retry_pending_classification() == 0
+    assert len(pending_db.updates) == 2
+
+
+@pytest.mark.asyncio
+async def test_ai_failure_is_saved_as_pending_and_retried(processor, pending_db, monkeypatch):
+    get_ai_classification_batch = tqm_service.get_ai_classification_batch
+
+    async def ai_unavailable(items):
+        return [{"classification_code": None, "error": "Service Unavailable"} for _ in items]
+
+    async def ai_raises(items):
+        raise RuntimeError("unexpected response")
+
+    # AI 服務異常或分類時發生未預期錯誤, 都以待處理寫入並保留圖片路徑
+    for ai_classification_batch in (ai_unavailable, ai_raises):
+        monkeypatch.setattr(tqm_service, "get_ai_classification_batch", ai_classification_batch)
+        results = await processor._perform_ai_prediction([make_drill_info(5)], acquire_mydb)
+        prediction_info, drill_info = results[0]
+        assert prediction_info == {}
+        assert drill_info["classification_result"] == tqm_service.AI_PENDING_RESULT
+        assert drill_info["image_path"] == "/images/ND01/5.jpg"
+
+    # AI 服務恢復後由重新分類完成
+    monkeypatch.setattr(tqm_service, "get_ai_classification_batch", get_ai_classification_batch)
+    pending_db.rows = [types.SimpleNamespace(id=1, image_path=drill_info["image_path"], aoi_time=None, **make_drill_info(5))]
+    assert await processor.retry_pending_classification() == 1
+    assert pending_db.updates[0]["classification_result"] == "A1"
+
+
+@pytest.mark.asyncio
+async def test_failrate_keys_marked_in_batch_and_drained_after_commit(processor, monkeypatch):
+    session = FakeSession()
+    events, dirty = [], {}
+    state = {"fail": True}
+
+    async def upsert_drill_info_all(mydb, info_list, chunk_size=500, commit=True):
+        events.append("upsert")
+
+    async def mark_drill_failrate_dirty(mydb, info_list, commit=True):
+        # 與 drill 結果同一交易標記(尚未提交)
+        events.append(("mark", session.commits))
+        for info in info_list:
+            dirty[(info["aoi_time"].date(), info["drill_machine_name"], info["drill_spindle_id"])] = True
+
+    async def drain_drill_failrate_dirty(mydb, limit=500):
+        events.append(("drain", session.commits))
+        if state["fail"]:
+            raise RuntimeError("lock wait timeout")
+        drained = len(dirty)
+        dirty.clear()
+        return drained
+
+    monkeypatch.setattr(tqm_service.drill_crud, "upsert_drill_info_all", upsert_drill_info_all)
+    monkeypatch.setattr(tqm_service.drill_crud, "mark_drill_failrate_dirty", mark_drill_failrate_dirty)
+    monkeypatch.setattr(tqm_service.drill_crud, "drain_drill_failrate_dirty", drain_drill_failrate_dirty)
+    first = dict(make_drill_info(0), aoi_time=datetime.datetime(2024, 1, 1, 9, 0, 0))
+    second = dict(make_drill_info(1), aoi_time=datetime.datetime(2024, 1, 2, 9, 0, 0))
+
+    # 日彙總於批次交易提交後才重算, 重算失敗不影響批次儲存結果, 待重算鍵值仍保留
+    assert await processor._save_batch_data(session, [], [first])
+    assert events == ["upsert", ("mark", 0), ("drain", 1)]
+    assert session.rollbacks == 1 and len(dirty) == 1
+
+    # 下一批次提交後一併重算先前保留的鍵值
+    state["fail"] = False
+    assert await processor._save_batch_data(session, [], [second])
+    assert dirty == {}
+
+
+@pytest.mark.asyncio
+async def test_enrich_boards_queries_measures_once_per_batch(processor, monkeypatch):
+    boards = [types.SimpleNamespace(ID_B=board_id, DrillMachineID=1, ProductID=10) for board_id in (1, 2, 3)]
+    calls = []
+
+    async def ms_exec(func, *args):
+        calls.append((func.__name__, args))
+        return {board_id: f"measure-{board_id}" for board_id in args[0]}
+
+    async def resolve(ms_exec, machine_ids, product_ids):
+        return {1: "ND01"}, {10: "P-10"}
+
+    monkeypatch.setattr(processor.dimension_cache, "resolve", resolve)
+    lookup = await processor._enrich_boards(boards, ms_exec)
+
+    assert calls == [("get_measure_info_by_board_ids", ([1, 2, 3],))]
+    assert lookup.measure_map == {1: "measure-1", 2: "measure-2", 3: "measure-3"}
+    assert lookup.machine_map == {1: "ND01"}
+    assert lookup.product_map == {10: "P-10"}
+
+
+@pytest.mark.asyncio
+async def test_gather_boards_caps_concurrency_and_keeps_order(processor):
+    processor.config.max_concurrent_boards = 2
+    state = {"running": 0, "peak": 0}
+
+    async def work(item):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01 * (5 - item))
+        state["running"] -= 1
+        if item == 3:
+            raise ValueError("bad board")
+        return item * 10
+
+    assert await processor._gather_boards(work, [0, 1, 2, 3, 4]) == [0, 10, 20, None, 40]
+    assert state["peak"] == 2
+
+
+@pytest.mark.asyncio
+async def test_filter_existing_drill_info_uses_one_query_and_recent_keys(processor, monkeypatch):
+    aoi_time = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    drill_list = [
+        {"lot_number": "L1", "drill_spindle_id": spindle_id, "aoi_time": aoi_time} for spindle_id in (0, 1, 1, 2)
+    ]
+    queries = []
+
+    async def get_drill_info_existing_keys(mydb, keys):
+        queries.append(list(keys))
+        return {("L1", 0, aoi_time)}
+
+    monkeypatch.setattr(tqm_service.drill_crud, "get_drill_info_existing_keys", get_drill_info_existing_keys)
+    processor._recent_keys.add(("L1", 2, aoi_time))
+
+    result = await processor._filter_existing_drill_info(None, drill_list)
+    assert [drill_info["drill_spindle_id"] for drill_info in result] == [1]
+    assert queries == [[("L1", 0, aoi_time), ("L1", 1, aoi_time), ("L1", 1, aoi_time)]]
+    # 已存在的鍵值記入記憶體, 下一批不再查詢
+    assert await processor._filter_existing_drill_info(None, drill_list[:1]) == []
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_persist_stage_saves_in_fetch_order_and_stops_after_failure(processor, monkeypatch):
+    saved = []
+
+    async def save_batch_data(mydb, prediction_list, insert_list, checkpoint, highlight_list=None):
+        saved.append(checkpoint)
+        return checkpoint != ("t3", 3)
+
+    monkeypatch.setattr(processor, "_save_batch_data", save_batch_data)
+    stop_event = asyncio.Event()
+    persist = processor._make_persist_stage(None, stop_event)
+
+    def batch(seq):
+        return tqm_service.BoardBatch(seq=seq, boards_info=[], checkpoint=(f"t{seq}", seq))
+
+    assert await persist(batch(1)) is None
+    assert [item.seq for item in await persist(batch(0))] == [0, 1]
+    assert await persist(batch(3)) is None
+    assert await persist(batch(2)) is not None
+    assert stop_event.is_set()
+    assert await persist(batch(4)) is None
+    assert saved == [("t0", 0), ("t1", 1), ("t2", 2), ("t3", 3)]
+
+
+@pytest.mark.asyncio
+async def test_run_stage_workers_drain_queue_and_forward_end_marker(processor):
+    in_queue, out_queue = asyncio.Queue(), asyncio.Queue()
+    for item in range(6):
+        in_queue.put_nowait(item)
+    in_queue.put_nowait(tqm_service._PIPELINE_END)
+
+    async def handler(item):
+        await asyncio.sleep(0.001 * (6 - item))
+        return None if item == 2 else item
+
+    await asyncio.wait_for(processor._run_stage(handler, in_queue, out_queue, workers=3), timeout=2)
+    results = [out_queue.get_nowait() for _ in range(out_queue.qsize())]
+    assert results[-1] is tqm_service._PIPELINE_END
+    assert sorted(results[:-1]) == [0, 1, 3, 4, 5]
+
+
+@pytest.fixture
+def criteria_db(monkeypatch):
+    """以記憶體資料取代 ppm_criteria 查詢與 SOAP AR 值, 並記錄呼叫"""
+    calls = []
+    tqm_service.product_criteria_cache.invalidate()
+
+    async def get_ppm_criteria_limit_info(mydb, product_name):
+        calls.append(("get", product_name))
+        await asyncio.sleep(0.01)
+        return None
+
+    async def get_ppm_criteria_limit_info_by_names(mydb, product_names):
+        calls.append(("get_by_names", list(product_names)))
+        return [types.SimpleNamespace(id=1, product_name="P-OLD", ppm_limit=300)]
+
+    async def get_ppm_ar_value(lot_number):
+        calls.append(("soap", lot_number))
+        return 1.5
+
+    async def get_ppm_ar_limit_info(mydb):
+        return []
+
+    async def get_ppm_criteria_limit_info_from_ar(product_name, ar_value, ar_info):
+        return {"product_name": product_name, "ppm_limit": 500}
+
+    async def create_ppm_criteria_limit_info(mydb, criteria):
+        calls.append(("create", criteria["product_name"]))
+        return types.SimpleNamespace(**criteria)
+
+    monkeypatch.setattr(tqm_service.ppm_crud, "get_ppm_criteria_limit_info", get_ppm_criteria_limit_info)
+    monkeypatch.setattr(tqm_service.ppm_crud, "get_ppm_criteria_limit_info_by_names", get_ppm_criteria_limit_info_by_names)
+    monkeypatch.setattr(tqm_service.ppm_crud, "get_ppm_ar_limit_info", get_ppm_ar_limit_info)
+    monkeypatch.setattr(tqm_service.ppm_crud, "create_ppm_criteria_limit_info", create_ppm_criteria_limit_info)
+    yield types.SimpleNamespace(
+        calls=calls, get_ppm_ar_value=get_ppm_ar_value,
+        get_ppm_criteria_limit_info=get_ppm_criteria_limit_info_from_ar
+    )
+    tqm_service.product_criteria_cache.invalidate()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_create_product_criteria_once(processor, criteria_db, monkeypatch):
+    monkeypatch.setattr(processor.transfer, "get_ppm_ar_value", criteria_db.get_ppm_ar_value)
+    monkeypatch.setattr(processor.transfer, "get_ppm_criteria_limit_info", criteria_db.get_ppm_criteria_limit_info)
+
+    results = await asyncio.gather(*(processor._load_product_info("P-NEW", "L001", acquire_mydb) for _ in range(5)))
+    assert {(criteria.product_name, criteria.ppm_limit) for criteria in results} == {("P-NEW", 500)}
+    assert criteria_db.calls == [("get", "P-NEW"), ("soap", "L001"), ("create", "P-NEW")]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_loads_missing_product_criteria_in_one_query(processor, criteria_db):
+    await processor._prefetch_product_info(["P-OLD", "P-OLD", None], acquire_mydb)
+    await processor._prefetch_product_info(["P-OLD"], acquire_mydb)
+    assert criteria_db.calls == [("get_by_names", ["P-OLD"])]
+    criteria = await processor._load_product_info("P-OLD", "L001", acquire_mydb)
+    assert criteria.ppm_limit == 300
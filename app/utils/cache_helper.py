@@ -0,0 +1,130 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class RecentKeySet:
+    """保留最近使用過的 key, 超過容量時淘汰最舊的 key"""
+
+    def __init__(self, capacity: int = 5000):
+        self.__capacity = max(1, capacity)
+        self.__keys = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        if key in self.__keys:
+            self.__keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def add(self, key: Hashable):
+        """新增 key"""
+        self.__keys[key] = None
+        self.__keys.move_to_end(key)
+        while len(self.__keys) > self.__capacity:
+            self.__keys.popitem(last=False)
+
+    def add_many(self, keys: Iterable[Hashable]):
+        """批次新增 key"""
+        for key in keys:
+            self.add(key)
+
+    def clear(self):
+        """清除所有 key"""
+        self.__keys.clear()
+
+
+class AsyncTTLCache:
+    """具 TTL 的非同步快取, 同一個 key 同時間的多次未命中只會執行一次載入(single-flight)"""
+
+    def __init__(self, ttl: float = 600):
+        self.__ttl = ttl
+        self.__data: Dict[Hashable, Tuple[float, Any]] = {}
+        self.__inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得未過期的快取值"""
+        entry = self.__data.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        self.__data.pop(key, None)
+        return default
+
+    def __contains__(self, key: Hashable) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """寫入快取值"""
+        self.__data[key] = (time.monotonic() + (self.__ttl if ttl is None else ttl), value)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl_for: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        """取得快取值, 未命中時以 loader 載入, 並合併同一個 key 的並行載入
+
+        ttl_for 可依載入結果決定 TTL(例如暫時性失敗的預設值只短暫快取), 回傳 None 時使用預設 TTL。
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        task = self.__inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.__load(key, loader, ttl_for))
+            self.__inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def __load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                     ttl_for: Optional[Callable[[Any], Optional[float]]]) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            # 載入期間若已被 invalidate, 不寫回過期的結果
+            if self.__inflight.get(key) is task:
+                self.set(key, value, ttl_for(value) if ttl_for else None)
+            return value
+        finally:
+            if self.__inflight.get(key) is task:
+                self.__inflight.pop(key, None)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """清除指定 key 的快取, 未指定時清除全部"""
+        if key is None:
+            self.__data.clear()
+            self.__inflight.clear()
+        else:
+            self.__data.pop(key, None)
+            self.__inflight.pop(key, None)
+
+
+class LRUCache:
+    """固定容量的 LRU 快取, 超過容量時淘汰最久未使用的項目"""
+
+    def __init__(self, capacity: int = 10000):
+        self.__capacity = max(1, capacity)
+        self.__data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得快取值"""
+        if key not in self.__data:
+            return default
+        self.__data.move_to_end(key)
+        return self.__data[key]
+
+    def set(self, key: Hashable, value: Any):
+        """寫入快取值"""
+        self.__data[key] = value
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.__capacity:
+            self.__data.popitem(last=False)
+
+    def clear(self):
+        """清除所有快取"""
+        self.__data.clear()
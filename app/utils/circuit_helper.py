@@ -0,0 +1,109 @@
+import time
+import asyncio
+from typing import Optional
+
+
+class CircuitBreaker:
+    """斷路器: 連續失敗達門檻後開路, 開路期間直接拒絕呼叫; 經過 recovery_timeout 後半開, 只放行一個探測請求
+
+    探測請求被取消而未記錄結果時應呼叫 release; 超過 recovery_timeout 未回報的探測視為遺失, 改放行新的探測。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.__failure_threshold = max(1, failure_threshold)
+        self.__recovery_timeout = recovery_timeout
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__probing = False
+        self.__probe_started = 0.0
+
+    @property
+    def state(self) -> str:
+        return self.__state
+
+    def allow(self) -> bool:
+        """是否允許送出請求"""
+        if self.__state == self.OPEN:
+            if time.monotonic() - self.__opened_at < self.__recovery_timeout:
+                return False
+            self.__state = self.HALF_OPEN
+            self.__probing = False
+        if self.__state == self.HALF_OPEN:
+            now = time.monotonic()
+            if self.__probing and now - self.__probe_started < self.__recovery_timeout:
+                return False
+            self.__probing = True
+            self.__probe_started = now
+        return True
+
+    def release(self):
+        """放棄已放行的請求且不記錄結果(例如被取消), 半開狀態下可再放行新的探測"""
+        self.__probing = False
+
+    def record_success(self):
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__probing = False
+
+    def record_failure(self):
+        self.__failures += 1
+        if self.__state == self.HALF_OPEN or self.__failures >= self.__failure_threshold:
+            self.__state = self.OPEN
+            self.__opened_at = time.monotonic()
+            self.__probing = False
+
+
+class AdaptiveLimiter:
+    """AIMD 並行上限: 回應在目標延遲內時逐步加大並行數, 失敗或過慢時按比例縮小"""
+
+    def __init__(self, min_limit: int = 1, max_limit: int = 20, initial_limit: int = 4,
+                 latency_target: float = 2.0, decrease_factor: float = 0.5):
+        self.__min_limit = max(1, min_limit)
+        self.__max_limit = max(self.__min_limit, max_limit)
+        self.__limit = float(min(max(initial_limit, self.__min_limit), self.__max_limit))
+        self.__latency_target = latency_target
+        self.__decrease_factor = decrease_factor
+        self.__last_decrease = 0.0
+        self.__inflight = 0
+        self.__condition: Optional[asyncio.Condition] = None
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    @property
+    def inflight(self) -> int:
+        return self.__inflight
+
+    def __get_condition(self) -> asyncio.Condition:
+        if self.__condition is None:
+            self.__condition = asyncio.Condition()
+        return self.__condition
+
+    async def __aenter__(self):
+        condition = self.__get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.__inflight < self.limit)
+            self.__inflight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        condition = self.__get_condition()
+        async with condition:
+            self.__inflight -= 1
+            condition.notify_all()
+
+    def record(self, success: bool, latency: float):
+        """記錄一次請求結果: 成功且未超過目標延遲時加法增加, 否則乘法減少(每個目標延遲時間內最多減少一次)"""
+        if success and latency <= self.__latency_target:
+            self.__limit = min(self.__max_limit, self.__limit + 1 / self.__limit)
+            return
+        now = time.monotonic()
+        if now - self.__last_decrease >= self.__latency_target:
+            self.__limit = max(self.__min_limit, self.__limit * self.__decrease_factor)
+            self.__last_decrease = now
@@ -0,0 +1,21 @@
+import base64
+import datetime
+import json
+from typing import Tuple
+
+# keyset 分頁的續傳 token: 最後一筆的 (aoi_time, id), 以 base64url 編碼的 JSON 表示
+
+
+def encode_cursor(aoi_time: datetime.datetime, last_id: int) -> str:
+    value = json.dumps({"aoi_time": aoi_time.isoformat(), "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """解析續傳 token, 格式錯誤時拋出 ValueError"""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode((cursor + padding).encode("ascii")))
+        return datetime.datetime.fromisoformat(value["aoi_time"]), int(value["id"])
+    except Exception as err:
+        raise ValueError(f"cursor 格式錯誤: {cursor}") from err
@@ -1,12 +1,17 @@
 import os
 import re
 import math
+import bisect
 import pandas as pd
 from datetime import datetime, timedelta
-from collections import defaultdict
 from app.utils.logger import Logger
 from app.config import Config
 from app.services.soap_service import SOAPService
+from app.utils.cache_helper import LRUCache
+from app.utils.redis_helper import get_cache, set_cache
+
+# AR 值快取: 記憶體為前端, Redis 為持久層(同一批號的 Annual Ring 規格不會變動, 不設定過期時間)
+_ar_value_cache = LRUCache(5000)
 
 class Singleton:
     """單例模式基類"""
@@ -70,7 +75,26 @@ class DataTransfer(Singleton):
                 "SPECType": "1",
                 "InComChColumnName": "內層Annual Ring" if len(lot_number) > 10 else "外層Annual Ring"
             }
-            return await self.__soap_service.call_soap_method(soap_params)
+            key = f"soap.k9.drill.arvalue.{lot_number}.{soap_params['StepId']}.{soap_params['InComChColumnName']}"
+            ar_value = _ar_value_cache.get(key)
+            if ar_value:
+                return ar_value
+
+            # Redis 無法連線時直接呼叫 SOAP
+            try:
+                ar_value = await get_cache(key)
+            except Exception as err:
+                self.__logger.warning(f"get_ppm_ar_value 讀取快取失敗: {err}")
+            if not ar_value:
+                ar_value = await self.__soap_service.call_soap_method(soap_params)
+                if ar_value:
+                    try:
+                        await set_cache(key, ar_value)
+                    except Exception as err:
+                        self.__logger.warning(f"get_ppm_ar_value 寫入快取失敗: {err}")
+            if ar_value:
+                _ar_value_cache.set(key, ar_value)
+            return ar_value
 
         except Exception as err:
             self.__logger.error(f"get_ppm_ar_value fail: {err}")
@@ -244,6 +268,7 @@ class DataTransfer(Singleton):
                 2. 軸: {highlight_info['spindle_id']+1}<br>
                 3. 批號: {highlight_info['lot_number']}<br>
                 4. PPM: {math.floor(highlight_info['ppm'])}. (上限: {highlight_info['ppm_control_limit']})<br>
+                5. AI 判定: {highlight_info.get('classification_result') or '尚未完成'}<br>
                 <br>
                 連結網頁: <a href="http://{webside_host}:{webside_port}/Result/PeViewPage?lot={highlight_info['lot_number']}">http://{webside_host}:{webside_port}/Result/PeViewPage?lot={highlight_info['lot_number']}</a>
                 </p>
@@ -266,6 +291,63 @@ class DataTransfer(Singleton):
             self.__logger.error(f"get_mail_data fail: {err}")
             return {'from': {},'to': [],'cc': [],'bcc': [],'subject': '','body': '','attachment': []}
 
+    def get_mail_digest_data(self, machine_name:str, highlight_list:list, mail_list:list, suppressed_count:int=0):
+        """獲取同一機台多筆警告的彙整郵件數據, suppressed_count 為節流期間累積的警告筆數"""
+        try:
+            sender = {
+                'name': 'Testing PPM Hightlight System Manager',
+                'email': 'Testing_TID5940@aseglobal.com'
+            }
+            receivers = self.__get_report_receivers(mail_list)
+
+            # 獲取Webside的host和port
+            webside_host = Config.WEBSIDE_HOST
+            webside_port = Config.WEBSIDE_PORT
+
+            # 建立郵件內容
+            rows = "".join(
+                f"""
+                <tr>
+                    <td>{highlight_info['spindle_id']+1}</td>
+                    <td><a href="http://{webside_host}:{webside_port}/Result/PeViewPage?lot={highlight_info['lot_number']}">{highlight_info['lot_number']}</a></td>
+                    <td>{math.floor(highlight_info['ppm'])}</td>
+                    <td>{highlight_info['ppm_control_limit']}</td>
+                    <td>{highlight_info.get('classification_result') or '-'}</td>
+                </tr>"""
+                for highlight_info in highlight_list
+            )
+            content =f"""
+                <p>
+                Dear all 這是Testing,<br> 
+                機鑽穴位圖PPM已超出管制上限. 請EE立即至該機台確認<br>
+                <br>
+                機台編號: {machine_name}, 共 {len(highlight_list)} 筆<br>
+                {f"其中 {suppressed_count} 筆為通知間隔內持續發生的警告<br>" if suppressed_count else ""}
+                </p>
+                <table border="1" cellspacing="0" cellpadding="4">
+                    <tr><th>軸</th><th>批號</th><th>PPM</th><th>上限</th><th>AI 判定</th></tr>{rows}
+                </table>
+            """
+            # 建立郵件主題
+            subject = f"[Warning!!!!!][機鑽站] PPM out of control limit. 機台編號: {machine_name}, 共 {len(highlight_list)} 筆"
+            if suppressed_count:
+                subject = f"[Escalation]{subject}"
+
+            # 組織郵件數據
+            send_data = {
+                'from': sender,
+                'to': receivers["to"],
+                'cc': receivers["cc"],
+                'bcc': receivers["bcc"],
+                'subject': subject,
+                'body': content,
+                'attachment': []
+            }
+            return send_data
+        except Exception as err:
+            self.__logger.error(f"get_mail_digest_data fail: {err}")
+            return {'from': {},'to': [],'cc': [],'bcc': [],'subject': '','body': '','attachment': []}
+
     # 20240619 新增
     def __get_datetime_transfer_by_month(self, start_time:str, end_time:str)->dict:
         """根據開始時間和結束時間獲取每月的開始和結束日期"""
@@ -378,55 +460,69 @@ class DataTransfer(Singleton):
         except ValueError: 
             return False
     
-    def __get_data_transfer_by_freq(self, data:list, datetime_limit:dict)->dict:
-        grouped_data = defaultdict(list)
-        try:
-            for item in data:
-                for key, value in datetime_limit.items():
-                    # 檢查 item.aoi_time 是否在指定的時間範圍內
-                    start_time = datetime.strptime(value[0], "%Y-%m-%d %H:%M:%S")
-                    end_time = datetime.strptime(value[1], "%Y-%m-%d %H:%M:%S")
-                    if start_time <= item.aoi_time < end_time:
-                        grouped_data[key].append(item)
-        except Exception as err:
-            self.__logger.error(f"__get_data_transfer_by_freq fail: {err}")
-        return grouped_data
-    
-    def __get_failrate_count(self, data:dict)->dict:
-        """計算失敗率"""  
+    def __compile_datetime_limit(self, datetime_limit:dict)->tuple:
+        """將 get_datetime_transfer 的區間預先轉為依開始時間排序的邊界陣列(只解析一次時間字串)"""
+        buckets = sorted(
+            (
+                datetime.strptime(value[0], "%Y-%m-%d %H:%M:%S"),
+                datetime.strptime(value[1], "%Y-%m-%d %H:%M:%S"),
+                key
+            )
+            for key, value in datetime_limit.items()
+        )
+        starts = [bucket[0] for bucket in buckets]
+        ends = [bucket[1] for bucket in buckets]
+        keys = [bucket[2] for bucket in buckets]
+        return starts, ends, keys
+
+    def __get_failrate_count_by_freq(self, data:list, boundaries:tuple)->dict:
+        """以 bisect 將每筆資料歸入 [開始, 結束) 區間並累計總數與失敗數, 複雜度 O(N log B)
+
+        區間鍵依資料第一次出現的順序輸出, 與逐筆比對所有區間的結果一致。
+        """
         result = {}
         try:
-            for key, value in data.items():
-                total_count = len(value)
-                fail_count = len([item for item in value if item.judge_ppm == 0])
-                fail_rate = round(fail_count / total_count, 4) if total_count > 0 else 0
-                result[key] = {
+            starts, ends, keys = boundaries
+            totals = [0] * len(keys)
+            fails = [0] * len(keys)
+            order = []
+            for item in data:
+                index = bisect.bisect_right(starts, item.aoi_time) - 1
+                if index < 0 or item.aoi_time >= ends[index]:
+                    continue
+                if totals[index] == 0:
+                    order.append(index)
+                totals[index] += 1
+                if item.judge_ppm == 0:
+                    fails[index] += 1
+
+            for index in order:
+                total_count = totals[index]
+                fail_count = fails[index]
+                result[keys[index]] = {
                     "total_count": total_count,
                     "fail_count": fail_count,
-                    "fail_rate": fail_rate
+                    "fail_rate": round(fail_count / total_count, 4) if total_count > 0 else 0
                 }
         except Exception as err:
-            self.__logger.error(f"__get_failrate_count fail: {err}")
+            self.__logger.error(f"__get_failrate_count_by_freq fail: {err}")
         return result
-        
+
     def get_failrate_filter_data(self, data:list, datetime_limit:dict, drill_machine_name:str=None)->dict:
         """獲取失敗率過濾數據"""
         result = {}
         try:
+            boundaries = self.__compile_datetime_limit(datetime_limit)
             if drill_machine_name:
-                freq_group = self.__get_data_transfer_by_freq(data, datetime_limit)
-                result = self.__get_failrate_count(freq_group)
+                result = self.__get_failrate_count_by_freq(data, boundaries)
             else:
                 # 分類 Hitachi 和 Posalux 機台資料
                 hitachi_total = [item for item in data if item.drill_machine_name < "ND41"]
                 posalux_total = [item for item in data if item.drill_machine_name > "ND40"]
 
                 # 按時間範圍分組並計算失敗率
-                hitachi_freq_group = self.__get_data_transfer_by_freq(hitachi_total, datetime_limit)
-                posalux_freq_group = self.__get_data_transfer_by_freq(posalux_total, datetime_limit)
-
-                result["hitachi"] = self.__get_failrate_count(hitachi_freq_group)
-                result["posalux"] = self.__get_failrate_count(posalux_freq_group)
+                result["hitachi"] = self.__get_failrate_count_by_freq(hitachi_total, boundaries)
+                result["posalux"] = self.__get_failrate_count_by_freq(posalux_total, boundaries)
 
         except Exception as err:
             self.__logger.error(f"get_failrate_filter_data fail: {err}")
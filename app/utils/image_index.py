@@ -0,0 +1,107 @@
+import os
+import bisect
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 圖檔名稱開頭的時間格式 (YYYYmmddHHMMSS)
+IMAGE_TIME_FORMAT = "%Y%m%d%H%M%S"
+IMAGE_TIME_LENGTH = 14
+
+
+class _MachineImageIndex:
+    """單一機台資料夾的索引: 檔名時間之後的部分 -> 依時間排序的 (時間, 檔名)"""
+
+    def __init__(self, mtime: float, entries: Dict[str, List[Tuple[datetime.datetime, str]]]):
+        self.mtime = mtime
+        self.entries = entries
+
+
+class DrillImageIndex:
+    """鑽孔圖資料夾索引
+
+    圖檔存放於 {root}/{機台名稱}/{YYYYmmddHHMMSS}{機台名稱}SP{軸號}{批號}Target.jpg,
+    以機台資料夾為單位建立索引, 只有資料夾 mtime 改變(新增或刪除檔案)時才重新掃描。
+    """
+
+    def __init__(self, root: str, tolerance: int = 2):
+        self.__root = root
+        self.__tolerance = datetime.timedelta(seconds=max(0, tolerance))
+        self.__machines: Dict[str, _MachineImageIndex] = {}
+        self.__lock = threading.Lock()
+        self.__stats = {"scans": 0, "hits": 0, "misses": 0}
+
+    def refresh(self, machine_names: Iterable[str]):
+        """檢查機台資料夾 mtime, 有變動的資料夾才重新掃描(阻塞 I/O, 請於執行緒中呼叫)"""
+        for machine_name in set(machine_names):
+            if not machine_name:
+                continue
+            folder = os.path.join(self.__root, machine_name)
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                with self.__lock:
+                    self.__machines.pop(machine_name, None)
+                continue
+
+            index = self.__machines.get(machine_name)
+            if index is not None and index.mtime == mtime:
+                continue
+            entries = self.__scan(folder)
+            with self.__lock:
+                self.__machines[machine_name] = _MachineImageIndex(mtime, entries)
+                self.__stats["scans"] += 1
+
+    @staticmethod
+    def __scan(folder: str) -> Dict[str, List[Tuple[datetime.datetime, str]]]:
+        entries: Dict[str, List[Tuple[datetime.datetime, str]]] = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        image_time = datetime.datetime.strptime(name[:IMAGE_TIME_LENGTH], IMAGE_TIME_FORMAT)
+                    except ValueError:
+                        continue
+                    entries.setdefault(name[IMAGE_TIME_LENGTH:], []).append((image_time, name))
+        except OSError:
+            return entries
+        for items in entries.values():
+            items.sort()
+        return entries
+
+    def find(self, image_path: Optional[str]) -> Optional[str]:
+        """以預期的圖片路徑查詢索引, 回傳實際存在的圖片路徑(容許檔名時間誤差), 找不到時回傳 None"""
+        if not image_path:
+            return None
+        folder, file_name = os.path.split(image_path)
+        machine_name = os.path.basename(folder)
+        try:
+            image_time = datetime.datetime.strptime(file_name[:IMAGE_TIME_LENGTH], IMAGE_TIME_FORMAT)
+        except ValueError:
+            return None
+
+        index = self.__machines.get(machine_name)
+        items = index.entries.get(file_name[IMAGE_TIME_LENGTH:]) if index else None
+        result = None
+        if items:
+            # 取時間誤差最小且在容許範圍內的圖片
+            position = bisect.bisect_left(items, (image_time - self.__tolerance, ""))
+            best = None
+            for candidate_time, candidate_name in items[position:]:
+                diff = abs(candidate_time - image_time)
+                if candidate_time > image_time + self.__tolerance:
+                    break
+                if best is None or diff < best[0]:
+                    best = (diff, candidate_name)
+            if best:
+                result = os.path.join(self.__root, machine_name, best[1])
+
+        with self.__lock:
+            self.__stats["hits" if result else "misses"] += 1
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得索引統計資訊"""
+        with self.__lock:
+            return {**self.__stats, "machines": len(self.__machines)}
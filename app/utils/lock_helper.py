@@ -0,0 +1,137 @@
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from sqlalchemy import text
+from app.database import redis_client
+from app.database.mysql import engine
+from app.utils.logger import Logger
+from app.config import Config
+
+# 只有持有者(token 相同)才能延長或釋放 lease
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 同一程序內的重疊保護
+_local_locks: Dict[str, asyncio.Lock] = {}
+
+
+class RedisLease:
+    """Redis lease 鎖: SET NX PX 取得, 背景定期延長, 以 token 比對釋放"""
+
+    def __init__(self, name: str, ttl: float):
+        self.__key = f"lock.k9.drill.{name}"
+        self.__ttl_ms = int(ttl * 1000)
+        self.__token = uuid.uuid4().hex
+        self.__heartbeat: Optional[asyncio.Task] = None
+        self.__logger = Logger().get_logger()
+        self.lost = asyncio.Event()
+
+    async def acquire(self) -> bool:
+        acquired = bool(await redis_client.set(self.__key, self.__token, nx=True, px=self.__ttl_ms))
+        if acquired:
+            self.__heartbeat = asyncio.create_task(self.__renew())
+        return acquired
+
+    async def __renew(self):
+        loop = asyncio.get_running_loop()
+        interval = self.__ttl_ms / 3000
+        expires_at = loop.time() + self.__ttl_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await redis_client.eval(_RENEW_SCRIPT, 1, self.__key, self.__token, self.__ttl_ms)
+            except Exception as err:
+                self.__logger.warning(f"lease 延長失敗 ({self.__key}): {err}")
+                # 持續無法延長超過 TTL 時 lease 已過期, 其他程序可能已取得
+                if loop.time() >= expires_at:
+                    self.__logger.error(f"lease 已過期 ({self.__key})")
+                    self.lost.set()
+                    return
+                continue
+            expires_at = loop.time() + self.__ttl_ms / 1000
+            if not renewed:
+                self.__logger.error(f"lease 已遺失 ({self.__key})")
+                self.lost.set()
+                return
+
+    async def release(self):
+        if self.__heartbeat is not None:
+            self.__heartbeat.cancel()
+            await asyncio.gather(self.__heartbeat, return_exceptions=True)
+            self.__heartbeat = None
+        try:
+            await redis_client.eval(_RELEASE_SCRIPT, 1, self.__key, self.__token)
+        except Exception as err:
+            # 釋放失敗時由 TTL 到期自動釋放
+            self.__logger.warning(f"lease 釋放失敗 ({self.__key}): {err}")
+
+
+@asynccontextmanager
+async def _mysql_named_lock(name: str) -> AsyncIterator[bool]:
+    """MySQL GET_LOCK: 鎖綁定在連線上, 持有期間保留同一條連線"""
+    lock_name = f"k9.drill.{name}"
+    async with engine.connect() as conn:
+        acquired = (await conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": lock_name})).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+
+
+@asynccontextmanager
+async def single_runner(name: str, ttl: Optional[float] = None) -> AsyncIterator[bool]:
+    """跨程序只允許一個執行者; 回傳是否取得執行權, 未取得時應直接略過本次工作
+
+    依序使用程序內 asyncio.Lock、Redis lease, Redis 無法連線時改用 MySQL GET_LOCK。
+    執行期間 Redis lease 遺失時取消執行中的工作(其他程序可能已取得執行權), 並正常離開此區塊。
+    """
+    logger = Logger().get_logger()
+    local_lock = _local_locks.setdefault(name, asyncio.Lock())
+    if local_lock.locked():
+        yield False
+        return
+
+    async with local_lock:
+        lease = RedisLease(name, float(Config.RUNNER_LOCK_TTL) if ttl is None else ttl)
+        try:
+            acquired = await lease.acquire()
+        except Exception as err:
+            logger.warning(f"Redis lease 無法使用, 改用 MySQL GET_LOCK ({name}): {err}")
+            async with _mysql_named_lock(name) as acquired:
+                yield acquired
+            return
+
+        watcher = None
+        if acquired:
+            owner = asyncio.current_task()
+
+            async def cancel_on_lost():
+                await lease.lost.wait()
+                logger.error(f"執行權已遺失, 中止執行 ({name})")
+                owner.cancel()
+
+            watcher = asyncio.create_task(cancel_on_lost())
+        try:
+            yield acquired
+        except asyncio.CancelledError:
+            # 只吞下因 lease 遺失而發出的取消, 外部取消照常往外拋出
+            if not lease.lost.is_set():
+                raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+                await asyncio.gather(watcher, return_exceptions=True)
+            if acquired:
+                await lease.release()
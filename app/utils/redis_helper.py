@@ -18,6 +18,22 @@ async def exists_cache(key: str):
 async def delete_cache(key: str):
     await redis_client.delete(key)
 
+async def get_cache_many(keys: list):
+    """以 MGET 一次取得多個 key, 不存在的 key 回傳 None"""
+    if not keys:
+        return []
+    values = await redis_client.mget(*keys)
+    return [json.loads(value) if value else None for value in values]
+
+async def set_cache_many(items: dict, ex: int = None):
+    """以 pipeline 一次寫入多個 key"""
+    if not items:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key, value in items.items():
+            pipe.set(key, json.dumps(value), ex=ex)
+        await pipe.execute()
+
 # class RedisHelper:
 #     def __init__(self, redis_client):
 #         self._redis = redis_client
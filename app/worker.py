@@ -0,0 +1,105 @@
+"""
+# app/worker.py
+TQM 匯入 worker: 與 API 分開執行 TQM 匯入與警告郵件寄送
+
+    python -m app.worker
+
+API 程序預設不啟動匯入(RUN_INGESTION_IN_API=false), 可依需求啟動多個 uvicorn worker,
+程序間的共用狀態(checkpoint、警告 outbox、快取版本、單一執行者 lease)皆透過 MySQL 與 Redis。
+寫入資料庫與寄送警告郵件預設關閉, 需於 worker 的環境變數設定 TQM_ENABLE_SAVE=true、TQM_ENABLE_EMAIL=true。
+"""
+import signal
+import asyncio
+import datetime
+from typing import Optional
+from app.services.tqm_service import TQMProcessorConfig, TQMProcessor
+from app.services.prediction_service import init_ai_client, close_ai_client
+from app.services.soap_service import init_soap_client, close_soap_client
+from app.services.alert_service import alert_sender
+from app.services.poller_service import AdaptivePoller
+from app.utils.lock_helper import single_runner
+from app.utils.logger import Logger
+from app.config import Config
+
+logger = Logger().get_logger()
+
+ENABLE_EMAIL = Config.TQM_ENABLE_EMAIL.lower() in ("1", "true", "yes")
+ENABLE_SAVE = Config.TQM_ENABLE_SAVE.lower() in ("1", "true", "yes")
+
+# 初始化 TQM 處理器
+tqm_processor = TQMProcessor(
+    config=TQMProcessorConfig(
+        max_db_workers=5,
+        batch_size=500,
+        enable_email=ENABLE_EMAIL,
+        enable_save=ENABLE_SAVE
+    )
+)
+
+
+async def start_ingestion():
+    """建立匯入所需的共用連線, 開啟警告郵件時啟動寄送器"""
+    await init_ai_client()
+    await init_soap_client()
+    if ENABLE_EMAIL:
+        await alert_sender.start()
+    await tqm_processor.warm_up()
+
+
+async def stop_ingestion():
+    """關閉匯入所需的共用連線與警告郵件寄送器"""
+    await close_ai_client()
+    await close_soap_client()
+    if ENABLE_EMAIL:
+        await alert_sender.stop()
+
+
+async def run_tqm_once() -> Optional[bool]:
+    """執行一次 TQM 匯入, 回傳是否已處理完所有 Board; 其他程序執行中時略過並回傳 None"""
+    completed = False
+    async with single_runner("tqm") as acquired:
+        if not acquired:
+            logger.info("TQM 任務已由其他程序執行中, 略過本次排程")
+            return None
+        completed = await tqm_processor.run_process()
+        # checkpoint 已越過的待分類資料(圖片晚到、AI 服務異常)定期重新分類
+        await tqm_processor.retry_pending_classification()
+    print(f"-----------------Mission Completed for 'loop_task_run_tqm_process' at {datetime.datetime.now()}------------------")
+    return completed
+
+
+def create_poller() -> AdaptivePoller:
+    """建立 TQM 匯入輪詢排程: tBoard 有新資料時才執行匯入"""
+    return AdaptivePoller(
+        probe=tqm_processor.get_board_watermark,
+        run=run_tqm_once,
+        min_interval=float(Config.POLL_MIN_INTERVAL),
+        max_interval=float(Config.POLL_MAX_INTERVAL),
+        max_run_interval=float(Config.TQM_INTERVAL)
+    )
+
+
+async def main():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows 不支援 add_signal_handler, 以 KeyboardInterrupt 結束
+            pass
+
+    await start_ingestion()
+    logger.info("TQM 匯入 worker 已啟動")
+    try:
+        await create_poller().run_forever(stop_event)
+    finally:
+        await stop_ingestion()
+        logger.info("TQM 匯入 worker 已停止")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass